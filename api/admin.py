@@ -1,10 +1,10 @@
 from django.contrib import admin
 from .models import (
-    PropertyType, Amenity, Location, Destination, Experience, Property, PropertyImage, Package, PackageDestination, Review,
+    PropertyType, Amenity, Location, PlaceAlias, Destination, Experience, Property, PropertyImage, Package, PackageDestination, Review,
     Page, PageBlock, MediaAsset, Menu, MenuItem, Redirect, PageVersion, PageReview, CommentThread, Comment,
     TransferType, AtollTransfer, ResortTransfer, TransferFAQ, TransferContactMethod, 
     TransferBookingStep, TransferBenefit, TransferPricingFactor, TransferContent,
-    PageHero
+    PageHero, SearchQueryLog, PricingRule
 )
 
 @admin.register(PropertyType)
@@ -19,6 +19,27 @@ class AmenityAdmin(admin.ModelAdmin):
 class LocationAdmin(admin.ModelAdmin):
     list_display = ('island', 'atoll', 'latitude', 'longitude')
 
+@admin.register(PlaceAlias)
+class PlaceAliasAdmin(admin.ModelAdmin):
+    list_display = ('alias', 'canonical_name', 'location', 'is_active')
+    list_filter = ('is_active',)
+    search_fields = ('alias', 'canonical_name')
+    list_editable = ('is_active',)
+
+@admin.register(PricingRule)
+class PricingRuleAdmin(admin.ModelAdmin):
+    list_display = ('name', 'property_obj', 'start_date', 'end_date', 'repeats_yearly', 'adjustment_type', 'value', 'priority', 'is_active')
+    list_filter = ('adjustment_type', 'repeats_yearly', 'is_active')
+    search_fields = ('name', 'property_obj__name')
+    list_editable = ('priority', 'is_active')
+
+@admin.register(SearchQueryLog)
+class SearchQueryLogAdmin(admin.ModelAdmin):
+    list_display = ('query', 'result_count', 'latency_ms', 'backend', 'cached', 'created_at')
+    list_filter = ('backend', 'cached', 'created_at')
+    search_fields = ('query', 'normalized_query')
+    date_hierarchy = 'created_at'
+
 @admin.register(Destination)
 class DestinationAdmin(admin.ModelAdmin):
     list_display = ['name', 'island', 'atoll', 'is_featured', 'property_count', 'package_count', 'is_active']
@@ -0,0 +1,174 @@
+"""
+Per-night availability and pricing for a property over a date range.
+
+A calendar costs three queries however long the range is: bookings
+overlapping it, ``Availability`` rows inside it and the pricing rules. Each
+booking or blocked date is painted onto per-night arrays with slice
+assignment, so nights are never checked against bookings one pair at a time.
+
+``available_properties`` answers the same question for many properties at
+once with ``NOT EXISTS`` anti-joins; ``pricing.PriceMatrix`` then prices
+all of them together.
+
+``upsert_availability`` writes host edits for whole date ranges as batched
+``INSERT ... ON CONFLICT (property_obj, date) DO UPDATE`` statements.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Availability, Booking, PricingRule, Property
+from .pricing import PriceMatrix
+
+ACTIVE_BOOKING_STATUSES = ('pending', 'confirmed')
+MAX_CALENDAR_NIGHTS = 366
+UPSERT_FIELDS = ('is_available', 'price_override', 'notes')
+UPSERT_BATCH_SIZE = 500
+
+AVAILABLE, BOOKED, BLOCKED = 0, 1, 2
+NIGHT_STATUS_LABELS = {AVAILABLE: 'available', BOOKED: 'booked', BLOCKED: 'blocked'}
+
+
+def active_booking_filter():
+    """Bookings that reserve their nights: pending, confirmed or an unexpired hold"""
+    return Q(status__in=ACTIVE_BOOKING_STATUSES) | Q(status='held', hold_expires_at__gt=timezone.now())
+
+
+def overlapping_bookings(property_id, start, end):
+    """Active bookings of a property that occupy any night in [start, end)
+
+    ``property_id`` may be an ``OuterRef`` to use this as a subquery.
+    """
+    return Booking.objects.filter(
+        active_booking_filter(),
+        property_obj_id=property_id,
+        check_in_date__lt=end,
+        check_out_date__gt=start,
+    )
+
+
+class PropertyCalendar:
+    """Night-by-night state of one property for the nights in [start, end)"""
+
+    def __init__(self, property_obj, start, end):
+        if end <= start:
+            raise ValueError('end must be after start')
+        self.property = property_obj
+        self.start = start
+        self.end = end
+        nights = (end - start).days
+        self.status = bytearray(nights)
+
+        stays = overlapping_bookings(property_obj.pk, start, end).values_list('check_in_date', 'check_out_date')
+        for check_in, check_out in stays:
+            first = max((check_in - start).days, 0)
+            last = min((check_out - start).days, nights)
+            self.status[first:last] = bytes([BOOKED]) * (last - first)
+
+        rows = Availability.objects.filter(
+            property_obj_id=property_obj.pk, date__gte=start, date__lt=end
+        ).values_list('date', 'is_available', 'price_override')
+        overrides = []
+        for day, is_available, price_override in rows:
+            i = (day - start).days
+            if not is_available and self.status[i] == AVAILABLE:
+                self.status[i] = BLOCKED
+            overrides.append((property_obj.pk, day, price_override))
+
+        # Base rate, season/weekday rules and the overrides fetched above
+        self.prices = PriceMatrix(
+            {property_obj.pk: property_obj.price_per_night}, start, end, overrides=overrides
+        ).nightly(property_obj.pk)
+
+    def __len__(self):
+        return len(self.status)
+
+    @property
+    def is_available(self):
+        """True when every night in the range can be booked"""
+        return not any(self.status)
+
+    @property
+    def total_price(self):
+        return sum(self.prices)
+
+    def nights(self):
+        return [
+            {
+                'date': (self.start + timedelta(days=i)).isoformat(),
+                'available': state == AVAILABLE,
+                'status': NIGHT_STATUS_LABELS[state],
+                'price': float(price),
+            }
+            for i, (state, price) in enumerate(zip(self.status, self.prices))
+        ]
+
+
+def available_properties(check_in, check_out, guests=None, queryset=None):
+    """Properties free for every night in [check_in, check_out) and fitting ``guests``"""
+    queryset = Property.objects.all() if queryset is None else queryset
+    booked = overlapping_bookings(OuterRef('pk'), check_in, check_out)
+    blocked = Availability.objects.filter(
+        property_obj=OuterRef('pk'), date__gte=check_in, date__lt=check_out, is_available=False
+    )
+    queryset = queryset.filter(~Exists(booked), ~Exists(blocked))
+    if guests:
+        queryset = queryset.filter(Q(max_guests__isnull=True) | Q(max_guests__gte=guests))
+    return queryset
+
+
+def rank_by_total_price(queryset, check_in, check_out, descending=False):
+    """``(property ids ordered by stay total, PriceMatrix of them)`` for every property in ``queryset``
+
+    Ordering by total needs every candidate priced for every night, so this
+    costs one properties × nights matrix; ordering by anything else should
+    paginate in SQL and price only the page instead.
+    """
+    matrix = PriceMatrix(dict(queryset.values_list('pk', 'price_per_night')), check_in, check_out)
+    return matrix.ids_by_total(descending), matrix
+
+
+def expand_availability_ranges(ranges):
+    """``{date: {field: value}}`` for the nights each range covers; later ranges win
+
+    A range is a dict with ``start_date``, ``end_date`` (inclusive), an
+    optional ``weekdays`` bitmask (Monday=1 ... Sunday=64, as on
+    ``PricingRule``) and any of ``UPSERT_FIELDS``.
+    """
+    nights = {}
+    for item in ranges:
+        values = {field: item[field] for field in UPSERT_FIELDS if field in item}
+        weekdays = item.get('weekdays', PricingRule.ALL_WEEKDAYS)
+        day = item['start_date']
+        while day <= item['end_date']:
+            if weekdays >> day.weekday() & 1:
+                nights.setdefault(day, {}).update(values)
+            day += timedelta(days=1)
+    return nights
+
+
+def upsert_availability(property_id, ranges, batch_size=UPSERT_BATCH_SIZE):
+    """Create or update the ``Availability`` rows of every night in ``ranges``; returns how many
+
+    Nights are grouped by the fields they set, since one upsert statement
+    updates the same columns on every conflicting row. New rows take the
+    model defaults for fields a range leaves out; ``updated_at`` is always
+    refreshed.
+    """
+    groups = defaultdict(list)
+    nights = expand_availability_ranges(ranges)
+    for day, values in sorted(nights.items()):
+        groups[tuple(sorted(values))].append(Availability(property_obj_id=property_id, date=day, **values))
+    with transaction.atomic():
+        for fields, rows in groups.items():
+            Availability.objects.bulk_create(
+                rows,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['property_obj', 'date'],
+                update_fields=[*fields, 'updated_at'],
+            )
+    return len(nights)
@@ -0,0 +1,116 @@
+"""
+Race-free booking creation.
+
+Checking for overlaps and inserting the booking happen in one transaction
+that first locks the property row (``SELECT ... FOR UPDATE``). Concurrent
+requests for the same property therefore queue on the lock and the second
+one sees the first one's booking. Requests for different properties do not
+block each other.
+
+SQLite ignores ``FOR UPDATE`` but only lets one transaction write at a time.
+A losing writer gets "database is locked", as does a PostgreSQL deadlock or
+lock timeout. Those ``OperationalError``\\s are retried with jittered
+backoff.
+
+Checkout can run in two steps. ``hold_booking`` reserves the nights as a
+``held`` booking for ``BOOKING_HOLD_TTL`` seconds. ``confirm_hold`` then
+turns it into a pending booking with a single conditional UPDATE, so a
+guest's submit cannot fail because the dates went meanwhile. Unexpired holds
+count in every overlap check. Expired ones stop counting as soon as they
+expire, and ``expire_holds`` marks them ``expired`` in bulk.
+"""
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+from .availability import PropertyCalendar
+from .models import Booking, Property
+
+
+class BookingUnavailable(Exception):
+    """The property is booked or blocked for at least one night of the stay"""
+
+
+def _attempts():
+    return getattr(settings, 'BOOKING_CREATE_ATTEMPTS', 5)
+
+
+def _backoff(attempt):
+    base = getattr(settings, 'BOOKING_RETRY_BACKOFF', 0.05)
+    time.sleep(base * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def create_booking(property_obj, check_in, check_out, **fields):
+    """Book ``property_obj`` for [check_in, check_out) or raise ``BookingUnavailable``
+
+    ``total_price`` is computed from the nightly prices while the lock is
+    held, so it always matches the nights actually booked.
+    """
+    attempts = _attempts()
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                locked = Property.objects.select_for_update().get(pk=property_obj.pk)
+                calendar = PropertyCalendar(locked, check_in, check_out)
+                if not calendar.is_available:
+                    raise BookingUnavailable('Property is not available for the selected dates')
+                return Booking.objects.create(
+                    property_obj=locked,
+                    check_in_date=check_in,
+                    check_out_date=check_out,
+                    total_price=calendar.total_price,
+                    **fields,
+                )
+        except OperationalError:
+            if attempt == attempts - 1:
+                raise
+            _backoff(attempt)
+
+
+def _hold_ttl():
+    return getattr(settings, 'BOOKING_HOLD_TTL', 600)
+
+
+def hold_booking(property_obj, check_in, check_out, **fields):
+    """Reserve the stay for ``BOOKING_HOLD_TTL`` seconds; returns the held booking"""
+    fields.setdefault('customer_name', '')
+    fields.setdefault('customer_email', '')
+    fields.setdefault('customer_phone', '')
+    return create_booking(
+        property_obj, check_in, check_out,
+        status='held',
+        hold_token=uuid.uuid4(),
+        hold_expires_at=timezone.now() + timedelta(seconds=_hold_ttl()),
+        **fields,
+    )
+
+
+def confirm_hold(hold_token, **fields):
+    """Turn an unexpired hold into a pending booking; returns it, or None if the hold is gone"""
+    updated = Booking.objects.filter(
+        hold_token=hold_token, status='held', hold_expires_at__gt=timezone.now()
+    ).update(status='pending', hold_expires_at=None, updated_at=timezone.now(), **fields)
+    if not updated:
+        return None
+    return Booking.objects.select_related('property_obj').get(hold_token=hold_token)
+
+
+def release_hold(hold_token):
+    """Give the nights back before the hold expires; returns True if a hold was released"""
+    return bool(
+        Booking.objects.filter(hold_token=hold_token, status='held').update(
+            status='cancelled', hold_expires_at=None, updated_at=timezone.now()
+        )
+    )
+
+
+def expire_holds(now=None):
+    """Mark every lapsed hold as expired in one UPDATE; returns how many"""
+    return Booking.objects.filter(status='held', hold_expires_at__lte=now or timezone.now()).update(
+        status='expired', updated_at=timezone.now()
+    )
@@ -0,0 +1,152 @@
+"""
+Great-circle distances between locations and ETA estimates per transfer mode.
+
+``DistanceMatrix`` computes the haversine distance between every pair of
+``Location`` rows in one vectorized NumPy pass and keeps only the upper
+triangle, as a condensed float32 vector (``n * (n - 1) / 2`` values, the
+layout ``scipy.spatial.distance.pdist`` uses): about 2 MB for a thousand
+locations. A pair lookup is one index computation; a whole row (distances
+from one place to all others) is one fancy-indexing gather.
+
+ETAs are straight-line distance times a route factor (boats go around reefs
+and islands), at the mode's cruising speed, plus its fixed overhead for
+boarding or taxiing. The matrix is built once per process and rebuilt after
+locations change (signals bump a version key in the shared cache).
+"""
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Location
+
+DISTANCE_MATRIX_VERSION_KEY = 'distances:matrix_version'
+EARTH_RADIUS_KM = 6371.0088
+
+# mode: (cruising speed in km/h, route factor over the great circle, fixed minutes)
+# (roughly calibrated on Male-Maafushi: 90 minutes by public ferry, 35-40 by speedboat)
+DEFAULT_TRANSFER_MODES = {
+    'speedboat': (55.0, 1.2, 5),
+    'ferry': (22.0, 1.2, 10),
+    'seaplane': (300.0, 1.05, 15),
+    'domestic_flight': (450.0, 1.05, 40),
+}
+
+
+def transfer_modes():
+    return getattr(settings, 'TRANSFER_MODES', DEFAULT_TRANSFER_MODES)
+
+
+def eta_minutes(distance_km, mode):
+    """Estimated door-to-door minutes for ``mode`` over a straight-line distance; None for unknown modes"""
+    try:
+        speed, route_factor, fixed = transfer_modes()[mode]
+    except KeyError:
+        return None
+    return int(round(fixed + distance_km * route_factor / speed * 60))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; arguments are degrees, scalars or broadcastable arrays"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype='float64')) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class DistanceMatrix:
+    """Pairwise great-circle distances of ``locations`` (id, island, atoll, latitude, longitude)"""
+
+    def __init__(self, locations):
+        locations = list(locations)
+        self.ids = np.array([row[0] for row in locations], dtype='int64')
+        self.names = [f'{row[1]}, {row[2]}' if row[2] else row[1] for row in locations]
+        self._position = {pk: i for i, pk in enumerate(self.ids.tolist())}
+        lat = np.array([row[3] for row in locations], dtype='float64')
+        lon = np.array([row[4] for row in locations], dtype='float64')
+        n = len(locations)
+        first, second = np.triu_indices(n, k=1)
+        self._condensed = haversine_km(lat[first], lon[first], lat[second], lon[second]).astype('float32')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _index(self, i, j):
+        """Condensed index of pair ``i < j`` (arrays allowed)"""
+        n = len(self.ids)
+        return n * i - i * (i + 1) // 2 + (j - i - 1)
+
+    def position(self, location_id):
+        return self._position.get(location_id)
+
+    def distance(self, from_id, to_id):
+        """Kilometres between two location ids; None if either is unknown"""
+        i, j = self.position(from_id), self.position(to_id)
+        if i is None or j is None:
+            return None
+        if i == j:
+            return 0.0
+        i, j = min(i, j), max(i, j)
+        return float(self._condensed[self._index(i, j)])
+
+    def row(self, location_id):
+        """Kilometres from one location to every location, aligned with ``ids``"""
+        i = self.position(location_id)
+        others = np.arange(len(self.ids))
+        low, high = np.minimum(others, i), np.maximum(others, i)
+        distances = self._condensed[self._index(low, high).clip(0)] if len(self._condensed) else np.zeros(len(others))
+        distances = distances.astype('float64')
+        distances[i] = 0.0
+        return distances
+
+    def nearest(self, location_id, limit=10, max_km=None):
+        """``[(location id, km)]`` closest first, excluding the location itself"""
+        distances = self.row(location_id)
+        order = np.argsort(distances, kind='stable')
+        found = []
+        for position in order:
+            if self.ids[position] == location_id:
+                continue
+            if max_km is not None and distances[position] > max_km:
+                break
+            found.append((int(self.ids[position]), float(distances[position])))
+            if len(found) == limit:
+                break
+        return found
+
+    def estimate(self, from_id, to_id):
+        """Distance and ETA per transfer mode between two location ids, or None"""
+        km = self.distance(from_id, to_id)
+        if km is None:
+            return None
+        return {
+            'distance_km': round(km, 1),
+            'eta_minutes': {mode: eta_minutes(km, mode) for mode in transfer_modes()},
+        }
+
+
+_matrix_lock = threading.Lock()
+_matrix = None
+_matrix_version = None
+
+
+def invalidate_distance_matrix():
+    """Mark the distance matrix stale in every worker sharing the cache"""
+    try:
+        cache.incr(DISTANCE_MATRIX_VERSION_KEY)
+    except ValueError:
+        cache.set(DISTANCE_MATRIX_VERSION_KEY, 1, None)
+
+
+def get_distance_matrix():
+    """Return the in-process matrix, rebuilding it when locations have changed"""
+    global _matrix, _matrix_version
+    version = cache.get(DISTANCE_MATRIX_VERSION_KEY, 0)
+    if _matrix is None or _matrix_version != version:
+        with _matrix_lock:
+            if _matrix is None or _matrix_version != version:
+                _matrix = DistanceMatrix(
+                    Location.objects.order_by('pk').values_list('pk', 'island', 'atoll', 'latitude', 'longitude')
+                )
+                _matrix_version = version
+    return _matrix
@@ -0,0 +1,202 @@
+"""
+iCalendar (RFC 5545) feeds of the nights a property cannot be booked.
+
+``iter_property_calendar`` yields the feed line by line from server-side
+cursors over active bookings and blocked ``Availability`` dates, so a
+property with years of bookings streams in constant memory. Runs of
+consecutive blocked dates become one all-day event. Guest details are never
+exported.
+
+``import_calendar`` applies a partner's feed the other way: the nights its
+events cover are closed with one batched upsert, tagged with the feed's
+source, and nights that feed closed earlier but no longer lists reopen.
+Recurring events (RRULE) are not expanded.
+"""
+import hashlib
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .availability import active_booking_filter, upsert_availability
+from .models import Availability, Booking
+
+PRODID = '-//Travel Agency//Property Availability//EN'
+UID_DOMAIN = 'availability.travel-agency'
+IMPORT_HORIZON_DAYS = 730
+MAX_IMPORT_BYTES = 5 * 1024 * 1024
+ITERATOR_CHUNK_SIZE = 500
+
+
+def escape_text(value):
+    return (
+        value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    """Split a content line into CRLF-terminated pieces of at most 75 octets"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    pieces, limit = [], 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:  # never split a UTF-8 sequence
+            cut -= 1
+        pieces.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    return '\r\n '.join(pieces) + '\r\n'
+
+
+def _event(uid, start, end, summary, stamp):
+    return ''.join(fold(line) for line in (
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'DTSTAMP:{stamp}',
+        f'DTSTART;VALUE=DATE:{start:%Y%m%d}',
+        f'DTEND;VALUE=DATE:{end:%Y%m%d}',
+        f'SUMMARY:{escape_text(summary)}',
+        'TRANSP:OPAQUE',
+        'END:VEVENT',
+    ))
+
+
+def _blocked_runs(dates):
+    """Merge an ascending date iterator into ``(first, end)`` runs, ``end`` exclusive"""
+    first = previous = None
+    for day in dates:
+        if previous is not None and day == previous + timedelta(days=1):
+            previous = day
+            continue
+        if first is not None:
+            yield first, previous + timedelta(days=1)
+        first = previous = day
+    if first is not None:
+        yield first, previous + timedelta(days=1)
+
+
+def iter_property_calendar(property_obj, today=None):
+    """Yield the iCalendar feed of a property's booked and blocked nights from ``today`` on"""
+    today = today or timezone.now().date()
+    stamp = timezone.now().astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    yield ''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(property_obj.name)}',
+    ))
+
+    stays = Booking.objects.filter(
+        active_booking_filter(), property_obj=property_obj, check_out_date__gt=today
+    ).order_by('check_in_date').values_list('pk', 'check_in_date', 'check_out_date')
+    for pk, check_in, check_out in stays.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield _event(f'booking-{pk}@{UID_DOMAIN}', check_in, check_out, 'Reserved', stamp)
+
+    blocked = Availability.objects.filter(
+        property_obj=property_obj, is_available=False, date__gte=today
+    ).order_by('date').values_list('date', flat=True)
+    for first, end in _blocked_runs(blocked.iterator(chunk_size=ITERATOR_CHUNK_SIZE)):
+        yield _event(f'blocked-{property_obj.pk}-{first:%Y%m%d}@{UID_DOMAIN}', first, end, 'Not available', stamp)
+
+    yield fold('END:VCALENDAR')
+
+
+def feed_validators(property_obj, today=None):
+    """``(etag, last_modified)`` for conditional GETs of a property's feed
+
+    Row counts catch deletions, which leave no newer ``updated_at`` behind.
+    The feed only shows nights from today on, so it also changes at midnight.
+    """
+    today = today or timezone.now().date()
+    bookings = Booking.objects.filter(property_obj=property_obj).aggregate(changed=Max('updated_at'), rows=Count('id'))
+    blocked = Availability.objects.filter(property_obj=property_obj).aggregate(changed=Max('updated_at'), rows=Count('id'))
+    midnight = timezone.make_aware(datetime.combine(today, time.min))
+    last_modified = max(value for value in (bookings['changed'], blocked['changed'], midnight) if value)
+    state = f"{property_obj.pk}:{property_obj.name}:{today}:{bookings['rows']}:{blocked['rows']}:{last_modified.isoformat()}"
+    return hashlib.md5(state.encode()).hexdigest(), last_modified
+
+
+def unfold(text):
+    """Content lines of an iCalendar document with folded continuations joined"""
+    lines = []
+    for raw in text.replace('\r\n', '\n').replace('\r', '\n').split('\n'):
+        if raw[:1] in (' ', '\t') and lines:
+            lines[-1] += raw[1:]
+        elif raw:
+            lines.append(raw)
+    return lines
+
+
+def _parse_date(value):
+    return datetime.strptime(value.strip()[:8], '%Y%m%d').date()
+
+
+def parse_events(text):
+    """``[(first night, end)]`` of every non-cancelled VEVENT, ``end`` exclusive"""
+    events, current = [], None
+    for line in unfold(text):
+        upper = line.upper()
+        if upper == 'BEGIN:VEVENT':
+            current = {}
+        elif upper == 'END:VEVENT' and current is not None:
+            if 'DTSTART' in current and current.get('STATUS', '').upper() != 'CANCELLED':
+                start = _parse_date(current['DTSTART'])
+                end = _parse_date(current['DTEND']) if 'DTEND' in current else start
+                events.append((start, max(end, start + timedelta(days=1))))
+            current = None
+        elif current is not None and ':' in line:
+            name, value = line.split(':', 1)
+            current[name.split(';', 1)[0].upper()] = value
+    return events
+
+
+def import_marker(source):
+    return f'ical:{source}'
+
+
+def import_calendar(property_obj, text, source='ical', today=None):
+    """Close the nights a partner feed books and reopen the ones it dropped
+
+    Only future nights within ``IMPORT_HORIZON_DAYS`` are touched. Nights
+    blocked by hand or by another feed are left alone. Returns counts of
+    ``events``, ``blocked`` and ``released`` nights.
+    """
+    today = today or timezone.now().date()
+    horizon = today + timedelta(days=IMPORT_HORIZON_DAYS)
+    marker = import_marker(source)
+    events = parse_events(text)
+
+    nights = set()
+    for start, end in events:
+        day, end = max(start, today), min(end, horizon)
+        while day < end:
+            nights.add(day)
+            day += timedelta(days=1)
+
+    with transaction.atomic():
+        owned_elsewhere = set(
+            Availability.objects.filter(property_obj=property_obj, is_available=False, date__gte=today)
+            .exclude(notes=marker).values_list('date', flat=True)
+        )
+        nights -= owned_elsewhere
+        ranges = [
+            {'start_date': first, 'end_date': end - timedelta(days=1), 'is_available': False, 'notes': marker}
+            for first, end in _blocked_runs(sorted(nights))
+        ]
+        if ranges:
+            upsert_availability(property_obj.pk, ranges)
+
+        previously = Availability.objects.filter(
+            property_obj=property_obj, is_available=False, notes=marker, date__gte=today
+        ).values_list('date', flat=True)
+        stale = [day for day in previously if day not in nights]
+        released = Availability.objects.filter(property_obj=property_obj, date__in=stale).update(
+            is_available=True, notes='', updated_at=timezone.now()
+        ) if stale else 0
+
+    return {'events': len(events), 'blocked': len(nights), 'released': released}
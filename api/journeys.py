@@ -0,0 +1,248 @@
+"""
+Multi-leg ferry journey planning over ``FerrySchedule``.
+
+Schedules only describe single direct routes (Male to Maafushi, departs
+09:00, arrives 10:30, on some weekdays). ``FerryNetwork`` loads every active
+schedule in one query, gives each island (its origin/destination location,
+or the route name where none matched) an integer id and, per weekday,
+compiles a connection table: parallel arrays of departure stop, arrival
+stop, departure minute and arrival minute, sorted by departure. A table
+covers the travel day and the next one, so journeys may wait overnight.
+
+``FerryNetwork.plan`` answers earliest-arrival queries with the connection
+scan algorithm: one forward pass over the arrays, taking a connection when
+its departure island was reached in time, with a minimum transfer time
+whenever a traveller changes ferries. Rescanning from just after the
+previous best departure yields the later-leaving alternatives, and an
+option that arrives no earlier than a later-leaving one is dropped.
+
+``FerryNetwork.departures`` serves departure boards from the same tables:
+per weekday, each island's departure minutes are kept in one sorted list,
+so the next sailings after a given minute are a bisection away.
+
+The network is built once per process and rebuilt after schedules change
+(signals bump a version key in the shared cache); tables and boards are
+compiled on first use for each weekday.
+"""
+import bisect
+import threading
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import FerrySchedule
+from .timetable import island_key, mask_weekdays, parse_route_name
+
+FERRY_NETWORK_VERSION_KEY = 'journeys:network_version'
+MINUTES_PER_DAY = 24 * 60
+PLANNING_DAYS = 2
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _at(midnight, minute):
+    return (midnight + timedelta(minutes=minute)).isoformat(timespec='minutes')
+
+
+def _min_transfer_minutes():
+    return getattr(settings, 'FERRY_MIN_TRANSFER_MINUTES', 30)
+
+
+class ConnectionTable:
+    """Connections of one travel day and the next, sorted by departure minute"""
+
+    __slots__ = ('dep_stop', 'arr_stop', 'dep_min', 'arr_min', 'schedule')
+
+    def __init__(self, connections):
+        connections.sort(key=lambda c: (c[2], c[3]))
+        self.dep_stop = [c[0] for c in connections]
+        self.arr_stop = [c[1] for c in connections]
+        self.dep_min = [c[2] for c in connections]
+        self.arr_min = [c[3] for c in connections]
+        self.schedule = [c[4] for c in connections]
+
+    def __len__(self):
+        return len(self.dep_min)
+
+
+class FerryNetwork:
+    """Islands and compiled per-weekday connection tables of all active schedules"""
+
+    def __init__(self, schedules):
+        self.islands = []      # display names by stop id
+        self._stop_ids = {}    # island_key -> stop id
+        self.schedules = {}    # schedule id -> (route name, price)
+        self._services = []    # (origin, destination, departure, arrival, weekdays, schedule id)
+        for schedule in schedules:
+            route = parse_route_name(schedule.route_name)
+            if route is None and (schedule.origin is None or schedule.destination is None):
+                continue
+            origin = self._stop_id(schedule.origin.island if schedule.origin else route[0])
+            destination = self._stop_id(schedule.destination.island if schedule.destination else route[1])
+            departure = _minutes(schedule.departure_time)
+            arrival = _minutes(schedule.arrival_time)
+            if arrival <= departure:  # overnight crossing
+                arrival += MINUTES_PER_DAY
+            self.schedules[schedule.pk] = (schedule.route_name, schedule.price)
+            self._services.append(
+                (origin, destination, departure, arrival, mask_weekdays(schedule.weekday_mask), schedule.pk)
+            )
+        self._tables = {}
+        self._boards = {}
+
+    def _stop_id(self, name):
+        key = island_key(name)
+        if key not in self._stop_ids:
+            self._stop_ids[key] = len(self.islands)
+            self.islands.append(name)
+        return self._stop_ids[key]
+
+    def find_island(self, name):
+        """Stop id of an island name in any common spelling, or None"""
+        return self._stop_ids.get(island_key(name or ''))
+
+    def table(self, weekday):
+        """Connection table for a travel day falling on ``weekday``; compiled on first use"""
+        table = self._tables.get(weekday)
+        if table is None:
+            connections = []
+            for offset in range(PLANNING_DAYS):
+                day = (weekday + offset) % 7
+                shift = offset * MINUTES_PER_DAY
+                connections.extend(
+                    (origin, destination, departure + shift, arrival + shift, schedule_id)
+                    for origin, destination, departure, arrival, weekdays, schedule_id in self._services
+                    if day in weekdays
+                )
+            table = self._tables[weekday] = ConnectionTable(connections)
+        return table
+
+    def board(self, weekday):
+        """``{stop id: (departure minutes, connection indices)}`` of ``table(weekday)``; compiled on first use"""
+        board = self._boards.get(weekday)
+        if board is None:
+            table = self.table(weekday)
+            board = {}
+            for i, stop in enumerate(table.dep_stop):
+                minutes, indices = board.setdefault(stop, ([], []))
+                minutes.append(table.dep_min[i])
+                indices.append(i)
+            self._boards[weekday] = board
+        return board
+
+    def departures(self, origin, travel_date, after=0, limit=10, destination=None):
+        """The next ``limit`` sailings from ``origin`` at minute ``after`` of ``travel_date`` or later
+
+        Runs on into the next day when the travel day has fewer left.
+        """
+        table = self.table(travel_date.weekday())
+        minutes, indices = self.board(travel_date.weekday()).get(origin, ((), ()))
+        midnight = datetime.combine(travel_date, datetime.min.time())
+        found = []
+        for position in range(bisect.bisect_left(minutes, after), len(minutes)):
+            i = indices[position]
+            if destination is not None and table.arr_stop[i] != destination:
+                continue
+            found.append(self._leg(table, i, midnight))
+            if len(found) == limit:
+                break
+        return found
+
+    def _scan(self, table, origin, target, start, transfer):
+        """Connection indices of the earliest-arriving journey leaving at ``start`` or later"""
+        unreached = float('inf')
+        earliest = [unreached] * len(self.islands)
+        via = [-1] * len(self.islands)
+        earliest[origin] = start
+        dep_stop, arr_stop, dep_min, arr_min = table.dep_stop, table.arr_stop, table.dep_min, table.arr_min
+        for i in range(bisect.bisect_left(dep_min, start), len(dep_min)):
+            departure = dep_min[i]
+            if departure >= earliest[target]:
+                break
+            stop = dep_stop[i]
+            ready = earliest[stop] if stop == origin else earliest[stop] + transfer
+            if ready <= departure and arr_min[i] < earliest[arr_stop[i]]:
+                earliest[arr_stop[i]] = arr_min[i]
+                via[arr_stop[i]] = i
+        if via[target] < 0:
+            return None
+        legs, stop = [], target
+        while stop != origin:
+            legs.append(via[stop])
+            stop = dep_stop[via[stop]]
+        return legs[::-1]
+
+    def plan(self, origin, target, travel_date, after=0, limit=3, transfer=None):
+        """Up to ``limit`` itineraries leaving ``origin`` on ``travel_date`` at minute ``after`` or later
+
+        Ranked by arrival; each one leaves later than the previous and arrives
+        strictly later, so none is dominated.
+        """
+        if origin == target:
+            return []
+        transfer = _min_transfer_minutes() if transfer is None else transfer
+        table = self.table(travel_date.weekday())
+        found = []
+        start = after
+        while len(found) <= limit and start < MINUTES_PER_DAY:
+            legs = self._scan(table, origin, target, start, transfer)
+            if legs is None or table.dep_min[legs[0]] >= MINUTES_PER_DAY:
+                break
+            if found and table.arr_min[found[-1][-1]] == table.arr_min[legs[-1]]:
+                found[-1] = legs  # same arrival, later departure
+            else:
+                found.append(legs)
+            start = table.dep_min[legs[0]] + 1
+        return [self._itinerary(table, legs, travel_date) for legs in found[:limit]]
+
+    def _leg(self, table, i, midnight):
+        route_name, price = self.schedules[table.schedule[i]]
+        return {
+            'schedule_id': table.schedule[i],
+            'route_name': route_name,
+            'from': self.islands[table.dep_stop[i]],
+            'to': self.islands[table.arr_stop[i]],
+            'departure': _at(midnight, table.dep_min[i]),
+            'arrival': _at(midnight, table.arr_min[i]),
+            'price': float(price),
+        }
+
+    def _itinerary(self, table, legs, travel_date):
+        midnight = datetime.combine(travel_date, datetime.min.time())
+        departure, arrival = table.dep_min[legs[0]], table.arr_min[legs[-1]]
+        return {
+            'departure': _at(midnight, departure),
+            'arrival': _at(midnight, arrival),
+            'duration_minutes': arrival - departure,
+            'transfers': len(legs) - 1,
+            'total_price': float(sum(self.schedules[table.schedule[i]][1] for i in legs)),
+            'legs': [self._leg(table, i, midnight) for i in legs],
+        }
+
+
+_network_lock = threading.Lock()
+_network = None
+_network_version = None
+
+
+def invalidate_ferry_network():
+    """Mark the compiled network stale in every worker sharing the cache"""
+    try:
+        cache.incr(FERRY_NETWORK_VERSION_KEY)
+    except ValueError:
+        cache.set(FERRY_NETWORK_VERSION_KEY, 1, None)
+
+
+def get_ferry_network():
+    """Return the in-process network, rebuilding it when schedules have changed"""
+    global _network, _network_version
+    version = cache.get(FERRY_NETWORK_VERSION_KEY, 0)
+    if _network is None or _network_version != version:
+        with _network_lock:
+            if _network is None or _network_version != version:
+                _network = FerryNetwork(FerrySchedule.objects.filter(is_active=True).select_related('origin', 'destination').order_by('pk'))
+                _network_version = version
+    return _network
@@ -0,0 +1,244 @@
+import json
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory
+
+from api.models import Location, Package, PackageDestination, Property, PropertyType
+from api.place_matching import invalidate_place_index
+from api.search import SEARCH_BACKENDS, rebuild_search_index
+from api.search_log import query_log
+from api import views
+
+ISLANDS = [
+    ('Maafushi', 'Kaafu Atoll', 3.9414, 73.4903),
+    ('Thulusdhoo', 'Kaafu Atoll', 4.3750, 73.6500),
+    ('Hulhumale', 'Kaafu Atoll', 4.2117, 73.5403),
+    ('Guraidhoo', 'Kaafu Atoll', 3.9000, 73.4667),
+    ('Dhiffushi', 'Kaafu Atoll', 4.4422, 73.7139),
+    ('Himmafushi', 'Kaafu Atoll', 4.3094, 73.5714),
+    ('Gulhi', 'Kaafu Atoll', 3.9875, 73.5047),
+    ('Huraa', 'Kaafu Atoll', 4.3311, 73.6003),
+    ('Ukulhas', 'Alif Alif Atoll', 4.2153, 72.8628),
+    ('Rasdhoo', 'Alif Alif Atoll', 4.2633, 72.9917),
+    ('Thoddoo', 'Alif Alif Atoll', 4.4383, 72.9581),
+    ('Mathiveri', 'Alif Alif Atoll', 4.1908, 72.7461),
+    ('Omadhoo', 'Alif Dhaalu Atoll', 3.7906, 72.9614),
+    ('Dhigurah', 'Alif Dhaalu Atoll', 3.5267, 72.9256),
+    ('Dhangethi', 'Alif Dhaalu Atoll', 3.6047, 72.9542),
+    ('Fenfushi', 'Alif Dhaalu Atoll', 3.4872, 72.7822),
+    ('Fulidhoo', 'Vaavu Atoll', 3.6806, 73.4150),
+    ('Keyodhoo', 'Vaavu Atoll', 3.4631, 73.5517),
+    ('Dharavandhoo', 'Baa Atoll', 5.1561, 73.1300),
+    ('Goidhoo', 'Baa Atoll', 4.8750, 72.9956),
+    ('Eydhafushi', 'Baa Atoll', 5.1036, 73.0706),
+    ('Naifaru', 'Lhaviyani Atoll', 5.4436, 73.3656),
+    ('Fuvahmulah', 'Gnaviyani Atoll', -0.2986, 73.4242),
+    ('Hithadhoo', 'Addu Atoll', -0.6150, 73.0900),
+]
+NAME_PREFIXES = [
+    'Coral', 'Blue', 'Sunset', 'Ocean', 'Palm', 'Turtle', 'Manta', 'Reef', 'Lagoon', 'White Sand',
+    'Sea Breeze', 'Crystal', 'Kuda', 'Bodu', 'Dhoni', 'Moonlight', 'Sandbank', 'Maldive',
+]
+NAME_NOUNS = ['Beach', 'View', 'Retreat', 'Inn', 'Lodge', 'Residence', 'Stay', 'Dream', 'Garden', 'Sky', 'Shore']
+PROPERTY_TYPES = ['Guesthouse', 'Hotel', 'Resort', 'Villa']
+# theme -> (share of rows, sentence planted in their description)
+THEMES = {
+    'honeymoon': (0.05, 'Honeymoon couples get a candlelit dinner on the sandbank.'),
+    'surf': (0.04, 'Surf breaks are a short dhoni ride from the island.'),
+    'whale shark': (0.03, 'Whale shark excursions leave every morning.'),
+    'seaplane': (0.02, 'Seaplane transfers can be arranged from Velana airport.'),
+}
+FILLER = [
+    'Rooms face the lagoon and include breakfast.',
+    'Snorkeling gear is available at reception.',
+    'The local island has a bikini beach and cafes.',
+    'Speedboat transfers run daily from Male.',
+    'Family run with a garden terrace and island tours.',
+]
+MISSPELLINGS = {
+    'Mafushi': 'Maafushi',
+    'Hulhumalé': 'Hulhumale',
+    'Thodhoo': 'Thoddoo',
+    'Ukulhaas': 'Ukulhas',
+    'Dhigura': 'Dhigurah',
+    'Thulusdoo': 'Thulusdhoo',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark /api/search/ on a synthetic catalog: p50/p95 latency, queries per request and recall@k '
+        'for each search backend. All generated rows are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=20000, help='Synthetic properties to generate')
+        parser.add_argument('--packages', type=int, default=5000, help='Synthetic packages to generate')
+        parser.add_argument('--repeat', type=int, default=3, help='Times each query is replayed')
+        parser.add_argument('--k', type=int, default=10, help='Cut-off for recall@k (the view returns at most 10)')
+        parser.add_argument('--backend', action='append', choices=sorted(SEARCH_BACKENDS),
+                            help='Backend to benchmark; repeat for several (default: all)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Also write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        if not 1 <= options['k'] <= 10:
+            raise CommandError('--k must be between 1 and 10')
+        self.rng = random.Random(options['seed'])
+        backends = options['backend'] or sorted(SEARCH_BACKENDS)
+        report = {}
+
+        try:
+            with transaction.atomic():
+                started = time.monotonic()
+                labels = self.generate_catalog(options['properties'], options['packages'])
+                self.stdout.write(
+                    f'Generated {options["properties"]} properties and {options["packages"]} packages '
+                    f'in {time.monotonic() - started:.1f}s'
+                )
+                queries = self.build_queries(labels)
+                # Timed flushes would commit the synthetic searches on another connection
+                with query_log.paused(), tempfile.TemporaryDirectory() as index_dir:
+                    for backend in backends:
+                        report[backend] = self.run_backend(backend, queries, index_dir, options)
+                    query_log.flush()  # the log rows go away with the rollback
+                transaction.set_rollback(True)
+        finally:
+            invalidate_place_index()
+
+        self.print_report(report, options['k'])
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f'Wrote {options["output"]}')
+
+    def generate_catalog(self, property_count, package_count):
+        """Create rows with bulk_create and return {label: set of relevant ids}"""
+        rng = self.rng
+        types = [PropertyType.objects.get_or_create(name=name)[0] for name in PROPERTY_TYPES]
+        locations = Location.objects.bulk_create([
+            Location(island=island, atoll=atoll, latitude=lat, longitude=lng) for island, atoll, lat, lng in ISLANDS
+        ])
+        invalidate_place_index()
+
+        properties = []
+        for i in range(property_count):
+            location = rng.choice(locations)
+            prop_type = rng.choice(types)
+            themes = [theme for theme, (share, _) in THEMES.items() if rng.random() < share]
+            properties.append(Property(
+                name=f'{rng.choice(NAME_PREFIXES)} {rng.choice(NAME_NOUNS)} {prop_type.name} {location.island} {i}',
+                description=' '.join(rng.sample(FILLER, 2) + [THEMES[theme][1] for theme in themes]),
+                property_type=prop_type,
+                location=location,
+                address=f'{rng.choice(["Majeedhee", "Ameenee", "Sosun", "Hithi"])} Magu, {location.island}',
+                price_per_night=Decimal(rng.randrange(40, 900)),
+            ))
+            properties[-1]._themes = themes
+        Property.objects.bulk_create(properties, batch_size=1000)
+
+        packages, destinations = [], []
+        for i in range(package_count):
+            themes = [theme for theme, (share, _) in THEMES.items() if rng.random() < share * 2]
+            package = Package(
+                name=f'{rng.choice(["Island Hopping", "Atoll Explorer", "Dive", "Escape", "Adventure"])} '
+                     f'{rng.choice(NAME_PREFIXES)} {i}',
+                description=' '.join(rng.sample(FILLER, 2) + [THEMES[theme][1] for theme in themes]),
+                price=Decimal(rng.randrange(300, 6000)),
+            )
+            package._themes = themes
+            package._locations = rng.sample(locations, rng.randint(1, 3))
+            packages.append(package)
+        Package.objects.bulk_create(packages, batch_size=1000)
+        for package in packages:
+            for location in package._locations:
+                destinations.append(PackageDestination(package=package, location=location, duration=2, description=''))
+        PackageDestination.objects.bulk_create(destinations, batch_size=1000)
+
+        labels = defaultdict(set)
+        for prop in properties:
+            labels[('properties', prop.location.island)].add(prop.pk)
+            labels[('properties', f'name:{prop.name}')].add(prop.pk)
+            for theme in prop._themes:
+                labels[('properties', theme)].add(prop.pk)
+        for package in packages:
+            for theme in package._themes:
+                labels[('packages', theme)].add(package.pk)
+        return labels
+
+    def build_queries(self, labels):
+        """``[(category, query, group, relevant ids)]`` labeled query set"""
+        rng = self.rng
+        queries = []
+        for island in rng.sample([island for island, *_ in ISLANDS], 6):
+            queries.append(('island', island, 'properties', labels[('properties', island)]))
+        for misspelling, island in MISSPELLINGS.items():
+            queries.append(('misspelled island', misspelling, 'properties', labels[('properties', island)]))
+        for theme in THEMES:
+            queries.append(('keyword', theme, 'properties', labels[('properties', theme)]))
+            queries.append(('package keyword', theme, 'packages', labels[('packages', theme)]))
+        names = sorted(key[1] for key in labels if key[1].startswith('name:'))
+        for name in rng.sample(names, min(10, len(names))):
+            queries.append(('exact name', name[len('name:'):], 'properties', labels[('properties', name)]))
+        return [query for query in queries if query[3]]
+
+    def run_backend(self, backend, queries, index_dir, options):
+        factory = APIRequestFactory()
+        overrides = {'SEARCH_BACKEND': backend, 'SEARCH_CACHE_TIMEOUT': 0}
+        result = {'categories': {}}
+        with override_settings(SEARCH_INDEX_PATH=f'{index_dir}/{backend}.idx', **overrides):
+            if backend == 'index':
+                started = time.monotonic()
+                rebuild_search_index()
+                result['index_build_seconds'] = round(time.monotonic() - started, 2)
+
+            samples = defaultdict(lambda: {'latency_ms': [], 'queries': [], 'recall': []})
+            for category, query, group, relevant in queries:
+                for _ in range(options['repeat']):
+                    request = factory.get('/api/search/', {'q': query})
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        response = views.search(request)
+                        elapsed = (time.perf_counter() - started) * 1000
+                    if response.status_code != 200:
+                        raise CommandError(f'{backend} failed on {query!r}: {response.data}')
+                    for bucket in (samples[category], samples['all']):
+                        bucket['latency_ms'].append(elapsed)
+                        bucket['queries'].append(len(captured))
+                found = [row['id'] for row in response.data[group][:options['k']]]
+                recall = len(relevant.intersection(found)) / min(options['k'], len(relevant))
+                samples[category]['recall'].append(recall)
+                samples['all']['recall'].append(recall)
+
+        for category, values in samples.items():
+            latencies = sorted(values['latency_ms'])
+            result['categories'][category] = {
+                'requests': len(latencies),
+                'p50_ms': round(statistics.median(latencies), 2),
+                'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+                'queries_per_request': round(statistics.mean(values['queries']), 1),
+                f'recall@{options["k"]}': round(statistics.mean(values['recall']), 3),
+            }
+        return result
+
+    def print_report(self, report, k):
+        header = f'{"backend":<10} {"category":<18} {"requests":>8} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8} {f"recall@{k}":>10}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for backend, result in report.items():
+            for category, row in sorted(result['categories'].items(), key=lambda item: item[0] == 'all'):
+                line = (
+                    f'{backend:<10} {category:<18} {row["requests"]:>8} {row["p50_ms"]:>9} {row["p95_ms"]:>9} '
+                    f'{row["queries_per_request"]:>8} {row[f"recall@{k}"]:>10}'
+                )
+                self.stdout.write(self.style.SUCCESS(line) if category == 'all' else line)
+            if 'index_build_seconds' in result:
+                self.stdout.write(f'{backend:<10} index built in {result["index_build_seconds"]}s')
@@ -0,0 +1,25 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.search import get_search_index, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Build the file-backed inverted index used by /api/search/ (see SEARCH_BACKEND)'
+
+    def handle(self, *args, **options):
+        index = get_search_index()
+        self.stdout.write(f'Building search index at {index.path}...')
+
+        started = time.monotonic()
+        count = rebuild_search_index()
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Indexed {count} documents, {len(index.terms)} terms '
+                f'({os.path.getsize(index.path) / 1024:.1f} KiB) in {elapsed:.2f}s'
+            )
+        )
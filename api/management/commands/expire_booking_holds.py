@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.bookings import expire_holds
+
+
+class Command(BaseCommand):
+    help = 'Mark checkout holds past their expiry as expired (run every few minutes from cron)'
+
+    def handle(self, *args, **options):
+        count = expire_holds()
+        self.stdout.write(self.style.SUCCESS(f'Expired {count} booking holds'))
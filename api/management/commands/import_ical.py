@@ -0,0 +1,44 @@
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ical import MAX_IMPORT_BYTES, import_calendar
+from api.models import Property
+
+
+class Command(BaseCommand):
+    help = "Apply a partner channel's iCalendar feed (file path or URL) to a property's availability"
+
+    def add_arguments(self, parser):
+        parser.add_argument('property_id', type=int)
+        parser.add_argument('feed', help='Path or http(s) URL of the .ics feed')
+        parser.add_argument('--source', default='ical', help='Channel name; re-imports replace that channel\'s blocks')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        try:
+            property_obj = Property.objects.get(pk=options['property_id'])
+        except Property.DoesNotExist:
+            raise CommandError(f"Property {options['property_id']} does not exist")
+
+        feed = options['feed']
+        try:
+            if feed.startswith(('http://', 'https://')):
+                with urlopen(feed, timeout=options['timeout']) as response:
+                    data = response.read(MAX_IMPORT_BYTES + 1)
+            else:
+                with open(feed, 'rb') as handle:
+                    data = handle.read(MAX_IMPORT_BYTES + 1)
+        except OSError as e:
+            raise CommandError(f'Could not read {feed}: {e}')
+        if len(data) > MAX_IMPORT_BYTES:
+            raise CommandError(f'{feed} is larger than {MAX_IMPORT_BYTES} bytes')
+
+        try:
+            result = import_calendar(property_obj, data.decode('utf-8', errors='replace'), source=options['source'])
+        except ValueError as e:
+            raise CommandError(f'Invalid calendar: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f"{property_obj.name}: {result['events']} events, {result['blocked']} nights blocked, "
+            f"{result['released']} released"
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.journeys import invalidate_ferry_network
+from api.timetable import backfill_schedules
+
+
+class Command(BaseCommand):
+    help = 'Derive origin/destination, duration_minutes and weekday_mask of every ferry schedule from its text fields'
+
+    def handle(self, *args, **options):
+        updated, unmatched = backfill_schedules()
+        invalidate_ferry_network()
+        self.stdout.write(self.style.SUCCESS(f'Normalized {updated} ferry schedules'))
+        for route_name in unmatched:
+            self.stdout.write(self.style.WARNING(f'No location for an island in "{route_name}"'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from api.models import Location, PlaceAlias
+
+
+class Command(BaseCommand):
+    help = 'Populate common alternative spellings of Maldivian place names'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Populating place aliases...')
+
+        # alias -> canonical spelling used on Location rows
+        aliases_data = {
+            'Mafushi': 'Maafushi',
+            'Maafushee': 'Maafushi',
+            'Malé': 'Male',
+            'Maale': 'Male',
+            'Hulhumalé': 'Hulhumale',
+            'Hulhumaale': 'Hulhumale',
+            'Thodhoo': 'Thoddoo',
+            'Todhoo': 'Thoddoo',
+            'Thulusdoo': 'Thulusdhoo',
+            'Ukulhaas': 'Ukulhas',
+            'Rasdu': 'Rasdhoo',
+            'Gulhee': 'Gulhi',
+            'Alif Alif Atoll': 'Ari Atoll',
+            'Alifu Atoll': 'Ari Atoll',
+            'North Male Atoll': 'Kaafu Atoll',
+            'South Male Atoll': 'Kaafu Atoll',
+        }
+
+        created_count = 0
+        for alias, canonical in aliases_data.items():
+            location = (
+                Location.objects.filter(island__iexact=canonical).first()
+                or Location.objects.filter(atoll__iexact=canonical).first()
+            )
+            _, created = PlaceAlias.objects.update_or_create(
+                alias=alias,
+                defaults={'canonical_name': canonical, 'location': location},
+            )
+            if created:
+                created_count += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully created {created_count} place aliases ({len(aliases_data)} total)')
+        )
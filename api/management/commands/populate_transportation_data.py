@@ -511,6 +511,7 @@ class Command(BaseCommand):
                 'icon': 'StarIcon',
                 'impact': 'Medium',
                 'examples': ['Peak season (Dec-Apr): +10-20%', 'Off-season (May-Nov): Standard rates', 'Holiday periods: +15-25%'],
+                'rules': [{'adjust': 'multiplier', 'value': 1.15, 'months': [12, 1, 2, 3, 4]}],
                 'order': 3
             },
             {
@@ -519,6 +520,7 @@ class Command(BaseCommand):
                 'icon': 'UserGroupIcon',
                 'impact': 'Medium',
                 'examples': ['Individual travelers: Standard rates', 'Groups 4-8: 5-10% discount', 'Groups 8+: Custom pricing'],
+                'rules': [{'adjust': 'multiplier', 'value': 0.925, 'min_guests': 4, 'max_guests': 8}],
                 'order': 4
             },
             {
@@ -527,6 +529,7 @@ class Command(BaseCommand):
                 'icon': 'ClockIcon',
                 'impact': 'Low',
                 'examples': ['Regular hours (6AM-6PM): Standard rates', 'After hours: +15-25%', 'Emergency transfers: +50%'],
+                'rules': [{'adjust': 'multiplier', 'value': 1.2, 'after': '18:00', 'before': '06:00'}],
                 'order': 5
             }
         ]
@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Create your models here.
 
@@ -26,6 +28,22 @@ class Location(models.Model):
     def __str__(self):
         return f"{self.island}, {self.atoll}" if self.atoll else self.island
 
+class PlaceAlias(models.Model):
+    """Alternative spellings of island and atoll names (e.g. 'Mafushi' for 'Maafushi')"""
+    alias = models.CharField(max_length=100, unique=True)
+    canonical_name = models.CharField(max_length=100, help_text="Island or atoll name as stored on Location")
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, null=True, blank=True, related_name='aliases')
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['canonical_name', 'alias']
+        verbose_name = 'Place Alias'
+        verbose_name_plural = 'Place Aliases'
+
+    def __str__(self):
+        return f"{self.alias} → {self.canonical_name}"
+
 class Destination(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
@@ -129,6 +147,7 @@ class Property(models.Model):
     address = models.CharField(max_length=255, blank=True)
     whatsapp_number = models.CharField(max_length=20, blank=True)
     price_per_night = models.DecimalField(max_digits=10, decimal_places=2)
+    max_guests = models.PositiveIntegerField(null=True, blank=True, help_text="Leave empty for no guest limit")
     amenities = models.ManyToManyField(Amenity, blank=True, related_name='properties')
     is_featured = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -340,10 +359,12 @@ class Review(models.Model):
 # New Booking Models
 class Booking(models.Model):
     BOOKING_STATUS_CHOICES = [
+        ('held', 'Held'),
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
         ('cancelled', 'Cancelled'),
         ('completed', 'Completed'),
+        ('expired', 'Expired'),
     ]
     
     property_obj = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='bookings')
@@ -357,9 +378,30 @@ class Booking(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=BOOKING_STATUS_CHOICES, default='pending')
     special_requests = models.TextField(blank=True)
+    # Checkout holds: the dates are reserved until hold_expires_at, then swept to 'expired'
+    hold_token = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Overlap checks: property_obj = ? AND check_in_date < ? AND check_out_date > ?
+            models.Index(fields=['property_obj', 'check_in_date', 'check_out_date'], name='booking_property_dates_idx'),
+            # Same access path restricted to bookings that hold their nights. PostgreSQL
+            # proves the overlap filter's status terms imply the predicate and prefers
+            # this smaller index; SQLite only matches literal predicates and uses the one above.
+            models.Index(
+                fields=['property_obj', 'check_in_date', 'check_out_date'],
+                name='booking_active_dates_idx',
+                condition=Q(status__in=['pending', 'confirmed', 'held']),
+            ),
+            # Hold expiry sweep: status = 'held' AND hold_expires_at <= now
+            models.Index(fields=['hold_expires_at'], name='booking_hold_expiry_idx', condition=Q(status='held')),
+            # A customer's booking history, newest first
+            models.Index(fields=['customer', '-created_at'], name='booking_customer_created_idx'),
+        ]
+    
     def __str__(self):
         return f"Booking {self.id} - {self.property_obj.name} by {self.customer_name}"
     
@@ -369,6 +411,8 @@ class Booking(models.Model):
     
     @property
     def is_active(self):
+        if self.status == 'held':
+            return self.hold_expires_at is not None and self.hold_expires_at > timezone.now()
         return self.status in ['pending', 'confirmed']
 
 class Availability(models.Model):
@@ -377,13 +421,62 @@ class Availability(models.Model):
     is_available = models.BooleanField(default=True)
     price_override = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['property_obj', 'date']
+        indexes = [
+            # Blocked-date anti-join of availability search; only the rare closed nights are indexed
+            models.Index(fields=['property_obj', 'date'], name='availability_blocked_idx', condition=Q(is_available=False)),
+            # Price overrides read by the pricing matrix
+            models.Index(
+                fields=['property_obj', 'date'], name='availability_override_idx', condition=Q(price_override__isnull=False)
+            ),
+        ]
     
     def __str__(self):
         return f"{self.property_obj.name} - {self.date} - {'Available' if self.is_available else 'Not Available'}"
 
+class PricingRule(models.Model):
+    """Seasonal or weekday adjustment of nightly rates.
+
+    Rules apply in ascending priority to the nights they match; per-date
+    ``Availability.price_override`` values take precedence over all rules.
+    """
+    ADJUSTMENT_TYPES = [
+        ('multiplier', 'Multiply nightly rate'),
+        ('amount', 'Add amount to nightly rate'),
+        ('fixed', 'Fixed nightly rate'),
+    ]
+    ALL_WEEKDAYS = 127
+
+    name = models.CharField(max_length=100)
+    property_obj = models.ForeignKey(
+        Property, on_delete=models.CASCADE, null=True, blank=True, related_name='pricing_rules',
+        help_text="Leave empty to apply to every property"
+    )
+    start_date = models.DateField(null=True, blank=True, help_text="First night the rule applies to")
+    end_date = models.DateField(null=True, blank=True, help_text="Last night the rule applies to (inclusive)")
+    repeats_yearly = models.BooleanField(default=False, help_text="Match the same month/day range every year")
+    weekdays = models.PositiveSmallIntegerField(
+        default=ALL_WEEKDAYS, help_text="Bitmask of nights: Monday=1, Tuesday=2, ... Sunday=64"
+    )
+    adjustment_type = models.CharField(max_length=20, choices=ADJUSTMENT_TYPES, default='multiplier')
+    value = models.DecimalField(max_digits=10, decimal_places=4)
+    priority = models.IntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['priority', 'id']
+        verbose_name = "Pricing Rule"
+        verbose_name_plural = "Pricing Rules"
+
+    def __str__(self):
+        scope = self.property_obj.name if self.property_obj_id else 'All properties'
+        return f"{self.name} ({scope})"
+
 class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=100)
@@ -767,6 +860,8 @@ class TransferPricingFactor(models.Model):
         ('Low', 'Low'),
     ], default='Medium')
     examples = models.JSONField(default=list)  # List of examples
+    # Machine-readable adjustments used by transfer quotes (see api.transfer_quotes)
+    rules = models.JSONField(default=list, blank=True)
     is_active = models.BooleanField(default=True)
     order = models.PositiveIntegerField(default=0)
     
@@ -787,9 +882,25 @@ class FerrySchedule(models.Model):
     is_active = models.BooleanField(default=True)
     notes = models.TextField(blank=True)
     order = models.PositiveIntegerField(default=0)
+    # Derived from the text fields above on save (api.timetable) for indexed queries
+    origin = models.ForeignKey(
+        Location, on_delete=models.SET_NULL, null=True, blank=True, related_name='ferry_departures'
+    )
+    destination = models.ForeignKey(
+        Location, on_delete=models.SET_NULL, null=True, blank=True, related_name='ferry_arrivals'
+    )
+    duration_minutes = models.PositiveIntegerField(null=True, blank=True)
+    weekday_mask = models.PositiveSmallIntegerField(
+        default=127, help_text="Bitmask of sailing days: Monday=1, Tuesday=2, ... Sunday=64"
+    )
     
     class Meta:
         ordering = ['route_name', 'departure_time']
+        indexes = [
+            # Departures from an island after a time of day
+            models.Index(fields=['origin', 'departure_time'], name='ferry_origin_departure_idx'),
+            models.Index(fields=['destination', 'departure_time'], name='ferry_dest_departure_idx'),
+        ]
     
     def __str__(self):
         return f"{self.route_name} - {self.departure_time}"
@@ -1339,3 +1450,23 @@ class LocalizedFAQ(models.Model):
 
     def __str__(self):
         return f"{self.language.code} - {self.category}: {self.question[:50]}"
+
+
+class SearchQueryLog(models.Model):
+    """One /api/search/ request, written in batches for tuning and zero-result reports"""
+    query = models.CharField(max_length=255)
+    normalized_query = models.CharField(max_length=255, db_index=True)
+    result_count = models.PositiveIntegerField(default=0)
+    result_counts = models.JSONField(default=dict, blank=True, help_text="Hits per result group")
+    latency_ms = models.FloatField()
+    backend = models.CharField(max_length=20, blank=True)
+    cached = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Search Query Log"
+        verbose_name_plural = "Search Query Logs"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.query} ({self.result_count} results)"
@@ -0,0 +1,270 @@
+"""
+Transliteration-tolerant matching for Maldivian place names.
+
+Island names are written many ways (Maafushi/Mafushi, Malé/Male,
+Hulhumalé/Hulhumale, Thoddoo/Thodhoo), so ``icontains`` lookups miss most
+variants. Names are folded to a spelling-neutral key and compared by trigram
+similarity, the same measure pg_trgm uses.
+
+On PostgreSQL, pg_trgm picks the candidate names in the database. Everywhere
+else an in-process trigram index over ``Location``, ``Destination`` and
+``PlaceAlias`` rows is used. Either way only a bounded number of candidates is
+scored, so lookups stay fast as the catalog grows.
+"""
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+
+PLACE_INDEX_VERSION_KEY = 'place_matching:index_version'
+
+# Common romanisation variants of Dhivehi sounds, applied after lowercasing.
+_FOLDS = [
+    (re.compile(r'dh'), 'd'),            # dhigurah -> digurah
+    (re.compile(r'th'), 't'),            # thulusdhoo -> tulusdoo
+    (re.compile(r'([a-z])\1+'), r'\1'),  # maafushi -> mafushi, thoddoo -> todo
+]
+
+
+def normalize_place_name(value):
+    """Lowercase, strip accents and punctuation: 'Malé Atoll' -> 'male atoll'"""
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    return re.sub(r'[^a-z0-9]+', ' ', value.lower()).strip()
+
+
+def fold_place_name(value):
+    """Spelling-neutral key used for comparisons: 'Maafushi' and 'Mafushi' fold alike"""
+    value = normalize_place_name(value)
+    for pattern, replacement in _FOLDS:
+        value = pattern.sub(replacement, value)
+    return value
+
+
+def trigrams(value):
+    """pg_trgm style trigrams of the folded name (each word padded with spaces)"""
+    grams = set()
+    for word in fold_place_name(value).split():
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def similarity(a, b):
+    """Trigram similarity between two names, 0.0 - 1.0"""
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+def _threshold():
+    return getattr(settings, 'PLACE_MATCH_THRESHOLD', 0.3)
+
+
+def _max_candidates():
+    return getattr(settings, 'PLACE_MATCH_MAX_CANDIDATES', 50)
+
+
+class PlaceNameIndex:
+    """In-memory trigram index of place names.
+
+    Entries are ``(name, canonical_name, kind)`` tuples where ``kind`` is
+    ``'island'`` or ``'atoll'``. ``name`` is the spelling that is matched and
+    ``canonical_name`` the spelling stored on ``Location`` rows.
+    """
+
+    def __init__(self, entries):
+        self.entries = []
+        self.postings = defaultdict(list)
+        self.prefixes = []
+        seen = set()
+        for name, canonical, kind in entries:
+            key = fold_place_name(name)
+            if not key or (key, canonical, kind) in seen:
+                continue
+            seen.add((key, canonical, kind))
+            grams = frozenset(trigrams(name))
+            idx = len(self.entries)
+            self.entries.append((name, canonical, kind, grams))
+            for gram in grams:
+                self.postings[gram].append(idx)
+            self.prefixes.append((key, idx))
+        self.prefixes.sort()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _candidates(self, grams, max_candidates):
+        counts = defaultdict(int)
+        for gram in grams:
+            for idx in self.postings.get(gram, ()):
+                counts[idx] += 1
+        return [idx for idx, _ in heapq.nlargest(max_candidates, counts.items(), key=itemgetter(1))]
+
+    def _prefix_matches(self, key, max_candidates):
+        start = bisect.bisect_left(self.prefixes, (key,))
+        matches = []
+        for entry_key, idx in self.prefixes[start:start + max_candidates]:
+            if not entry_key.startswith(key):
+                break
+            matches.append((idx, len(key) / len(entry_key)))
+        return matches
+
+    def lookup(self, query, limit=5, threshold=None, max_candidates=None, prefix=False):
+        """Return ``[{'name', 'type', 'score'}]`` best matches for ``query``"""
+        threshold = _threshold() if threshold is None else threshold
+        max_candidates = max_candidates or _max_candidates()
+        grams = trigrams(query)
+        if not grams:
+            return []
+
+        best = {}
+        for idx in self._candidates(grams, max_candidates):
+            _, canonical, kind, entry_grams = self.entries[idx]
+            score = len(grams & entry_grams) / len(grams | entry_grams)
+            if score >= threshold and score > best.get((canonical, kind), 0):
+                best[(canonical, kind)] = score
+
+        if prefix:
+            # Autocomplete: a folded prefix of a name is always a good suggestion
+            for idx, coverage in self._prefix_matches(fold_place_name(query), max_candidates):
+                _, canonical, kind, _ = self.entries[idx]
+                score = 0.5 + 0.5 * coverage
+                if score > best.get((canonical, kind), 0):
+                    best[(canonical, kind)] = score
+
+        ranked = sorted(best.items(), key=lambda item: (-item[1], item[0][0]))[:limit]
+        return [{'name': name, 'type': kind, 'score': round(score, 3)} for (name, kind), score in ranked]
+
+
+def _place_entries():
+    """All matchable spellings from locations, destinations and aliases"""
+    from .models import Destination, Location, PlaceAlias
+
+    atolls = set()
+    entries = []
+    for island, atoll in Location.objects.values_list('island', 'atoll'):
+        entries.append((island, island, 'island'))
+        if atoll:
+            atolls.add(atoll)
+            entries.append((atoll, atoll, 'atoll'))
+    for name, island, atoll in Destination.objects.filter(is_active=True).values_list('name', 'island', 'atoll'):
+        entries.append((island, island, 'island'))
+        entries.append((name, island, 'island'))
+        if atoll:
+            atolls.add(atoll)
+            entries.append((atoll, atoll, 'atoll'))
+    for alias, canonical in PlaceAlias.objects.filter(is_active=True).values_list('alias', 'canonical_name'):
+        entries.append((alias, canonical, 'atoll' if canonical in atolls else 'island'))
+    return entries
+
+
+_index_lock = threading.Lock()
+_index = None
+_index_version = None
+_trgm_unavailable = False
+
+
+def invalidate_place_index():
+    """Mark the place index stale in every worker sharing the cache"""
+    try:
+        cache.incr(PLACE_INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(PLACE_INDEX_VERSION_KEY, 1, None)
+
+
+def get_place_index():
+    """Return the in-process index, rebuilding it when places have changed"""
+    global _index, _index_version
+    version = cache.get(PLACE_INDEX_VERSION_KEY, 0)
+    if _index is None or _index_version != version:
+        with _index_lock:
+            if _index is None or _index_version != version:
+                _index = PlaceNameIndex(_place_entries())
+                _index_version = version
+    return _index
+
+
+def _postgres_candidate_entries(query, max_candidates):
+    """Ask pg_trgm for the closest stored spellings as ``(name, canonical, kind)``; None if unavailable"""
+    global _trgm_unavailable
+    from django.contrib.postgres.search import TrigramSimilarity
+    from django.db.models import Exists, OuterRef
+    from .models import Destination, Location, PlaceAlias
+
+    normalized = normalize_place_name(query)
+    floor = _threshold() / 2
+
+    def closest(queryset, field, *columns):
+        return (
+            queryset.annotate(sim=TrigramSimilarity(field, normalized))
+            .filter(sim__gte=floor)
+            .order_by('-sim')
+            .values_list(*columns, 'sim')
+            .distinct()[:max_candidates]
+        )
+
+    try:
+        with transaction.atomic():
+            entries = []
+            for island, _ in closest(Location.objects.all(), 'island', 'island'):
+                entries.append((island, island, 'island'))
+            for atoll, _ in closest(Location.objects.exclude(atoll=''), 'atoll', 'atoll'):
+                entries.append((atoll, atoll, 'atoll'))
+            for name, island, _ in closest(Destination.objects.filter(is_active=True), 'name', 'name', 'island'):
+                entries.append((name, island, 'island'))
+            aliases = PlaceAlias.objects.filter(is_active=True).annotate(
+                is_atoll=Exists(Location.objects.filter(atoll=OuterRef('canonical_name')))
+                | Exists(Destination.objects.filter(is_active=True, atoll=OuterRef('canonical_name')))
+            )
+            for alias, canonical, is_atoll, _ in closest(aliases, 'alias', 'alias', 'canonical_name', 'is_atoll'):
+                entries.append((alias, canonical, 'atoll' if is_atoll else 'island'))
+            return entries
+    except DatabaseError:
+        _trgm_unavailable = True
+        return None
+
+
+def _use_trigram_extension():
+    return (
+        connection.vendor == 'postgresql'
+        and not _trgm_unavailable
+        and getattr(settings, 'PLACE_MATCH_USE_PG_TRGM', True)
+    )
+
+
+def match_places(query, limit=5, prefix=False):
+    """Return the places a (possibly misspelled) query most likely refers to"""
+    query = (query or '').strip()
+    if len(query) < 2:
+        return []
+    if _use_trigram_extension() and not prefix:
+        entries = _postgres_candidate_entries(query, _max_candidates())
+        if entries is not None:
+            # Re-score the database candidates with the folded trigram measure
+            matches = PlaceNameIndex(entries).lookup(query, limit=limit)
+            if matches:
+                return matches
+    return get_place_index().lookup(query, limit=limit, prefix=prefix)
+
+
+def place_filter(matches, island_field, atoll_field=None):
+    """Build a Q object matching rows located in any of the matched places"""
+    from django.db.models import Q
+
+    condition = Q()
+    for match in matches:
+        if match['type'] == 'atoll' and atoll_field:
+            condition |= Q(**{f'{atoll_field}__iexact': match['name']})
+        else:
+            condition |= Q(**{f'{island_field}__iexact': match['name']})
+    return condition
@@ -0,0 +1,150 @@
+"""
+Nightly pricing engine.
+
+The price of every night of a stay, for one property or thousands, comes
+from a properties × nights matrix of integer cents:
+
+1. every row starts at the property's ``price_per_night``;
+2. active ``PricingRule`` rows (seasons, weekday surcharges) are applied in
+   priority order, each as one masked array operation;
+3. ``Availability.price_override`` values replace whatever the rules gave.
+
+Building a matrix costs two queries (rules and overrides) however many
+properties and nights it covers. Money is kept as integer cents so totals
+add up exactly; multipliers round half up to the cent.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import Q
+
+from .models import Availability, PricingRule
+
+CENT = Decimal('0.01')
+_EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday (Monday = 0)
+
+
+def to_cents(amount):
+    return int((Decimal(amount) * 100).to_integral_value())
+
+
+def from_cents(cents):
+    return (Decimal(int(cents)) * CENT).quantize(CENT)
+
+
+def _night_axis(start, end):
+    """Dates, weekday numbers (Monday=0) and month*100+day keys for nights in [start, end)"""
+    dates = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D'))
+    day_numbers = dates.astype('int64')
+    weekdays = (day_numbers + _EPOCH_WEEKDAY) % 7
+    months = dates.astype('datetime64[M]')
+    month_days = (months.astype('int64') % 12 + 1) * 100 + (dates - months).astype('int64') + 1
+    return dates, weekdays, month_days
+
+
+def _rule_mask(rule, dates, weekdays, month_days):
+    """Boolean vector of the nights a rule applies to"""
+    mask = ((rule.weekdays >> weekdays) & 1).astype(bool)
+    if rule.repeats_yearly and rule.start_date and rule.end_date:
+        first = rule.start_date.month * 100 + rule.start_date.day
+        last = rule.end_date.month * 100 + rule.end_date.day
+        if first <= last:
+            mask &= (month_days >= first) & (month_days <= last)
+        else:  # wraps over New Year, e.g. 20 Dec - 10 Jan
+            mask &= (month_days >= first) | (month_days <= last)
+        return mask
+    if rule.start_date:
+        mask &= dates >= np.datetime64(rule.start_date, 'D')
+    if rule.end_date:
+        mask &= dates <= np.datetime64(rule.end_date, 'D')
+    return mask
+
+
+def _apply_rule(cents, rows, mask, rule):
+    """Adjust ``cents`` in place for the given row indices and night mask"""
+    cells = np.ix_(rows, np.flatnonzero(mask))
+    block = cents[cells]
+    if rule.adjustment_type == 'multiplier':
+        block = np.floor(block * float(rule.value) + 0.5).astype('int64')
+    elif rule.adjustment_type == 'amount':
+        block = block + to_cents(rule.value)
+    else:
+        block = np.full_like(block, to_cents(rule.value))
+    cents[cells] = np.maximum(block, 0)
+
+
+class PriceMatrix:
+    """Nightly prices in cents for ``property_ids`` × nights in [start, end)"""
+
+    def __init__(self, base_prices, start, end, overrides=None):
+        """``base_prices`` maps property id -> price_per_night.
+
+        ``overrides`` may carry already-fetched ``(property_id, date, price)``
+        tuples; otherwise they are queried.
+        """
+        if end <= start:
+            raise ValueError('end must be after start')
+        self.start = start
+        self.end = end
+        self.property_ids = list(base_prices)
+        self._rows = {pk: i for i, pk in enumerate(self.property_ids)}
+        dates, weekdays, month_days = _night_axis(start, end)
+
+        base = np.array([to_cents(base_prices[pk]) for pk in self.property_ids], dtype='int64')
+        self.cents = np.repeat(base[:, None], len(dates), axis=1)
+        if not self.property_ids:
+            return
+
+        rules = PricingRule.objects.filter(is_active=True).filter(
+            Q(property_obj__isnull=True) | Q(property_obj_id__in=self.property_ids)
+        ).filter(
+            Q(repeats_yearly=True) |
+            ((Q(start_date__isnull=True) | Q(start_date__lt=end)) & (Q(end_date__isnull=True) | Q(end_date__gte=start)))
+        ).order_by('priority', 'id')
+        for rule in rules:
+            mask = _rule_mask(rule, dates, weekdays, month_days)
+            if not mask.any():
+                continue
+            if rule.property_obj_id is None:
+                rows = np.arange(len(self.property_ids))
+            else:
+                rows = np.array([self._rows[rule.property_obj_id]])
+            _apply_rule(self.cents, rows, mask, rule)
+
+        if overrides is None:
+            overrides = Availability.objects.filter(
+                property_obj_id__in=self.property_ids, date__gte=start, date__lt=end, price_override__isnull=False
+            ).values_list('property_obj_id', 'date', 'price_override')
+        overrides = [(pk, day, price) for pk, day, price in overrides if price is not None]
+        if overrides:
+            rows = np.array([self._rows[pk] for pk, _, _ in overrides])
+            cols = np.array([(day - start).days for _, day, _ in overrides])
+            self.cents[rows, cols] = [to_cents(price) for _, _, price in overrides]
+
+    @property
+    def nights(self):
+        return self.cents.shape[1]
+
+    def nightly(self, property_id):
+        """Decimal price of each night for one property"""
+        return [from_cents(value) for value in self.cents[self._rows[property_id]]]
+
+    def total(self, property_id):
+        return from_cents(self.cents[self._rows[property_id]].sum())
+
+    def totals(self):
+        """``{property_id: Decimal total}`` for every row, in one vector sum"""
+        return {pk: from_cents(value) for pk, value in zip(self.property_ids, self.cents.sum(axis=1))}
+
+    def ids_by_total(self, descending=False):
+        """Property ids ordered by total, ties by id, sorted on the cent arrays without per-row objects"""
+        ids = np.array(self.property_ids, dtype='int64')
+        order = np.lexsort((ids, self.cents.sum(axis=1)))
+        return ids[order[::-1] if descending else order].tolist()
+
+
+def quote(property_obj, check_in, check_out):
+    """``(nightly prices, total)`` for a stay at one property"""
+    matrix = PriceMatrix({property_obj.pk: property_obj.price_per_night}, check_in, check_out)
+    return matrix.nightly(property_obj.pk), matrix.total(property_obj.pk)
+
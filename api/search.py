@@ -0,0 +1,419 @@
+"""
+Search backends for the ``search`` view.
+
+Catalog rows (properties, packages, locations) and help content (published
+CMS pages, active FAQs and cultural notes) are searched together. Content
+hits come back as ``{'type', 'id', 'title', 'snippet', ...}`` dicts, with the
+snippet cut from the page or answer text around the first matched word.
+
+``DatabaseSearchBackend`` filters with ``icontains`` plus fuzzy place
+matching and suits PostgreSQL. ``InvertedIndexSearchBackend`` answers from
+the file-backed index in ``search_index.py`` and suits SQLite and small
+installs, where ``icontains`` means a full table scan per field. Each backend
+returns ``{doc_type: [pk, ...]}`` and the view loads and serializes the rows.
+
+Responses are cached under the normalized query. The cache keys embed
+per-tag version counters ('catalog', 'content') that model signals bump, so a
+change invalidates every cached response that could include it.
+
+``SEARCH_BACKEND`` chooses the backend: ``'database'``, ``'index'`` or
+``'auto'``. ``'auto'`` uses the index when the database is not PostgreSQL
+and the index file has been built with ``manage.py build_search_index``.
+"""
+import hashlib
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, models, transaction
+from django.utils.html import strip_tags
+
+from .place_matching import fold_place_name, place_filter
+from .search_index import InvertedIndex, tokenize
+
+# PageBlock.data keys holding URLs, ids or styling rather than readable text
+NON_TEXT_BLOCK_KEYS = frozenset([
+    'alignment', 'background', 'class', 'color', 'href', 'icon', 'id', 'image', 'image_url',
+    'link', 'src', 'style', 'url', 'video_url',
+])
+SNIPPET_LENGTH = 160
+SEARCH_CACHE_TAGS = ('catalog', 'content')
+
+
+def _property_documents(pks=None):
+    from .models import Property
+
+    queryset = Property.objects.select_related('location', 'property_type')
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    for prop in queryset.iterator():
+        location = prop.location
+        yield 'property', prop.pk, prop.name, ' '.join([
+            prop.description,
+            prop.address,
+            prop.property_type.name,
+            location.island if location else '',
+            location.atoll if location else '',
+        ])
+
+
+def _package_documents(pks=None):
+    from .models import Package
+
+    queryset = Package.objects.prefetch_related('destinations__location')
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    for package in queryset.iterator(chunk_size=500):
+        places = [
+            f'{destination.location.island} {destination.location.atoll}'
+            for destination in package.destinations.all()
+        ]
+        yield 'package', package.pk, package.name, ' '.join([
+            package.description,
+            package.category,
+            package.highlights,
+            *places,
+        ])
+
+
+def _location_documents(pks=None):
+    from .models import Location
+
+    queryset = Location.objects.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    for location in queryset.iterator():
+        yield 'location', location.pk, location.island, location.atoll
+
+
+def block_text(data):
+    """Readable text of a PageBlock.data JSON value, markup stripped"""
+    if isinstance(data, dict):
+        return ' '.join(block_text(value) for key, value in data.items() if key not in NON_TEXT_BLOCK_KEYS)
+    if isinstance(data, list):
+        return ' '.join(block_text(value) for value in data)
+    if isinstance(data, str):
+        return strip_tags(data)
+    return ''
+
+
+def _page_text(page):
+    return ' '.join([
+        page.meta_description,
+        strip_tags(page.content),
+        *(block_text(block.data) for block in page.blocks.all()),
+    ])
+
+
+def _page_documents(pks=None):
+    from .models import Page
+
+    queryset = Page.objects.filter(status='published').prefetch_related('blocks')
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    for page in queryset.iterator(chunk_size=200):
+        yield 'page', page.pk, page.title, _page_text(page)
+
+
+def _faq_documents(model_name, doc_type):
+    def documents(pks=None):
+        from . import models as api_models
+
+        queryset = getattr(api_models, model_name).objects.filter(is_active=True)
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        for faq in queryset.iterator():
+            yield doc_type, faq.pk, faq.question, f'{faq.category} {faq.answer}'
+    return documents
+
+
+def _cultural_documents(pks=None):
+    from .models import CulturalContent
+
+    queryset = CulturalContent.objects.filter(is_active=True)
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    for item in queryset.iterator():
+        yield 'cultural_content', item.pk, item.title, f'{item.get_content_type_display()} {item.content}'
+
+
+# doc_type -> generator of (doc_type, pk, title, text) for all rows or the given pks
+SEARCH_DOCUMENTS = {
+    'property': _property_documents,
+    'package': _package_documents,
+    'location': _location_documents,
+    'page': _page_documents,
+    'transfer_faq': _faq_documents('TransferFAQ', 'transfer_faq'),
+    'localized_faq': _faq_documents('LocalizedFAQ', 'localized_faq'),
+    'cultural_content': _cultural_documents,
+}
+CATALOG_TYPES = ('property', 'package', 'location')
+CONTENT_TYPES = ('page', 'transfer_faq', 'localized_faq', 'cultural_content')
+
+
+def parse_search_types(value):
+    """``'property,content'`` -> set of doc types; raises ValueError on unknown names"""
+    if not value:
+        return None
+    doc_types = set()
+    for name in (part.strip() for part in value.split(',')):
+        if name == 'content':
+            doc_types.update(CONTENT_TYPES)
+        elif name in CATALOG_TYPES or name in CONTENT_TYPES:
+            doc_types.add(name)
+        elif name:
+            raise ValueError(f"Unknown search type '{name}'")
+    return doc_types or None
+
+
+def extract_snippet(text, query, length=SNIPPET_LENGTH):
+    """Cut ``length`` characters of ``text`` around the first word matching ``query``"""
+    text = ' '.join(text.split())
+    if len(text) <= length:
+        return text
+    tokens = tokenize(query)
+    start = 0
+    for word in re.finditer(r'\w+', text):
+        folded = fold_place_name(word.group())
+        if any(folded.startswith(token) for token in tokens):
+            start = max(word.start() - length // 4, 0)
+            break
+    if start:
+        # Begin on a word boundary
+        start = text.find(' ', start) + 1 or start
+    snippet = text[start:start + length]
+    if start + length < len(text):
+        snippet = snippet.rsplit(' ', 1)[0] + '…'
+    return ('…' if start else '') + snippet
+
+
+def content_results(found, query, limit=10):
+    """Load content hits from ``{doc_type: [pk, ...]}``, interleaving types by rank"""
+    from .models import CulturalContent, LocalizedFAQ, Page, TransferFAQ
+
+    loaders = {
+        'page': Page.objects.prefetch_related('blocks'),
+        'transfer_faq': TransferFAQ.objects.all(),
+        'localized_faq': LocalizedFAQ.objects.select_related('language'),
+        'cultural_content': CulturalContent.objects.select_related('language'),
+    }
+    ranked = {}
+    for doc_type in CONTENT_TYPES:
+        pks = found.get(doc_type)
+        if pks:
+            objects = loaders[doc_type].in_bulk(pks)
+            ranked[doc_type] = [objects[pk] for pk in pks if pk in objects]
+
+    results = []
+    for rank in range(max(map(len, ranked.values()), default=0)):
+        for doc_type, objects in ranked.items():
+            if rank < len(objects) and len(results) < limit:
+                results.append(_content_result(doc_type, objects[rank], query))
+    return results
+
+
+def _content_result(doc_type, obj, query):
+    if doc_type == 'page':
+        return {
+            'type': doc_type, 'id': obj.pk, 'title': obj.title, 'url': obj.path or obj.page_path,
+            'locale': obj.locale, 'snippet': extract_snippet(_page_text(obj), query),
+        }
+    if doc_type == 'cultural_content':
+        return {
+            'type': doc_type, 'id': obj.pk, 'title': obj.title, 'category': obj.content_type,
+            'locale': obj.language.code, 'snippet': extract_snippet(obj.content, query),
+        }
+    result = {
+        'type': doc_type, 'id': obj.pk, 'title': obj.question, 'category': obj.category,
+        'snippet': extract_snippet(obj.answer, query),
+    }
+    if doc_type == 'localized_faq':
+        result['locale'] = obj.language.code
+    return result
+
+
+def iter_documents(doc_types=None):
+    for doc_type, documents in SEARCH_DOCUMENTS.items():
+        if doc_types is None or doc_type in doc_types:
+            yield from documents()
+
+
+def _index_path():
+    return str(getattr(settings, 'SEARCH_INDEX_PATH', os.path.join(settings.BASE_DIR, 'search_index.idx')))
+
+
+_index_lock = threading.Lock()
+_index = None
+
+
+def get_search_index():
+    """Return this process's view of the index file"""
+    global _index
+    path = _index_path()
+    if _index is None or _index.path != path:
+        with _index_lock:
+            if _index is None or _index.path != path:
+                _index = InvertedIndex(path)
+    return _index
+
+
+def rebuild_search_index():
+    """Rebuild the index file from the database; returns the number of documents"""
+    return get_search_index().rebuild(iter_documents())
+
+
+def _index_in_use():
+    return getattr(settings, 'SEARCH_BACKEND', 'auto') != 'database' and os.path.exists(_index_path())
+
+
+def update_search_index(doc_type, pks):
+    """Re-index rows after the current transaction commits (no-op without an index file)"""
+    if not _index_in_use():
+        return
+    pks = list(pks)
+
+    def apply():
+        index = get_search_index()
+        found = set()
+        for _, pk, title, text in SEARCH_DOCUMENTS[doc_type](pks):
+            index.upsert(doc_type, pk, title, text)
+            found.add(pk)
+        for pk in set(pks) - found:
+            index.delete(doc_type, pk)
+
+    transaction.on_commit(apply)
+
+
+def remove_from_search_index(doc_type, pk):
+    """Drop a deleted row from the index after the current transaction commits"""
+    if not _index_in_use():
+        return
+    transaction.on_commit(lambda: get_search_index().delete(doc_type, pk))
+
+
+def normalize_query(query):
+    """Cache and log key for a query: case-folded with whitespace collapsed"""
+    return ' '.join(query.casefold().split())
+
+
+def _tag_key(tag):
+    return f'search:tag:{tag}'
+
+
+def invalidate_search_cache(*tags):
+    """Expire cached search responses that depend on ``tags``"""
+    for tag in tags or SEARCH_CACHE_TAGS:
+        try:
+            cache.incr(_tag_key(tag))
+        except ValueError:
+            cache.set(_tag_key(tag), 1, None)
+
+
+def search_cache_key(query, doc_types=None, backend_name=''):
+    versions = cache.get_many([_tag_key(tag) for tag in SEARCH_CACHE_TAGS])
+    tag_part = '.'.join(str(versions.get(_tag_key(tag), 0)) for tag in SEARCH_CACHE_TAGS)
+    types_part = ','.join(sorted(doc_types or ()))
+    digest = hashlib.sha1(f'{normalize_query(query)}|{types_part}'.encode('utf-8')).hexdigest()
+    return f'search:result:{backend_name}:{tag_part}:{digest}'
+
+
+def _cache_timeout():
+    return getattr(settings, 'SEARCH_CACHE_TIMEOUT', 300)
+
+
+def cached_search(query, doc_types, backend_name, compute):
+    """Return ``(response_data, cached)``; ``compute()`` builds the data on a miss"""
+    timeout = _cache_timeout()
+    if not timeout:
+        return compute(), False
+    key = search_cache_key(query, doc_types, backend_name)
+    data = cache.get(key)
+    if data is not None:
+        return data, True
+    data = compute()
+    cache.set(key, data, timeout)
+    return data, False
+
+
+class DatabaseSearchBackend:
+    """``icontains`` lookups plus rows located in fuzzily matched places"""
+
+    name = 'database'
+
+    def _querysets(self, query, places):
+        from .models import CulturalContent, Location, LocalizedFAQ, Package, Page, Property, TransferFAQ
+
+        faq_filter = models.Q(question__icontains=query) | models.Q(answer__icontains=query)
+        return {
+            'property': Property.objects.filter(
+                models.Q(name__icontains=query) |
+                models.Q(description__icontains=query) |
+                models.Q(address__icontains=query) |
+                place_filter(places, 'location__island', 'location__atoll')
+            ),
+            'package': Package.objects.filter(
+                models.Q(name__icontains=query) |
+                models.Q(description__icontains=query) |
+                place_filter(places, 'destinations__location__island', 'destinations__location__atoll')
+            ).distinct(),
+            'location': Location.objects.filter(
+                models.Q(island__icontains=query) |
+                models.Q(atoll__icontains=query) |
+                place_filter(places, 'island', 'atoll')
+            ),
+            'page': Page.objects.filter(status='published').filter(
+                models.Q(title__icontains=query) |
+                models.Q(content__icontains=query) |
+                models.Q(meta_description__icontains=query) |
+                models.Q(blocks__data__icontains=query)
+            ).distinct(),
+            'transfer_faq': TransferFAQ.objects.filter(is_active=True).filter(faq_filter),
+            'localized_faq': LocalizedFAQ.objects.filter(is_active=True).filter(faq_filter),
+            'cultural_content': CulturalContent.objects.filter(is_active=True).filter(
+                models.Q(title__icontains=query) | models.Q(content__icontains=query)
+            ),
+        }
+
+    def search(self, query, places, limit=10, doc_types=None):
+        return {
+            doc_type: list(queryset.values_list('pk', flat=True)[:limit])
+            for doc_type, queryset in self._querysets(query, places).items()
+            if doc_types is None or doc_type in doc_types
+        }
+
+
+class InvertedIndexSearchBackend:
+    """Ranked lookups in the file-backed inverted index"""
+
+    name = 'index'
+
+    def search(self, query, places, limit=10, doc_types=None):
+        index = get_search_index()
+        results = index.search(query, doc_types=doc_types, limit=limit)
+        # Places the query fuzzily resolved to rank after the direct hits
+        for place in places:
+            for doc_type, pks in index.search(place['name'], doc_types=doc_types, limit=limit).items():
+                ranked = results.setdefault(doc_type, [])
+                ranked.extend(pk for pk in pks if pk not in ranked)
+                del ranked[limit:]
+        return results
+
+
+SEARCH_BACKENDS = {
+    DatabaseSearchBackend.name: DatabaseSearchBackend,
+    InvertedIndexSearchBackend.name: InvertedIndexSearchBackend,
+}
+
+
+def get_search_backend():
+    """Pick the backend configured by ``SEARCH_BACKEND``"""
+    choice = getattr(settings, 'SEARCH_BACKEND', 'auto')
+    if choice == 'auto':
+        use_index = connection.vendor != 'postgresql' and os.path.exists(_index_path())
+        choice = InvertedIndexSearchBackend.name if use_index else DatabaseSearchBackend.name
+    if choice not in SEARCH_BACKENDS:
+        raise ImproperlyConfigured(f"SEARCH_BACKEND must be 'auto' or one of {', '.join(SEARCH_BACKENDS)}")
+    return SEARCH_BACKENDS[choice]()
@@ -0,0 +1,316 @@
+"""
+Pure-Python inverted index used by ``search`` where the database offers no
+full-text search (the SQLite fallback in settings.py and small installs).
+
+File layout (native byte order, written and read on the same host)::
+
+    b'TTSI' | uint32 format version | uint32 header length | JSON header
+    uint32 term offsets[len(terms) + 1]
+    uint32 postings (sorted document numbers, one run per term)
+
+The header holds the sorted term list and the ``(type, id)`` key of every
+document. Offsets and postings are memory-mapped and read through
+``memoryview.cast('I')``, so posting lists never become Python objects until
+a query touches them.
+
+Between rebuilds, changes are appended to ``<path>.journal`` as JSON lines
+and every process replays new lines before answering a query. Rebuilding
+writes a fresh file, swaps it in atomically and keeps only the journal lines
+written during the rebuild.
+"""
+import bisect
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from array import array
+from collections import defaultdict
+
+from .place_matching import fold_place_name
+
+MAGIC = b'TTSI'
+FORMAT_VERSION = 1
+TITLE_PREFIX = '='  # title terms are indexed twice: 'word' and '=word'
+MAX_PREFIX_EXPANSIONS = 50
+
+STOPWORDS = frozenset([
+    'a', 'an', 'and', 'at', 'by', 'for', 'from', 'in', 'is', 'of', 'on', 'or', 'the', 'to', 'with',
+])
+
+
+def tokenize(text):
+    """Split text into folded search terms ('Malé Guesthouses' -> ['male', 'guesthouses'])"""
+    return [
+        token for token in fold_place_name(text).split()
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def document_terms(title, text):
+    """Distinct terms of a document; title words are also indexed as '=word'"""
+    title_terms = set(tokenize(title))
+    terms = title_terms | set(tokenize(text))
+    terms.update(TITLE_PREFIX + term for term in title_terms)
+    return terms
+
+
+def write_index(path, documents):
+    """Write an index file for ``documents``, an iterable of ``(type, id, title, text)``
+
+    Returns the number of documents written. The file is replaced atomically.
+    """
+    postings = defaultdict(list)
+    keys = []
+    for docnum, (doc_type, doc_id, title, text) in enumerate(documents):
+        keys.append([doc_type, doc_id])
+        for term in document_terms(title, text):
+            postings[term].append(docnum)
+
+    terms = sorted(postings)
+    offsets = array('I', [0])
+    flat = array('I')
+    for term in terms:
+        flat.extend(postings[term])
+        offsets.append(len(flat))
+
+    header = json.dumps({'terms': terms, 'docs': keys}, separators=(',', ':')).encode('utf-8')
+    # Pad the header so the uint32 regions start on a 4-byte boundary
+    header += b' ' * (-(len(header) + 12) % 4)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as fh:
+        fh.write(MAGIC)
+        fh.write(struct.pack('=II', FORMAT_VERSION, len(header)))
+        fh.write(header)
+        offsets.tofile(fh)
+        flat.tofile(fh)
+    os.replace(tmp_path, path)
+    return len(keys)
+
+
+class InvertedIndex:
+    """Read side of an index file plus the changes recorded in its journal"""
+
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = f'{path}.journal'
+        self._lock = threading.RLock()
+        self._file = None
+        self._mmap = None
+        self._offsets = None
+        self._postings = None
+        self._stat = None
+        self._journal_offset = 0
+        self._reset()
+
+    # -- loading -----------------------------------------------------------
+
+    def _reset(self):
+        self.terms = []
+        self.docs = []
+        self._base_count = 0
+        self._live = {}
+        self._deleted = set()
+        self._added = defaultdict(set)
+
+    def _close(self):
+        for view in (self._offsets, self._postings):
+            if view is not None:
+                view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        if self._file is not None:
+            self._file.close()
+        self._file = self._mmap = self._offsets = self._postings = None
+
+    def _load(self):
+        self._close()
+        self._reset()
+        self._journal_offset = 0
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._stat = None
+            return
+        self._stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self._file = open(self.path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:4] != MAGIC:
+            raise ValueError(f'{self.path} is not a search index file')
+        version, header_length = struct.unpack_from('=II', self._mmap, 4)
+        if version != FORMAT_VERSION:
+            raise ValueError(f'{self.path} has unsupported index format {version}')
+        start = 12 + header_length
+        header = json.loads(self._mmap[12:start].decode('utf-8'))
+        self.terms = header['terms']
+        self.docs = [tuple(key) for key in header['docs']]
+        self._base_count = len(self.docs)
+        self._live = {key: docnum for docnum, key in enumerate(self.docs)}
+
+        view = memoryview(self._mmap)
+        offsets_end = start + 4 * (len(self.terms) + 1)
+        self._offsets = view[start:offsets_end].cast('I')
+        self._postings = view[offsets_end:].cast('I')
+        view.release()
+
+    def refresh(self):
+        """Reload after a rebuild and replay journal lines written by other processes"""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+                current = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                current = None
+            if current != self._stat:
+                self._load()
+            self._replay_journal()
+
+    def _replay_journal(self):
+        try:
+            with open(self.journal_path, 'rb') as fh:
+                fh.seek(0, os.SEEK_END)
+                size = fh.tell()
+                if size < self._journal_offset:
+                    # Journal was compacted by a rebuild we have not loaded yet
+                    self._load()
+                if size == self._journal_offset:
+                    return
+                fh.seek(self._journal_offset)
+                for line in fh:
+                    if not line.endswith(b'\n'):
+                        break  # partially written line, pick it up next time
+                    self._journal_offset += len(line)
+                    self._apply(json.loads(line))
+        except FileNotFoundError:
+            return
+
+    @property
+    def exists(self):
+        return self._stat is not None
+
+    # -- incremental updates ----------------------------------------------
+
+    def _apply(self, entry):
+        key = (entry['type'], entry['id'])
+        old = self._live.pop(key, None)
+        if old is not None:
+            self._deleted.add(old)
+        if entry['op'] == 'upsert':
+            docnum = len(self.docs)
+            self.docs.append(key)
+            self._live[key] = docnum
+            for term in document_terms(entry.get('title', ''), entry.get('text', '')):
+                self._added[term].add(docnum)
+
+    def _append(self, entry):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            self.refresh()
+            with open(self.journal_path, 'ab') as fh:
+                fh.write(line.encode('utf-8'))
+            self._replay_journal()
+
+    def upsert(self, doc_type, doc_id, title, text):
+        self._append({'op': 'upsert', 'type': doc_type, 'id': doc_id, 'title': title, 'text': text})
+
+    def delete(self, doc_type, doc_id):
+        self._append({'op': 'delete', 'type': doc_type, 'id': doc_id})
+
+    def rebuild(self, documents):
+        """Write a new base file from ``documents`` and compact the journal"""
+        with self._lock:
+            try:
+                journal_start = os.path.getsize(self.journal_path)
+            except FileNotFoundError:
+                journal_start = 0
+            count = write_index(self.path, documents)
+            if journal_start or os.path.exists(self.journal_path):
+                # Keep only changes made while the rebuild was reading the database
+                with open(self.journal_path, 'rb') as fh:
+                    fh.seek(journal_start)
+                    tail = fh.read()
+                tmp_path = f'{self.journal_path}.tmp'
+                with open(tmp_path, 'wb') as fh:
+                    fh.write(tail)
+                os.replace(tmp_path, self.journal_path)
+            self._load()
+            self._replay_journal()
+            return count
+
+    # -- querying ------------------------------------------------------------
+
+    def _base_postings(self, term):
+        i = bisect.bisect_left(self.terms, term)
+        if i == len(self.terms) or self.terms[i] != term:
+            return ()
+        return self._postings[self._offsets[i]:self._offsets[i + 1]]
+
+    def _term_docs(self, term):
+        docs = set(self._base_postings(term))
+        docs |= self._added.get(term, set())
+        docs -= self._deleted
+        return docs
+
+    def _prefix_terms(self, prefix):
+        i = bisect.bisect_left(self.terms, prefix)
+        expanded = []
+        while i < len(self.terms) and self.terms[i].startswith(prefix) and len(expanded) < MAX_PREFIX_EXPANSIONS:
+            expanded.append(self.terms[i])
+            i += 1
+        expanded.extend(term for term in self._added if term.startswith(prefix) and term not in expanded)
+        return expanded[:MAX_PREFIX_EXPANSIONS]
+
+    def search(self, query, doc_types=None, limit=10):
+        """Return ``{type: [id, ...]}`` ranked by matched terms, title hits first
+
+        Every query term must match (the last one as a prefix, for
+        type-ahead). If that finds nothing, documents matching any term are
+        ranked by how many terms they contain.
+        """
+        self.refresh()
+        tokens = tokenize(query)
+        if not tokens:
+            return {}
+        with self._lock:
+            total = max(len(self._live), 1)
+            scores = defaultdict(float)
+            matched = defaultdict(int)
+            for position, token in enumerate(tokens):
+                candidates = [token]
+                if position == len(tokens) - 1:
+                    candidates = self._prefix_terms(token) or candidates
+                token_docs = set()
+                for term in candidates:
+                    docs = self._term_docs(term)
+                    if not docs:
+                        continue
+                    idf = math.log(1 + total / len(docs))
+                    exact = 1.0 if term == token else 0.5
+                    for docnum in docs:
+                        scores[docnum] += idf * exact
+                    for docnum in self._term_docs(TITLE_PREFIX + term):
+                        scores[docnum] += idf * exact
+                    token_docs |= docs
+                for docnum in token_docs:
+                    matched[docnum] += 1
+
+            required = len(tokens)
+            hits = [docnum for docnum, count in matched.items() if count == required]
+            if not hits:
+                hits = list(matched)
+            hits.sort(key=lambda docnum: (-matched[docnum], -scores[docnum], docnum))
+
+            results = defaultdict(list)
+            for docnum in hits:
+                doc_type, doc_id = self.docs[docnum]
+                if doc_types and doc_type not in doc_types:
+                    continue
+                if len(results[doc_type]) < limit:
+                    results[doc_type].append(doc_id)
+            return dict(results)
+
+    def __len__(self):
+        return len(self._live)
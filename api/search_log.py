@@ -0,0 +1,115 @@
+"""
+Append-only log of search requests.
+
+Rows are buffered in memory and written with one ``bulk_create`` once
+``SEARCH_LOG_BATCH_SIZE`` rows are waiting, so logging adds no query to a
+typical search request. The first row buffered after a write also starts a
+daemon timer that flushes ``SEARCH_LOG_FLUSH_INTERVAL`` seconds later, so no
+row waits longer than that, however quiet the worker is. Whatever is still
+buffered is flushed at interpreter exit.
+
+Timed flushes write on the timer thread's own connection, outside any
+transaction the request is in. Code that logs searches inside a transaction
+it will roll back (``benchmark_search``) wraps them in ``query_log.paused()``
+and flushes on its own connection before rolling back.
+"""
+import atexit
+import contextlib
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class SearchQueryLogBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = []
+        self._timer = None
+        self._paused = 0
+
+    def record(self, query, normalized_query, result_counts, latency_ms, backend='', cached=False):
+        from .models import SearchQueryLog
+
+        row = SearchQueryLog(
+            query=query[:255],
+            normalized_query=normalized_query[:255],
+            result_count=sum(result_counts.values()),
+            result_counts=result_counts,
+            latency_ms=round(latency_ms, 2),
+            backend=backend,
+            cached=cached,
+            created_at=timezone.now(),
+        )
+        with self._lock:
+            self._rows.append(row)
+            due = len(self._rows) >= getattr(settings, 'SEARCH_LOG_BATCH_SIZE', 100)
+            if not due and self._timer is None and not self._paused:
+                self._timer = threading.Timer(getattr(settings, 'SEARCH_LOG_FLUSH_INTERVAL', 30), self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+            if self._paused:
+                return
+            rows, self._rows = self._rows, []
+        try:
+            self._write(rows)
+        finally:
+            connections.close_all()  # the timer thread opened its own connection
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Suspend timed flushes inside the block
+
+        Batch-size and explicit flushes still run, on the caller's connection
+        and so inside its transaction; rows still buffered at the end of the
+        block are flushed the same way.
+        """
+        with self._lock:
+            self._paused += 1
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._paused -= 1
+                resume = bool(self._rows) and not self._paused
+            if resume:
+                self.flush()
+
+    def flush(self):
+        """Write buffered rows; returns how many were written"""
+        with self._lock:
+            rows, self._rows = self._rows, []
+        return self._write(rows)
+
+    def _write(self, rows):
+        from .models import SearchQueryLog
+
+        if not rows:
+            return 0
+        try:
+            SearchQueryLog.objects.bulk_create(rows)
+        except DatabaseError:
+            # Analytics must never break search; drop the batch
+            logger.exception('Could not write %d search log rows', len(rows))
+            return 0
+        return len(rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+
+query_log = SearchQueryLogBuffer()
+atexit.register(query_log.flush)
@@ -7,8 +7,12 @@ from .models import (
     TransferContactMethod, TransferBookingStep, TransferBenefit, TransferPricingFactor, TransferContent, FerrySchedule,
     HomepageHero, HomepageFeature, HomepageTestimonial, HomepageStatistic, HomepageCTASection, HomepageSettings, HomepageContent, HomepageImage,
     PageHero, Language, TranslationKey, Translation, CulturalContent, RegionalSettings, LocalizedPage, LocalizedFAQ,
-    AboutPageContent, AboutPageValue, AboutPageStatistic, FeaturedDestination
+    AboutPageContent, AboutPageValue, AboutPageStatistic, FeaturedDestination, PricingRule
 )
+from .availability import MAX_CALENDAR_NIGHTS, PropertyCalendar
+from .bookings import BookingUnavailable, create_booking, hold_booking
+from .transfer_quotes import parse_rules
+from .transfer_tree import load_atoll_tree
 
 class PropertyTypeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -93,6 +97,11 @@ class PropertySerializer(serializers.ModelSerializer):
         model = Property
         fields = '__all__'
 
+class AvailablePropertySerializer(PropertySerializer):
+    """Property in availability search results, with the quoted stay"""
+    nights = serializers.IntegerField(read_only=True)
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
 class PackageImageSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField(read_only=True)
     package_id = serializers.IntegerField(write_only=True, required=False)
@@ -430,6 +439,46 @@ class AvailabilitySerializer(serializers.ModelSerializer):
         model = Availability
         fields = '__all__'
 
+class AvailabilityRangeSerializer(serializers.Serializer):
+    start_date = serializers.DateField()
+    end_date = serializers.DateField(help_text="Last night of the range (inclusive)")
+    weekdays = serializers.IntegerField(
+        min_value=1, max_value=PricingRule.ALL_WEEKDAYS, default=PricingRule.ALL_WEEKDAYS,
+        help_text="Bitmask of nights: Monday=1, Tuesday=2, ... Sunday=64"
+    )
+    is_available = serializers.BooleanField(required=False)
+    price_override = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False, allow_null=True
+    )
+    
+    def validate(self, data):
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError("End date must not be before start date")
+        if (data['end_date'] - data['start_date']).days >= MAX_CALENDAR_NIGHTS:
+            raise serializers.ValidationError(f"A range may cover at most {MAX_CALENDAR_NIGHTS} nights")
+        if 'is_available' not in data and 'price_override' not in data:
+            raise serializers.ValidationError("Set is_available, price_override or both")
+        return data
+
+class AvailabilityBulkRangeSerializer(serializers.Serializer):
+    property_id = serializers.PrimaryKeyRelatedField(queryset=Property.objects.all(), source='property_obj')
+    ranges = AvailabilityRangeSerializer(many=True, allow_empty=False)
+
+class PricingRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PricingRule
+        fields = '__all__'
+    
+    def validate(self, data):
+        start_date = data.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = data.get('end_date', getattr(self.instance, 'end_date', None))
+        repeats_yearly = data.get('repeats_yearly', getattr(self.instance, 'repeats_yearly', False))
+        if start_date and end_date and end_date < start_date and not repeats_yearly:
+            raise serializers.ValidationError("End date must not be before start date")
+        if not 0 < data.get('weekdays', PricingRule.ALL_WEEKDAYS) <= PricingRule.ALL_WEEKDAYS:
+            raise serializers.ValidationError("weekdays must be a bitmask between 1 and 127")
+        return data
+
 class BookingSerializer(serializers.ModelSerializer):
     property = PropertySerializer(read_only=True)
     property_id = serializers.PrimaryKeyRelatedField(queryset=Property.objects.all(), source='property_obj', write_only=True)
@@ -437,8 +486,9 @@ class BookingSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Booking
-        fields = '__all__'
-        read_only_fields = ('total_price', 'status', 'created_at', 'updated_at')
+        # hold_token authorizes confirming a hold, so only the guest holding it may see it
+        exclude = ('hold_token',)
+        read_only_fields = ('total_price', 'status', 'hold_expires_at', 'created_at', 'updated_at')
 
 class BookingCreateSerializer(serializers.ModelSerializer):
     property_id = serializers.PrimaryKeyRelatedField(queryset=Property.objects.all(), source='property_obj')
@@ -455,28 +505,60 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         if data['check_in_date'] >= data['check_out_date']:
             raise serializers.ValidationError("Check-out date must be after check-in date")
         
-        # Check if property is available for the selected dates
         property_obj = data['property_obj']
-        check_in = data['check_in_date']
-        check_out = data['check_out_date']
-        
-        # Check for existing bookings that overlap
-        overlapping_bookings = Booking.objects.filter(
-            property_obj=property_obj,
-            status__in=['pending', 'confirmed'],
-            check_in_date__lt=check_out,
-            check_out_date__gt=check_in
-        )
+        guests = data.get('number_of_guests', 1)
+        if property_obj.max_guests and guests > property_obj.max_guests:
+            raise serializers.ValidationError(f"This property accepts at most {property_obj.max_guests} guests")
         
-        if overlapping_bookings.exists():
+        # Early check for a friendly error; create() re-checks under a lock
+        calendar = PropertyCalendar(property_obj, data['check_in_date'], data['check_out_date'])
+        if not calendar.is_available:
             raise serializers.ValidationError("Property is not available for the selected dates")
         
-        # Calculate total price
-        nights = (check_out - check_in).days
-        total_price = property_obj.price_per_night * nights
-        data['total_price'] = total_price
-        
         return data
+    
+    def create(self, validated_data):
+        property_obj = validated_data.pop('property_obj')
+        check_in = validated_data.pop('check_in_date')
+        check_out = validated_data.pop('check_out_date')
+        try:
+            return create_booking(property_obj, check_in, check_out, **validated_data)
+        except BookingUnavailable as e:
+            raise serializers.ValidationError(str(e))
+
+class BookingHoldSerializer(BookingCreateSerializer):
+    """First checkout step: reserve the dates before guest details are known"""
+    hold_token = serializers.UUIDField(read_only=True)
+    hold_expires_at = serializers.DateTimeField(read_only=True)
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    
+    class Meta:
+        model = Booking
+        fields = [
+            'id', 'property_id', 'check_in_date', 'check_out_date', 'number_of_guests',
+            'total_price', 'hold_token', 'hold_expires_at'
+        ]
+        read_only_fields = ['id']
+    
+    def create(self, validated_data):
+        property_obj = validated_data.pop('property_obj')
+        check_in = validated_data.pop('check_in_date')
+        check_out = validated_data.pop('check_out_date')
+        try:
+            return hold_booking(property_obj, check_in, check_out, **validated_data)
+        except BookingUnavailable as e:
+            raise serializers.ValidationError(str(e))
+
+class BookingHoldConfirmSerializer(serializers.ModelSerializer):
+    """Second checkout step: guest details for a held booking"""
+    class Meta:
+        model = Booking
+        fields = ['customer_name', 'customer_email', 'customer_phone', 'special_requests']
+        extra_kwargs = {
+            'customer_name': {'required': True},
+            'customer_email': {'required': True},
+            'customer_phone': {'required': True},
+        }
 
 class BookingStatusUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -676,11 +758,36 @@ class ResortTransferSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class AtollTransferSerializer(serializers.ModelSerializer):
-    resorts = ResortTransferSerializer(many=True, read_only=True)
+    """Atoll with its resorts and their price summary; pass atolls through ``load_atoll_tree`` first"""
+    resorts = serializers.SerializerMethodField()
+    resort_count = serializers.SerializerMethodField()
+    min_price = serializers.SerializerMethodField()
+    max_price = serializers.SerializerMethodField()
+    transfer_types = serializers.SerializerMethodField()
     
     class Meta:
         model = AtollTransfer
         fields = '__all__'
+    
+    def _tree(self, obj):
+        if not hasattr(obj, 'tree_resorts'):  # single atoll, e.g. after a create or update
+            load_atoll_tree([obj])
+        return obj
+    
+    def get_resorts(self, obj):
+        return ResortTransferSerializer(self._tree(obj).tree_resorts, many=True).data
+    
+    def get_resort_count(self, obj):
+        return self._tree(obj).resort_summary['resort_count']
+    
+    def get_min_price(self, obj):
+        return self._tree(obj).resort_summary['min_price']
+    
+    def get_max_price(self, obj):
+        return self._tree(obj).resort_summary['max_price']
+    
+    def get_transfer_types(self, obj):
+        return self._tree(obj).resort_summary['transfer_types']
 
 class TransferFAQSerializer(serializers.ModelSerializer):
     class Meta:
@@ -706,6 +813,13 @@ class TransferPricingFactorSerializer(serializers.ModelSerializer):
     class Meta:
         model = TransferPricingFactor
         fields = '__all__'
+    
+    def validate_rules(self, value):
+        try:
+            parse_rules(self.initial_data.get('factor', ''), value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return value
 
 class TransferContentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -833,10 +947,14 @@ class HomepageDataSerializer(serializers.Serializer):
 
 class FerryScheduleSerializer(serializers.ModelSerializer):
     """Serializer for ferry schedules"""
+    origin_name = serializers.CharField(source='origin.island', read_only=True, default=None)
+    destination_name = serializers.CharField(source='destination.island', read_only=True, default=None)
     
     class Meta:
         model = FerrySchedule
-        fields = '__all__' 
+        fields = '__all__'
+        # Derived from route_name, duration and days_of_week on save
+        read_only_fields = ('origin', 'destination', 'duration_minutes', 'weekday_mask')
 
 # Internationalization Serializers
 
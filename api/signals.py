@@ -0,0 +1,151 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import (
+    Amenity, AtollTransfer, CulturalContent, Destination, FerrySchedule, LocalizedFAQ, Location, Package,
+    PackageDestination, PackageImage, Page, PageBlock, PlaceAlias, Property, PropertyImage, PropertyType,
+    ResortTransfer, Review, TransferFAQ, TransferPricingFactor, TransferType,
+)
+from .distances import invalidate_distance_matrix
+from .journeys import invalidate_ferry_network
+from .place_matching import invalidate_place_index
+from .search import invalidate_search_cache, remove_from_search_index, update_search_index
+from .timetable import normalize_schedule
+from .transfer_compare import invalidate_transportation_data
+from .transfer_quotes import invalidate_transfer_quotes
+
+# Models whose rows appear in serialized search responses
+CATALOG_MODELS = [
+    Property, PropertyType, PropertyImage, Amenity, Review, Package, PackageImage, PackageDestination,
+    Location, Destination, PlaceAlias,
+]
+CONTENT_MODELS = [Page, PageBlock, TransferFAQ, LocalizedFAQ, CulturalContent]
+
+CONTENT_DOC_TYPES = {
+    Page: 'page',
+    TransferFAQ: 'transfer_faq',
+    LocalizedFAQ: 'localized_faq',
+    CulturalContent: 'cultural_content',
+}
+
+
+@receiver([post_save, post_delete], sender=Location)
+@receiver([post_save, post_delete], sender=Destination)
+@receiver([post_save, post_delete], sender=PlaceAlias)
+def place_names_changed(sender, **kwargs):
+    """Rebuild the fuzzy place-name index after places or aliases change"""
+    invalidate_place_index()
+
+
+@receiver([post_save, post_delete], sender=Location)
+def location_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_distance_matrix)
+
+
+@receiver(post_save, sender=Property)
+def property_saved(sender, instance, **kwargs):
+    update_search_index('property', [instance.pk])
+
+
+@receiver(post_save, sender=Package)
+def package_saved(sender, instance, **kwargs):
+    update_search_index('package', [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=PackageDestination)
+def package_destination_changed(sender, instance, **kwargs):
+    """A package's indexed text includes the islands it visits"""
+    update_search_index('package', [instance.package_id])
+
+
+@receiver(post_save, sender=Location)
+def location_saved(sender, instance, **kwargs):
+    """Re-index the location and everything whose indexed text names it"""
+    update_search_index('location', [instance.pk])
+    update_search_index('property', instance.properties.values_list('pk', flat=True))
+    update_search_index(
+        'package',
+        Package.objects.filter(destinations__location=instance).values_list('pk', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=Property)
+@receiver(post_delete, sender=Package)
+@receiver(post_delete, sender=Location)
+def search_document_deleted(sender, instance, **kwargs):
+    remove_from_search_index(sender._meta.model_name, instance.pk)
+
+
+@receiver(post_save, sender=Page)
+def page_saved(sender, instance, **kwargs):
+    """Publishing adds a page to the index; archiving or unpublishing drops it"""
+    update_search_index('page', [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=PageBlock)
+def page_block_changed(sender, instance, **kwargs):
+    update_search_index('page', [instance.page_id])
+
+
+@receiver(post_save, sender=TransferFAQ)
+@receiver(post_save, sender=LocalizedFAQ)
+@receiver(post_save, sender=CulturalContent)
+def content_saved(sender, instance, **kwargs):
+    """Inactive entries are dropped from the index"""
+    update_search_index(CONTENT_DOC_TYPES[sender], [instance.pk])
+
+
+@receiver(post_delete, sender=Page)
+@receiver(post_delete, sender=TransferFAQ)
+@receiver(post_delete, sender=LocalizedFAQ)
+@receiver(post_delete, sender=CulturalContent)
+def content_deleted(sender, instance, **kwargs):
+    remove_from_search_index(CONTENT_DOC_TYPES[sender], instance.pk)
+
+
+def catalog_changed(sender, **kwargs):
+    # After commit, so no request can re-cache the old rows under the new version
+    transaction.on_commit(lambda: invalidate_search_cache('catalog'))
+
+
+def content_changed(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate_search_cache('content'))
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(catalog_changed, sender=model, dispatch_uid=f'search_cache_catalog_save_{model.__name__}')
+    post_delete.connect(catalog_changed, sender=model, dispatch_uid=f'search_cache_catalog_delete_{model.__name__}')
+for model in CONTENT_MODELS:
+    post_save.connect(content_changed, sender=model, dispatch_uid=f'search_cache_content_save_{model.__name__}')
+    post_delete.connect(content_changed, sender=model, dispatch_uid=f'search_cache_content_delete_{model.__name__}')
+
+
+@receiver(pre_save, sender=FerrySchedule)
+def ferry_schedule_normalizing(sender, instance, **kwargs):
+    """Keep origin/destination, duration_minutes and weekday_mask in step with the text fields"""
+    normalize_schedule(instance)
+
+
+@receiver([post_save, post_delete], sender=FerrySchedule)
+def ferry_schedule_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_ferry_network)
+
+
+@receiver([post_save, post_delete], sender=AtollTransfer)
+@receiver([post_save, post_delete], sender=ResortTransfer)
+@receiver([post_save, post_delete], sender=TransferPricingFactor)
+@receiver([post_save, post_delete], sender=Location)
+@receiver([post_save, post_delete], sender=PlaceAlias)
+def transfer_pricing_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_transfer_quotes)
+
+
+@receiver([post_save, post_delete], sender=AtollTransfer)
+@receiver([post_save, post_delete], sender=ResortTransfer)
+@receiver([post_save, post_delete], sender=TransferType)
+@receiver([post_save, post_delete], sender=FerrySchedule)
+@receiver([post_save, post_delete], sender=Location)
+@receiver([post_save, post_delete], sender=PlaceAlias)
+def transportation_data_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_transportation_data)
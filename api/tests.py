@@ -1,3 +1,297 @@
-from django.test import TestCase
+import io
+import json
+import random
+import threading
+from datetime import date, time, timedelta
+from time import monotonic, sleep
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .availability import available_properties, overlapping_bookings
+from .distances import get_distance_matrix, invalidate_distance_matrix
+from .models import (
+    AtollTransfer, Availability, Booking, FerrySchedule, Location, Property, PropertyType, ResortTransfer,
+    SearchQueryLog, TransferFAQ,
+)
+from .pricing import PriceMatrix
+from .search_log import SearchQueryLogBuffer, query_log
+from .timetable import normalize_schedule
+from .transfer_quotes import get_transfer_quote_index, invalidate_transfer_quotes
+from .transport_export import iter_export, parse_ndjson
+from .transport_import import import_transportation
+
+
+@override_settings(BOOKING_CREATE_ATTEMPTS=50, BOOKING_RETRY_BACKOFF=0.005)
+class ConcurrentBookingTest(TransactionTestCase):
+    """Hundreds of parallel booking requests must never double-book a property"""
+
+    REQUESTS = 300
+    THREADS = 16
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('In-memory SQLite cannot serve concurrent connections; use PostgreSQL or a file test database')
+        property_type = PropertyType.objects.create(name='Guesthouse')
+        self.properties = [
+            Property.objects.create(
+                name=f'Stress Test Inn {i}', description='', property_type=property_type, price_per_night=100
+            )
+            for i in range(3)
+        ]
+
+    def _book(self, jobs, outcomes):
+        client = APIClient()
+        try:
+            for property_id, check_in, nights in jobs:
+                response = client.post('/api/bookings/create-booking/', {
+                    'property_id': property_id,
+                    'customer_name': 'Guest',
+                    'customer_email': 'guest@example.com',
+                    'customer_phone': '+9607000000',
+                    'check_in_date': check_in.isoformat(),
+                    'check_out_date': (check_in + timedelta(days=nights)).isoformat(),
+                }, format='json')
+                outcomes.append(response.status_code)
+        finally:
+            connection.close()
+
+    def test_parallel_bookings_never_overlap(self):
+        rng = random.Random(7)
+        start = date(2030, 1, 1)
+        jobs = [
+            (rng.choice(self.properties).pk, start + timedelta(days=rng.randrange(30)), rng.randint(1, 5))
+            for _ in range(self.REQUESTS)
+        ]
+        outcomes = []
+        threads = [
+            threading.Thread(target=self._book, args=(jobs[i::self.THREADS], outcomes))
+            for i in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(outcomes), self.REQUESTS)
+        self.assertLessEqual(set(outcomes), {201, 400})
+        self.assertGreater(outcomes.count(201), 0)
+
+        for property_obj in self.properties:
+            stays = sorted(
+                Booking.objects.filter(property_obj=property_obj).values_list('check_in_date', 'check_out_date')
+            )
+            for (_, previous_out), (next_in, _) in zip(stays, stays[1:]):
+                self.assertLessEqual(previous_out, next_in, f'Overlapping bookings for {property_obj}')
+        self.assertEqual(Booking.objects.count(), outcomes.count(201))
+
+
+class BookingIndexPlanTest(TestCase):
+    """The planner must serve the booking and availability hot paths from their indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(11)
+        property_type = PropertyType.objects.create(name='Resort')
+        cls.properties = Property.objects.bulk_create([
+            Property(name=f'Plan Test Resort {i}', description='', property_type=property_type, price_per_night=200)
+            for i in range(50)
+        ])
+        start = date(2030, 1, 1)
+        statuses = ['pending', 'confirmed', 'cancelled', 'completed', 'expired']
+        Booking.objects.bulk_create([
+            Booking(
+                property_obj=property_obj,
+                customer_name='Guest', customer_email='guest@example.com', customer_phone='+9607000000',
+                check_in_date=start + timedelta(days=offset),
+                check_out_date=start + timedelta(days=offset + 3),
+                total_price=600,
+                status=rng.choice(statuses),
+            )
+            for property_obj in cls.properties
+            for offset in range(0, 360, 4)
+        ])
+        Availability.objects.bulk_create([
+            Availability(property_obj=property_obj, date=start + timedelta(days=day), is_available=rng.random() > 0.05)
+            for property_obj in cls.properties
+            for day in range(365)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, *names):
+        plan = queryset.explain()
+        for name in names:
+            self.assertIn(name, plan, f'{name} not used by:\n{plan}')
+
+    def overlap_index(self):
+        # PostgreSQL can use the partial index on active statuses; SQLite only matches literal predicates
+        return 'booking_active_dates_idx' if connection.vendor == 'postgresql' else 'booking_property_dates_idx'
+
+    def test_overlap_check_uses_booking_index(self):
+        queryset = overlapping_bookings(self.properties[0].pk, date(2030, 3, 1), date(2030, 3, 8))
+        self.assertUsesIndex(queryset, self.overlap_index())
+
+    def test_availability_search_uses_both_anti_join_indexes(self):
+        queryset = available_properties(date(2030, 3, 1), date(2030, 3, 8))
+        self.assertUsesIndex(queryset, self.overlap_index(), 'availability_blocked_idx')
+
+    def test_hold_sweep_uses_partial_index(self):
+        queryset = Booking.objects.filter(status='held', hold_expires_at__lte=timezone.now())
+        self.assertUsesIndex(queryset, 'booking_hold_expiry_idx')
+
+
+class DurationEstimateTest(TestCase):
+    """Durations the text does not give are estimated from the distance between islands"""
+
+    def setUp(self):
+        Location.objects.create(island='Male', atoll='Kaafu', latitude=4.1755, longitude=73.5093)
+        Location.objects.create(island='Maafushi', atoll='Kaafu', latitude=3.9403, longitude=73.4906)
+        invalidate_distance_matrix()
+        invalidate_transfer_quotes()
+
+    def test_unreadable_schedule_duration_uses_ferry_eta(self):
+        schedule = normalize_schedule(FerrySchedule(
+            route_name='Male to Maafushi', departure_time=time(10, 0), arrival_time=time(10, 0), duration='Varies',
+        ))
+        estimate = get_distance_matrix().estimate(schedule.origin_id, schedule.destination_id)
+        self.assertEqual(schedule.duration_minutes, estimate['eta_minutes']['ferry'])
+        self.assertEqual(normalize_schedule(FerrySchedule(
+            route_name='Male to Maafushi', departure_time=time(10, 0), arrival_time=time(11, 30), duration='90 min',
+        )).duration_minutes, 90)
+
+    def test_unreadable_schedule_duration_prefers_timetable_times(self):
+        schedule = normalize_schedule(FerrySchedule(
+            route_name='Male to Maafushi', departure_time=time(8, 0), arrival_time=time(9, 30), duration='Varies',
+        ))
+        self.assertEqual(schedule.duration_minutes, 90)
+
+    def test_unreadable_transfer_duration_uses_eta_from_hub(self):
+        atoll = AtollTransfer.objects.create(atoll_name='South Male Atoll', description='')
+        ResortTransfer.objects.create(
+            atoll=atoll, resort_name='Maafushi Ferry', price=5, duration='Weather dependent', transfer_type='ferry'
+        )
+        ResortTransfer.objects.create(
+            atoll=atoll, resort_name='Maafushi Ferry', price=40, duration='45 minutes', transfer_type='speedboat'
+        )
+        quotes = get_transfer_quote_index().quotes('Maafushi Ferry', 1, date.today())
+        quotes = {quote['transfer_type']: quote for quote in quotes}
+        estimate = get_distance_matrix().estimate(*Location.objects.order_by('pk').values_list('pk', flat=True))
+        self.assertEqual(quotes['ferry']['duration_minutes'], estimate['eta_minutes']['ferry'])
+        self.assertTrue(quotes['ferry']['duration_estimated'])
+        self.assertEqual(quotes['speedboat']['duration_minutes'], 45)
+        self.assertFalse(quotes['speedboat']['duration_estimated'])
+
+    def test_location_missing_from_cached_matrix_is_not_found(self):
+        get_distance_matrix()
+        Location.objects.create(island='Guraidhoo', atoll='Kaafu', latitude=3.9, longitude=73.47)
+        response = APIClient().get('/api/transportation/distances/', {'from': 'Male', 'to': 'Guraidhoo'})
+        self.assertEqual(response.status_code, 404)
+        response = APIClient().get('/api/transportation/distances/', {'from': 'Male', 'to': 'Maafushi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['to'], 'Maafushi, Kaafu')
+
+
+class TransportExportRoundTripTest(TestCase):
+    """JSON and NDJSON exports must import the same way, empty data types included"""
+
+    def setUp(self):
+        atoll = AtollTransfer.objects.create(atoll_name='Baa Atoll', description='')
+        ResortTransfer.objects.create(atoll=atoll, resort_name='Soneva Fushi', price=450, duration='35 minutes')
+
+    def exports(self):
+        data = json.loads(''.join(iter_export('json')))
+        del data['exported_at']
+        return data, parse_ndjson(''.join(iter_export('ndjson')).splitlines())
+
+    def test_formats_carry_the_same_data_types(self):
+        from_json, from_ndjson = self.exports()
+        self.assertEqual(from_ndjson, from_json)
+        self.assertEqual(from_ndjson['transfer_faqs'], [])
+
+    def test_empty_data_type_deletes_rows_in_both_formats(self):
+        for data in self.exports():
+            TransferFAQ.objects.create(question='Can I bring a surfboard?', answer='Yes', category='luggage')
+            summary = import_transportation(data)
+            self.assertEqual(summary['transfer_faqs']['deleted'], 1)
+            self.assertEqual(summary['resort_transfers']['unchanged'], 1)
+            self.assertFalse(TransferFAQ.objects.exists())
+
+
+class TransportImportTest(TestCase):
+    """Imports match stored rows on natural keys"""
+
+    def test_duplicate_natural_keys_are_collapsed(self):
+        first, _ = [
+            TransferFAQ.objects.create(question='Can I bring a surfboard?', answer=answer, category='luggage')
+            for answer in ('Yes', 'Yes, for a fee')
+        ]
+        data = {'transfer_faqs': [{'question': 'Can I bring a surfboard?', 'answer': 'Yes', 'category': 'sports'}]}
+        expected = {'created': 0, 'updated': 1, 'deleted': 1, 'unchanged': 0, 'duplicates': 1}
+        for dry_run in (True, False):
+            summary = import_transportation(data, dry_run=dry_run)['transfer_faqs']
+            self.assertEqual({name: summary[name] for name in expected}, expected)
+        self.assertEqual(list(TransferFAQ.objects.values_list('pk', 'category')), [(first.pk, 'sports')])
+
+
+@override_settings(SEARCH_LOG_BATCH_SIZE=100, SEARCH_LOG_FLUSH_INTERVAL=0.2)
+class SearchLogFlushTest(TransactionTestCase):
+    """Buffered search log rows reach the database within the flush interval, without further traffic"""
+
+    def test_quiet_buffer_is_flushed_by_timer(self):
+        buffer = SearchQueryLogBuffer()
+        buffer.record('maafushi', 'maafushi', {'islands': 1}, 3.5)
+        self.assertFalse(SearchQueryLog.objects.exists())
+        deadline = monotonic() + 5
+        while not SearchQueryLog.objects.exists() and monotonic() < deadline:
+            sleep(0.05)
+        self.assertEqual(SearchQueryLog.objects.get().query, 'maafushi')
+        self.assertEqual(len(buffer), 0)
+
+    @override_settings(SEARCH_LOG_FLUSH_INTERVAL=0)
+    def test_benchmark_search_log_rows_roll_back(self):
+        with mock.patch('api.search_log.threading.Timer', wraps=threading.Timer) as timer:
+            call_command('benchmark_search', properties=40, packages=10, repeat=1, stdout=io.StringIO())
+        timer.assert_not_called()
+        self.assertFalse(SearchQueryLog.objects.exists())
+        self.assertEqual(len(query_log), 0)
+
+
+class AvailablePropertySearchTest(TestCase):
+    """Availability search orders by stay total or name, pricing only what it must"""
+
+    @classmethod
+    def setUpTestData(cls):
+        property_type = PropertyType.objects.create(name='Guesthouse')
+        Property.objects.bulk_create([
+            Property(
+                name=f'Search Inn {i:02d}', description='', property_type=property_type, price_per_night=100 + i % 7
+            )
+            for i in range(25)
+        ])
+
+    def search(self, **params):
+        params = dict(check_in='2030-05-01', check_out='2030-05-04', **params)
+        response = APIClient().get('/api/search/availability/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_total_price_ordering_ranks_every_candidate(self):
+        for ordering, reverse in (('total_price', False), ('-total_price', True)):
+            data = self.search(ordering=ordering)
+            self.assertEqual(data['count'], 25)
+            totals = [(float(row['total_price']), row['id']) for row in data['results']]
+            self.assertEqual(totals, sorted(totals, reverse=reverse))
+            self.assertEqual(totals[0][0], 3 * (106 if reverse else 100))
+
+    def test_name_ordering_prices_only_the_page(self):
+        with mock.patch('api.views.PriceMatrix', wraps=PriceMatrix) as matrix:
+            data = self.search(ordering='-name', page=2)
+        self.assertEqual([row['name'] for row in data['results']], [f'Search Inn {i:02d}' for i in range(4, -1, -1)])
+        matrix.assert_called_once()
+        self.assertEqual(len(matrix.call_args.args[0]), 5)
+        self.assertEqual(float(data['results'][0]['total_price']), 3 * (100 + 4 % 7))
@@ -0,0 +1,125 @@
+"""
+Structured timetable fields of ``FerrySchedule``.
+
+Schedules are entered as text: a route name such as "Male to Maafushi", a
+duration such as "90 minutes" or "3.5 hours" and a list of weekday names.
+The parsers here derive the indexed columns queries filter on instead:
+``origin``/``destination`` locations, ``duration_minutes`` and
+``weekday_mask`` (Monday=1 ... Sunday=64, as on ``PricingRule``).
+
+``normalize_schedule`` runs before every save; ``backfill_schedules``
+brings existing rows up to date in bulk. A duration that neither the text
+nor the timetable gives is estimated from the distance between the two
+islands (``api.distances``).
+"""
+import re
+from datetime import time
+
+from .distances import get_distance_matrix
+from .models import FerrySchedule, Location, PlaceAlias
+from .place_matching import fold_place_name
+
+ALL_WEEKDAYS = 127
+WEEKDAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+DERIVED_FIELDS = ['origin', 'destination', 'duration_minutes', 'weekday_mask']
+
+_ROUTE_SEPARATOR = re.compile(r'\s+to\s+', re.IGNORECASE)
+_QUALIFIER = re.compile(r'\s*\(.*?\)\s*')
+_DURATION_PART = re.compile(r'(\d+(?:[.,]\d+)?)\s*(hours?|hrs?|h|minutes?|mins?|m)(?![a-z])', re.IGNORECASE)
+
+
+def parse_route_name(route_name):
+    """``('Male', 'Eydhafushi (Baa Atoll)')`` from 'Male to Eydhafushi (Baa Atoll)', or None"""
+    parts = _ROUTE_SEPARATOR.split((route_name or '').strip(), maxsplit=1)
+    if len(parts) != 2 or not all(parts):
+        return None
+    return parts[0].strip(), parts[1].strip()
+
+
+def island_key(name):
+    """Comparison key of an island name, ignoring qualifiers like '(Baa Atoll)' and spelling variants"""
+    return fold_place_name(_QUALIFIER.sub(' ', name or ''))
+
+
+def parse_duration(text):
+    """Minutes in '90 minutes', '4 hours', '3.5 hours' or '1 hour 30 mins'; None if unreadable"""
+    parts = _DURATION_PART.findall(text or '')
+    if not parts:
+        return None
+    total = sum(
+        float(amount.replace(',', '.')) * (60 if unit.lower().startswith('h') else 1) for amount, unit in parts
+    )
+    return round(total) or None
+
+
+def minutes_between(departure, arrival):
+    """Crossing time in minutes, wrapping past midnight"""
+    return (arrival.hour * 60 + arrival.minute - departure.hour * 60 - departure.minute) % (24 * 60)
+
+
+def weekday_mask(days_of_week):
+    """Bitmask of weekday names like 'Monday' or 'mon'; an empty list means daily"""
+    if not days_of_week:
+        return ALL_WEEKDAYS
+    prefixes = {name[:3]: number for number, name in enumerate(WEEKDAY_NAMES)}
+    mask = 0
+    for day in days_of_week:
+        number = prefixes.get(str(day).strip().lower()[:3])
+        if number is not None:
+            mask |= 1 << number
+    return mask
+
+
+def mask_weekdays(mask):
+    """Weekday numbers (Monday=0) set in a bitmask"""
+    return {day for day in range(7) if mask >> day & 1}
+
+
+class LocationResolver:
+    """Maps island names in any common spelling to ``Location`` ids (two queries, then in memory)"""
+
+    def __init__(self):
+        self._ids = {}
+        for pk, island in Location.objects.order_by('pk').values_list('pk', 'island'):
+            self._ids.setdefault(island_key(island), pk)
+        aliases = PlaceAlias.objects.filter(is_active=True, location__isnull=False).values_list('alias', 'location_id')
+        for alias, location_id in aliases:
+            self._ids.setdefault(island_key(alias), location_id)
+
+    def resolve(self, name):
+        return self._ids.get(island_key(name))
+
+
+def normalize_schedule(schedule, resolver=None):
+    """Fill the structured fields of ``schedule`` from its text fields (does not save)"""
+    route = parse_route_name(schedule.route_name)
+    if route is not None:
+        resolver = resolver or LocationResolver()
+        schedule.origin_id = resolver.resolve(route[0])
+        schedule.destination_id = resolver.resolve(route[1])
+    schedule.duration_minutes = parse_duration(schedule.duration)
+    times_known = isinstance(schedule.departure_time, time) and isinstance(schedule.arrival_time, time)
+    if schedule.duration_minutes is None and times_known:
+        schedule.duration_minutes = minutes_between(schedule.departure_time, schedule.arrival_time) or None
+    if schedule.duration_minutes is None and schedule.origin_id and schedule.destination_id:
+        estimate = get_distance_matrix().estimate(schedule.origin_id, schedule.destination_id)
+        schedule.duration_minutes = estimate['eta_minutes'].get('ferry') if estimate else None
+    schedule.weekday_mask = weekday_mask(schedule.days_of_week)
+    return schedule
+
+
+def backfill_schedules(queryset=None, batch_size=500):
+    """Recompute the structured fields of every schedule; returns ``(updated, unmatched route names)``
+
+    Uses ``bulk_update``, so save signals do not fire; callers invalidate
+    anything derived from schedules themselves.
+    """
+    schedules = list(FerrySchedule.objects.all() if queryset is None else queryset)
+    resolver = LocationResolver()
+    unmatched = set()
+    for schedule in schedules:
+        normalize_schedule(schedule, resolver)
+        if schedule.origin_id is None or schedule.destination_id is None:
+            unmatched.add(schedule.route_name)
+    FerrySchedule.objects.bulk_update(schedules, DERIVED_FIELDS, batch_size=batch_size)
+    return len(schedules), sorted(unmatched)
@@ -0,0 +1,117 @@
+"""
+Side-by-side comparison of the ways to reach a set of resorts.
+
+For each resort the matrix lists one option per transfer type: its base
+price per guest and parsed duration from ``ResortTransfer``, the matching
+``TransferType`` description, and (for ferries) the next sailing from
+``FerrySchedule``.
+
+The static part is assembled from the in-memory transfer quote index and
+one ``TransferType`` query, and is cached per transportation data version
+(bumped by signals whenever transfers, transfer types or schedules change).
+Next departures depend on the clock, so they are added per request from
+the compiled ferry network, which needs no query either.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .journeys import get_ferry_network
+from .models import TransferType
+from .timetable import island_key
+from .transfer_quotes import get_transfer_quote_index, served_island
+
+TRANSPORTATION_VERSION_KEY = 'transportation:data_version'
+COMPARISON_CACHE_TIMEOUT = 60 * 60
+MAX_COMPARED_RESORTS = 20
+
+
+def invalidate_transportation_data():
+    """Mark every comparison cached for the current transportation data stale"""
+    try:
+        cache.incr(TRANSPORTATION_VERSION_KEY)
+    except ValueError:
+        cache.set(TRANSPORTATION_VERSION_KEY, 1, None)
+
+
+def _type_details(transfer_types):
+    """``{transfer type code: TransferType values}``, matching 'ferry' to 'Public Ferry Services'"""
+    details = {}
+    for transfer_type in transfer_types:
+        for word in transfer_type['name'].lower().split():
+            details.setdefault(word[:-1] if word.endswith('s') else word, transfer_type)
+    return details
+
+
+def build_comparison(resorts):
+    """Static comparison matrix for resort names (misspellings tolerated)"""
+    index = get_transfer_quote_index()
+    types = _type_details(
+        TransferType.objects.filter(is_active=True).order_by('order').values('name', 'best_for', 'pricing_range')
+    )
+    rows, unmatched, seen = [], [], set()
+    for name in resorts:
+        routes = index.find(name)
+        if not routes:
+            unmatched.append(name)
+            continue
+        if routes[0].resort_name in seen:
+            continue
+        seen.add(routes[0].resort_name)
+        options = []
+        for route in sorted(routes, key=lambda route: route.price):
+            details = types.get(route.transfer_type.lower(), {})
+            options.append({
+                'resort_transfer_id': route.id,
+                'transfer_type': route.transfer_type,
+                'type_name': details.get('name'),
+                'best_for': details.get('best_for'),
+                'price_per_guest': float(route.price),
+                'duration': route.duration,
+                'duration_minutes': route.duration_minutes,
+                'duration_estimated': route.duration_estimated,
+                'ferry_island': served_island(route.resort_name) if route.transfer_type.lower() == 'ferry' else None,
+            })
+        rows.append({'resort': routes[0].resort_name, 'atoll': routes[0].atoll_name, 'options': options})
+    return {'resorts': rows, 'unmatched': unmatched}
+
+
+def cached_comparison(resorts):
+    """``build_comparison`` cached per transportation data version and resort list"""
+    version = cache.get(TRANSPORTATION_VERSION_KEY, 0)
+    names = '\n'.join(island_key(name) for name in resorts)
+    key = f'transfer_compare:{version}:{hashlib.md5(names.encode()).hexdigest()}'
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = build_comparison(resorts)
+        cache.set(key, matrix, COMPARISON_CACHE_TIMEOUT)
+    return matrix
+
+
+def comparison_matrix(resorts, origin='Male', now=None):
+    """Comparison matrix with the next ferry sailing from ``origin`` filled in, and cheapest/fastest picks"""
+    matrix = cached_comparison(resorts)
+    network = get_ferry_network()
+    start = network.find_island(origin)
+    now = now or timezone.localtime()
+    after = now.hour * 60 + now.minute
+    rows = []
+    for row in matrix['resorts']:
+        options = []
+        for option in row['options']:
+            option = dict(option, next_departure=None)
+            ferry_island = option.pop('ferry_island')
+            island = network.find_island(ferry_island) if ferry_island else None
+            if start is not None and island is not None:
+                sailings = network.departures(start, now.date(), after=after, limit=1, destination=island)
+                option['next_departure'] = sailings[0] if sailings else None
+            options.append(option)
+        timed = [option for option in options if option['duration_minutes'] is not None]
+        rows.append(dict(
+            row,
+            options=options,
+            cheapest=options[0]['transfer_type'] if options else None,
+            fastest=min(timed, key=lambda option: option['duration_minutes'])['transfer_type'] if timed else None,
+        ))
+    return {'resorts': rows, 'unmatched': matrix['unmatched']}
@@ -0,0 +1,259 @@
+"""
+Price and duration quotes for resort transfers.
+
+``TransferQuoteIndex`` holds every active ``ResortTransfer`` in memory, keyed
+by folded resort name, together with the parsed rules of the active pricing
+factors. A quote is a dict lookup and a few multiplications; no query runs
+per request. Misspelled resort names fall back to the trigram matcher used
+for place names. The index is rebuilt in-process after any transfer or
+pricing-factor change (signals bump a version key in the shared cache).
+
+A route whose duration text gives no minutes ("Varies", "Weather
+dependent") is given an estimate instead: the ETA of its transfer type over
+the great-circle distance from ``TRANSFER_HUB`` to the resort's island
+(``api.distances``), flagged with ``duration_estimated``.
+
+``ResortTransfer.price`` is per guest. ``TransferPricingFactor.rules`` holds
+a list of machine-readable adjustments, applied in factor order::
+
+    {"adjust": "multiplier", "value": 1.15, "months": [12, 1, 2, 3, 4]}
+    {"adjust": "multiplier", "value": 0.925, "min_guests": 4, "max_guests": 7}
+    {"adjust": "amount", "value": 25, "transfer_types": ["seaplane"], "after": "18:00", "before": "06:00"}
+
+``adjust`` is ``multiplier`` (of the running total), ``amount`` (per guest)
+or ``flat`` (once per booking). Optional conditions: ``transfer_types``,
+``atolls``, ``min_guests``/``max_guests``, ``months``, ``weekdays``
+(bitmask, Monday=1 ... Sunday=64) and ``after``/``before`` (HH:MM; a window
+with ``after`` later than ``before`` wraps past midnight).
+"""
+import threading
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .distances import get_distance_matrix
+from .models import ResortTransfer, TransferPricingFactor
+from .place_matching import PlaceNameIndex
+from .timetable import ALL_WEEKDAYS, LocationResolver, island_key, parse_duration
+
+TRANSFER_QUOTE_VERSION_KEY = 'transfer_quotes:index_version'
+ADJUSTMENTS = ('multiplier', 'amount', 'flat')
+CENT = Decimal('0.01')
+
+TransferRoute = namedtuple(
+    'TransferRoute',
+    'id resort_name atoll_name atoll_key transfer_type price duration duration_minutes duration_estimated',
+)
+
+
+def _parse_time(value):
+    return datetime.strptime(value, '%H:%M').time()
+
+
+def served_island(resort_name):
+    """The island a ferry route serves: 'Maafushi Ferry' -> 'Maafushi'"""
+    words = [word for word in resort_name.split() if word.lower() != 'ferry']
+    return ' '.join(words) or resort_name
+
+
+class DurationEstimator:
+    """Minutes from the transfer hub to a resort's island for a transfer type, from the distance matrix"""
+
+    def __init__(self, resolver=None, matrix=None, hub=None):
+        self.resolver = resolver or LocationResolver()
+        self.matrix = matrix or get_distance_matrix()
+        self.hub_id = self.resolver.resolve(hub or getattr(settings, 'TRANSFER_HUB', 'Male'))
+
+    def minutes(self, resort_name, transfer_type):
+        """Estimated minutes, or None if the hub, the island or the transfer type is unknown"""
+        location_id = self.resolver.resolve(resort_name) or self.resolver.resolve(served_island(resort_name))
+        if self.hub_id is None or location_id is None:
+            return None
+        estimate = self.matrix.estimate(self.hub_id, location_id)
+        return estimate['eta_minutes'].get(transfer_type.lower()) if estimate else None
+
+
+class FactorRule:
+    """One parsed entry of ``TransferPricingFactor.rules``"""
+
+    __slots__ = (
+        'factor', 'adjust', 'value', 'transfer_types', 'atolls', 'min_guests', 'max_guests',
+        'months', 'weekdays', 'after', 'before',
+    )
+
+    def __init__(self, factor, rule):
+        """Raises ``ValueError`` for malformed rules"""
+        if not isinstance(rule, dict):
+            raise ValueError('each rule must be an object')
+        self.factor = factor
+        self.adjust = rule.get('adjust')
+        if self.adjust not in ADJUSTMENTS:
+            raise ValueError(f"adjust must be one of {', '.join(ADJUSTMENTS)}")
+        try:
+            self.value = Decimal(str(rule['value']))
+        except (KeyError, InvalidOperation):
+            raise ValueError('value must be a number')
+        if self.adjust == 'multiplier' and self.value < 0:
+            raise ValueError('a multiplier cannot be negative')
+        self.transfer_types = {str(t).lower() for t in rule.get('transfer_types', ())}
+        self.atolls = {island_key(str(a)) for a in rule.get('atolls', ())}
+        self.min_guests = int(rule.get('min_guests', 1))
+        self.max_guests = int(rule['max_guests']) if rule.get('max_guests') is not None else None
+        self.months = {int(m) for m in rule.get('months', ())}
+        if not self.months <= set(range(1, 13)):
+            raise ValueError('months must be between 1 and 12')
+        self.weekdays = int(rule.get('weekdays', ALL_WEEKDAYS))
+        if not 0 < self.weekdays <= ALL_WEEKDAYS:
+            raise ValueError('weekdays must be a bitmask between 1 and 127')
+        self.after = _parse_time(rule['after']) if rule.get('after') else None
+        self.before = _parse_time(rule['before']) if rule.get('before') else None
+
+    def applies(self, route, guests, travel_date, at):
+        if self.transfer_types and route.transfer_type.lower() not in self.transfer_types:
+            return False
+        if self.atolls and route.atoll_key not in self.atolls:
+            return False
+        if guests < self.min_guests or (self.max_guests is not None and guests > self.max_guests):
+            return False
+        if self.months and travel_date.month not in self.months:
+            return False
+        if not self.weekdays >> travel_date.weekday() & 1:
+            return False
+        if self.after or self.before:
+            if at is None:
+                return False
+            if self.after and self.before and self.after > self.before:
+                return at >= self.after or at < self.before
+            return (not self.after or at >= self.after) and (not self.before or at < self.before)
+        return True
+
+    def apply(self, total, guests):
+        """New running total"""
+        if self.adjust == 'multiplier':
+            return total * self.value
+        if self.adjust == 'amount':
+            return total + self.value * guests
+        return total + self.value
+
+
+def parse_rules(factor, rules):
+    """``[FactorRule]`` for a factor's rule list; raises ``ValueError`` naming the bad entry"""
+    if not isinstance(rules, list):
+        raise ValueError('rules must be a list')
+    parsed = []
+    for position, rule in enumerate(rules, 1):
+        try:
+            parsed.append(FactorRule(factor, rule))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'rule {position}: {e}')
+    return parsed
+
+
+class TransferQuoteIndex:
+    """Active resort transfers and pricing rules, ready for quoting"""
+
+    def __init__(self, transfers, factors, estimator=None):
+        """``estimator`` (a ``DurationEstimator``) is built on first need for durations the text does not give"""
+        self._routes = defaultdict(list)
+        names = []
+        for transfer in transfers:
+            minutes = parse_duration(transfer.duration)
+            estimated = minutes is None
+            if estimated:
+                estimator = estimator or DurationEstimator()
+                minutes = estimator.minutes(transfer.resort_name, transfer.transfer_type)
+            route = TransferRoute(
+                transfer.pk, transfer.resort_name, transfer.atoll.atoll_name, island_key(transfer.atoll.atoll_name),
+                transfer.transfer_type,
+                transfer.price, transfer.duration, minutes, estimated and minutes is not None,
+            )
+            self._routes[island_key(route.resort_name)].append(route)
+            names.append((route.resort_name, route.resort_name, 'resort'))
+        self._names = PlaceNameIndex(names)
+        self.rules = []
+        for factor in factors:
+            try:
+                self.rules.extend(parse_rules(factor.factor, factor.rules or []))
+            except ValueError:
+                continue  # rejected on write; skip rows saved before validation existed
+
+    def find(self, resort):
+        """Transfer routes of the resort ``resort`` most likely names; ``[]`` if none"""
+        routes = self._routes.get(island_key(resort))
+        if routes:
+            return routes
+        matches = self._names.lookup(resort, limit=1)
+        return self._routes.get(island_key(matches[0]['name']), []) if matches else []
+
+    def resort_names(self, atoll=None):
+        """Names of the resorts with active transfers, optionally only those in ``atoll`` ('Baa' or 'Baa Atoll')"""
+        suffix = ' ' + island_key('atoll')
+        strip = lambda key: key[:-len(suffix)] if key.endswith(suffix) else key
+        atoll_key = strip(island_key(atoll)) if atoll else None
+        return [
+            routes[0].resort_name for routes in self._routes.values()
+            if atoll_key is None or strip(routes[0].atoll_key) == atoll_key
+        ]
+
+    def quote(self, route, guests, travel_date, at=None):
+        total = route.price * guests
+        adjustments = []
+        for rule in self.rules:
+            if rule.applies(route, guests, travel_date, at):
+                adjusted = rule.apply(total, guests)
+                adjustments.append({'factor': rule.factor, 'amount': float((adjusted - total).quantize(CENT))})
+                total = adjusted
+        total = max(total, Decimal(0)).quantize(CENT)
+        return {
+            'resort_transfer_id': route.id,
+            'resort': route.resort_name,
+            'atoll': route.atoll_name,
+            'transfer_type': route.transfer_type,
+            'duration': route.duration,
+            'duration_minutes': route.duration_minutes,
+            'duration_estimated': route.duration_estimated,
+            'guests': guests,
+            'base_price_per_guest': float(route.price),
+            'adjustments': adjustments,
+            'total_price': float(total),
+            'price_per_guest': float((total / guests).quantize(CENT)),
+        }
+
+    def quotes(self, resort, guests, travel_date, transfer_type=None, at=None):
+        """Quotes for every matching route, cheapest first"""
+        routes = self.find(resort)
+        if transfer_type:
+            routes = [route for route in routes if route.transfer_type.lower() == transfer_type.lower()]
+        quotes = [self.quote(route, guests, travel_date, at) for route in routes]
+        return sorted(quotes, key=lambda quote: quote['total_price'])
+
+
+_index_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def invalidate_transfer_quotes():
+    """Mark the quote index stale in every worker sharing the cache"""
+    try:
+        cache.incr(TRANSFER_QUOTE_VERSION_KEY)
+    except ValueError:
+        cache.set(TRANSFER_QUOTE_VERSION_KEY, 1, None)
+
+
+def get_transfer_quote_index():
+    """Return the in-process index, rebuilding it when transfers or pricing factors have changed"""
+    global _index, _index_version
+    version = cache.get(TRANSFER_QUOTE_VERSION_KEY, 0)
+    if _index is None or _index_version != version:
+        with _index_lock:
+            if _index is None or _index_version != version:
+                _index = TransferQuoteIndex(
+                    ResortTransfer.objects.filter(is_active=True, atoll__is_active=True).select_related('atoll'),
+                    TransferPricingFactor.objects.filter(is_active=True).order_by('order', 'id'),
+                )
+                _index_version = version
+    return _index
@@ -0,0 +1,56 @@
+"""
+Atoll -> resort transfer tree.
+
+``load_atoll_tree`` fetches atolls and all of their resort transfers in two
+queries and groups the resorts in Python, so serializing the tree costs no
+query per atoll or per resort. The same pass totals each atoll's price range
+and per-transfer-type breakdown over its active resorts.
+"""
+from collections import OrderedDict
+
+from .models import ResortTransfer
+
+
+def _price(value):
+    return float(value) if value is not None else None
+
+
+def summarize_resorts(resorts):
+    """Resort count, price range and per-transfer-type breakdown of active resorts"""
+    count, low, high = 0, None, None
+    types = OrderedDict()
+    for resort in resorts:
+        if not resort.is_active:
+            continue
+        count += 1
+        low = resort.price if low is None or resort.price < low else low
+        high = resort.price if high is None or resort.price > high else high
+        entry = types.setdefault(resort.transfer_type, {'count': 0, 'min_price': resort.price, 'max_price': resort.price})
+        entry['count'] += 1
+        entry['min_price'] = min(entry['min_price'], resort.price)
+        entry['max_price'] = max(entry['max_price'], resort.price)
+    return {
+        'resort_count': count,
+        'min_price': _price(low),
+        'max_price': _price(high),
+        'transfer_types': [
+            {'transfer_type': name, 'count': entry['count'],
+             'min_price': _price(entry['min_price']), 'max_price': _price(entry['max_price'])}
+            for name, entry in types.items()
+        ],
+    }
+
+
+def load_atoll_tree(atolls):
+    """Evaluate ``atolls`` with ``tree_resorts`` and ``resort_summary`` set on each (two queries)"""
+    atolls = list(atolls)
+    by_id = {atoll.pk: atoll for atoll in atolls}
+    for atoll in atolls:
+        atoll.tree_resorts = []
+    for resort in ResortTransfer.objects.filter(atoll_id__in=by_id).order_by('atoll_id', 'order', 'id'):
+        atoll = by_id[resort.atoll_id]
+        resort.atoll = atoll  # caches the parent, so str() of the relation needs no query
+        atoll.tree_resorts.append(resort)
+    for atoll in atolls:
+        atoll.resort_summary = summarize_resorts(atoll.tree_resorts)
+    return atolls
@@ -0,0 +1,96 @@
+"""
+Streaming export of the transportation data set.
+
+Rows are read per model through server-side cursors and encoded as they
+arrive, so the export runs in constant memory however large the tables are.
+Two layouts are produced, both readable by ``import_transportation``:
+
+* ``json``: one object with a list of rows per data type, written as a
+  chunked array (the shape the export has always had);
+* ``ndjson``: one ``{"type": ...}`` header line per data type, followed by
+  one ``{"type": ..., "row": {...}}`` object per row, easy to split, grep or
+  load a line at a time.
+
+Every data type is written even when it has no rows (``[]``, or a header
+alone), because the importer reads a type that is present but empty as
+"delete every row" and a missing one as "leave as is".
+
+``gzip_stream`` compresses either stream on the fly.
+"""
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .transport_import import IMPORT_SPECS
+
+EXPORT_FORMATS = ('json', 'ndjson')
+EXPORT_CHUNK_SIZE = 500
+GZIP_LEVEL = 6
+_GZIP_WBITS = 16 + zlib.MAX_WBITS  # gzip header and trailer
+
+_encoder = DjangoJSONEncoder()
+
+
+def _rows(model):
+    return model.objects.order_by('pk').values().iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def iter_json_export(specs=IMPORT_SPECS):
+    """Yield the export as one JSON object, a data type at a time"""
+    yield '{\n  "exported_at": %s' % _encoder.encode(timezone.now())
+    for spec in specs:
+        yield ',\n  %s: [' % json.dumps(spec.data_type)
+        separator = '\n    '
+        for row in _rows(spec.model):
+            yield separator + _encoder.encode(row)
+            separator = ',\n    '
+        yield '\n  ]' if separator != '\n    ' else ']'
+    yield '\n}\n'
+
+
+def iter_ndjson_export(specs=IMPORT_SPECS):
+    """Yield the export as newline-delimited JSON, a header line per data type then one row per line"""
+    for spec in specs:
+        data_type = json.dumps(spec.data_type)
+        yield '{"type": %s}\n' % data_type
+        for row in _rows(spec.model):
+            yield '{"type": %s, "row": %s}\n' % (data_type, _encoder.encode(row))
+
+
+def iter_export(output='json'):
+    return iter_ndjson_export() if output == 'ndjson' else iter_json_export()
+
+
+def gzip_stream(chunks, level=GZIP_LEVEL):
+    """Gzip a stream of text chunks, yielding compressed bytes as they fill"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _GZIP_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode('utf-8'))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def parse_ndjson(lines):
+    """``{data_type: [row, ...]}`` from NDJSON export lines; raises ``ValueError`` on malformed lines
+
+    A header line (no ``row``) marks its type as present, so a type with a
+    header and no rows comes back as an empty list.
+    """
+    data = {}
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            raise ValueError(f'line {number} is not valid JSON')
+        if not isinstance(entry, dict) or not isinstance(entry.get('type'), str):
+            raise ValueError(f'line {number} must be an object with a "type"')
+        rows = data.setdefault(entry['type'], [])
+        if 'row' in entry:
+            rows.append(entry['row'])
+    return data
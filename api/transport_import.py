@@ -0,0 +1,248 @@
+"""
+Diff-based import of the transportation data set.
+
+Files have the shape ``transportation_export`` writes: one list of rows per
+data type. Rows are matched to stored ones on natural keys instead of ids
+(an atoll by name, a ferry sailing by route and departure time), so an
+import updates rows in place and keeps their primary keys. For each data
+type in the file the rows are split into inserts, updates (rows with at
+least one changed field) and deletes (stored rows the file no longer has),
+then applied with ``bulk_create``/``bulk_update`` in batches inside one
+transaction. Unchanged rows are not written at all.
+
+Foreign keys between imported types are remapped through the file: a
+resort row's ``atoll_id`` names an atoll row of the same file, whose name
+finds the stored atoll. Timestamps are left to the database, and derived
+ferry fields are recomputed. With ``dry_run`` the same diff is computed and
+reported without writing.
+
+The natural keys are not unique in the database: the import this replaced
+deleted and recreated rows, and tables loaded that way may hold several rows
+per key, which a unique constraint would reject on migration. So stored rows
+are grouped per key; the oldest (lowest pk) one is matched and kept, and the
+others are deleted and reported as ``duplicates``.
+"""
+from collections import Counter, defaultdict, namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    AtollTransfer, FerrySchedule, ResortTransfer, TransferBenefit, TransferBookingStep, TransferContactMethod,
+    TransferContent, TransferFAQ, TransferPricingFactor, TransferType,
+)
+from .timetable import DERIVED_FIELDS, LocationResolver, normalize_schedule
+
+IMPORT_BATCH_SIZE = 500
+
+ImportSpec = namedtuple('ImportSpec', 'data_type model key_fields')
+
+# Parents before children, so foreign keys can be remapped
+IMPORT_SPECS = [
+    ImportSpec('transfer_types', TransferType, ('name',)),
+    ImportSpec('atoll_transfers', AtollTransfer, ('atoll_name',)),
+    ImportSpec('resort_transfers', ResortTransfer, ('resort_name', 'transfer_type')),
+    ImportSpec('transfer_faqs', TransferFAQ, ('question',)),
+    ImportSpec('transfer_contact_methods', TransferContactMethod, ('method',)),
+    ImportSpec('transfer_booking_steps', TransferBookingStep, ('step_number',)),
+    ImportSpec('transfer_benefits', TransferBenefit, ('benefit',)),
+    ImportSpec('transfer_pricing_factors', TransferPricingFactor, ('factor',)),
+    ImportSpec('transfer_content', TransferContent, ('section',)),
+    ImportSpec('ferry_schedules', FerrySchedule, ('route_name', 'departure_time')),
+]
+
+
+class TransportImportError(Exception):
+    """The file cannot be applied; nothing was written"""
+
+
+def _imported_fields(spec):
+    """Concrete fields an import sets: no pk, no timestamps, no derived or foreign-to-the-file keys"""
+    imported_models = {other.model for other in IMPORT_SPECS}
+    fields = []
+    for field in spec.model._meta.concrete_fields:
+        if field.primary_key or getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            continue
+        if field.is_relation and field.related_model not in imported_models:
+            continue
+        if spec.model is FerrySchedule and field.name in DERIVED_FIELDS:
+            continue
+        fields.append(field)
+    return fields
+
+
+def _key(spec, obj):
+    return tuple(getattr(obj, name) for name in spec.key_fields)
+
+
+class _Diff:
+    def __init__(self, spec):
+        self.spec = spec
+        self.create, self.update, self.delete = [], [], []
+        self.unchanged = 0
+        self.duplicates = 0
+        self.changed_fields = Counter()
+        self.pk_by_file_id = {}  # the file's row id -> stored (or, in a dry run, placeholder) pk
+
+    def summary(self):
+        return {
+            'created': len(self.create),
+            'updated': len(self.update),
+            'deleted': len(self.delete),
+            'unchanged': self.unchanged,
+            'duplicates': self.duplicates,
+            'changed_fields': dict(self.changed_fields),
+        }
+
+
+def _build(spec, row, fields, parents):
+    """Unsaved instance for one file row, with values cleaned by each field's ``to_python``"""
+    obj = spec.model()
+    for field in fields:
+        name = field.attname
+        if name not in row and field.name not in row:
+            continue
+        value = row[name] if name in row else row[field.name]
+        if field.is_relation:
+            parent = parents.get(field.related_model)
+            if value is not None and (parent is None or value not in parent.pk_by_file_id):
+                raise TransportImportError(
+                    f'{spec.data_type}: {field.name} {value!r} does not match a row of the file'
+                )
+            value = parent.pk_by_file_id[value] if value is not None else None
+        else:
+            try:
+                value = field.to_python(value)
+            except ValidationError as e:
+                raise TransportImportError(f'{spec.data_type}: invalid {field.name} {value!r}: {e.messages[0]}')
+        setattr(obj, name, value)
+    return obj
+
+
+def _diff(spec, rows, parents, resolver, dry_run):
+    diff = _Diff(spec)
+    fields = _imported_fields(spec)
+    stored = defaultdict(list)
+    for obj in spec.model.objects.order_by('pk'):
+        stored[_key(spec, obj)].append(obj)
+    for objs in stored.values():
+        diff.duplicates += len(objs) - 1
+        diff.delete.extend(objs[1:])
+    stored = {key: objs[0] for key, objs in stored.items()}
+    seen = set()
+    file_ids = []
+    for row in rows:
+        if not isinstance(row, dict):
+            raise TransportImportError(f'{spec.data_type}: every row must be an object')
+        incoming = _build(spec, row, fields, parents)
+        if spec.model is FerrySchedule:
+            normalize_schedule(incoming, resolver)
+        key = _key(spec, incoming)
+        if None in key or '' in key:
+            raise TransportImportError(f"{spec.data_type}: every row needs {', '.join(spec.key_fields)}")
+        if key in seen:
+            raise TransportImportError(f'{spec.data_type}: duplicate row {key!r}')
+        seen.add(key)
+
+        current = stored.get(key)
+        if current is None:
+            diff.create.append(incoming)
+        else:
+            incoming.pk = current.pk
+            compared = [field.attname for field in fields]
+            if spec.model is FerrySchedule:
+                compared += [spec.model._meta.get_field(name).attname for name in DERIVED_FIELDS]
+            changed = [name for name in compared if getattr(current, name) != getattr(incoming, name)]
+            if changed:
+                for name in changed:
+                    setattr(current, name, getattr(incoming, name))
+                diff.changed_fields.update(changed)
+                diff.update.append(current)
+            else:
+                diff.unchanged += 1
+        file_ids.append((row.get('id'), incoming if current is None else current))
+    diff.delete += [obj for key, obj in stored.items() if key not in seen]
+
+    if not dry_run:
+        _apply(diff)
+    placeholder = 0
+    for file_id, obj in file_ids:
+        if obj.pk is None:  # dry run: stands in for the row that would be inserted
+            placeholder -= 1
+            obj.pk = placeholder
+        if file_id is not None:
+            diff.pk_by_file_id[file_id] = obj.pk
+    return diff
+
+
+def _apply(diff):
+    model = diff.spec.model
+    if diff.delete:
+        pks = [obj.pk for obj in diff.delete]
+        for start in range(0, len(pks), IMPORT_BATCH_SIZE):
+            model.objects.filter(pk__in=pks[start:start + IMPORT_BATCH_SIZE]).delete()
+    if diff.update:
+        update_fields = list(diff.changed_fields)
+        if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+            now = timezone.now()
+            for obj in diff.update:
+                obj.updated_at = now
+            update_fields.append('updated_at')
+        model.objects.bulk_update(diff.update, update_fields, batch_size=IMPORT_BATCH_SIZE)
+    if diff.create:
+        created = model.objects.bulk_create(diff.create, batch_size=IMPORT_BATCH_SIZE)
+        if any(obj.pk is None for obj in created):  # backend cannot return ids from bulk inserts
+            stored = {_key(diff.spec, obj): obj.pk for obj in model.objects.all()}
+            for obj in created:
+                obj.pk = stored[_key(diff.spec, obj)]
+
+
+def import_transportation(data, dry_run=False):
+    """Apply (or with ``dry_run`` only compute) the diff of a transportation data file
+
+    Returns ``{data_type: {'created', 'updated', 'deleted', 'unchanged',
+    'duplicates', 'changed_fields'}}`` for the types present in ``data``;
+    ``deleted`` includes the ``duplicates``. Raises
+    ``TransportImportError`` without writing anything if a row is invalid.
+    """
+    if not isinstance(data, dict):
+        raise TransportImportError('The file must contain a JSON object')
+    specs = [spec for spec in IMPORT_SPECS if spec.data_type in data]
+    for spec in specs:
+        if not isinstance(data[spec.data_type], list):
+            raise TransportImportError(f'{spec.data_type} must be a list')
+
+    diffs = {}
+    resolver = LocationResolver() if any(spec.model is FerrySchedule for spec in specs) else None
+    with transaction.atomic():
+        parents = {}
+        for spec in specs:
+            diff = _diff(spec, data[spec.data_type], parents, resolver, dry_run)
+            parents[spec.model] = diff
+            diffs[spec.data_type] = diff
+        if not dry_run:
+            transaction.on_commit(lambda: _refresh_derived(diffs))
+    return {data_type: diff.summary() for data_type, diff in diffs.items()}
+
+
+def _refresh_derived(diffs):
+    """Bulk writes send no model signals, so refresh what the signal handlers would have"""
+    from .journeys import invalidate_ferry_network
+    from .search import invalidate_search_cache, remove_from_search_index, update_search_index
+    from .transfer_compare import invalidate_transportation_data
+    from .transfer_quotes import invalidate_transfer_quotes
+
+    written = {data_type for data_type, diff in diffs.items() if diff.create or diff.update or diff.delete}
+    if 'ferry_schedules' in written:
+        invalidate_ferry_network()
+    if written & {'atoll_transfers', 'resort_transfers', 'transfer_pricing_factors'}:
+        invalidate_transfer_quotes()
+    if written & {'transfer_types', 'atoll_transfers', 'resort_transfers', 'ferry_schedules'}:
+        invalidate_transportation_data()
+    faqs = diffs.get('transfer_faqs')
+    if faqs and 'transfer_faqs' in written:
+        update_search_index('transfer_faq', [obj.pk for obj in faqs.create + faqs.update])
+        for obj in faqs.delete:
+            remove_from_search_index('transfer_faq', obj.pk)
+        invalidate_search_cache('content')
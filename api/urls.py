@@ -21,6 +21,7 @@ router.register(r'amenities', views.AmenityViewSet)
 router.register(r'reviews', views.ReviewViewSet)
 router.register(r'bookings', views.BookingViewSet)
 router.register(r'availability', views.AvailabilityViewSet)
+router.register(r'pricing-rules', views.PricingRuleViewSet)
 router.register(r'customers', views.CustomerViewSet)
 
 # Package-related routes
@@ -74,16 +75,33 @@ router.register(r'about/statistics', AboutPageStatisticViewSet)
 router.register(r'featured-destinations', FeaturedDestinationViewSet)
 
 urlpatterns = [
+    # Before the router, whose bookings/<pk>/ route would otherwise swallow these
+    path('bookings/create-booking/', views.create_booking, name='create_booking'),
+    path('bookings/my-bookings/', views.my_bookings, name='my_bookings'),
+    path('bookings/summary/', views.booking_summary, name='booking_summary'),
+    path('bookings/holds/', views.create_booking_hold, name='create_booking_hold'),
+    path('bookings/holds/<uuid:hold_token>/', views.booking_hold, name='booking_hold'),
     path('', include(router.urls)),
     path('upload-image/', views.upload_image, name='upload_image'),
     path('package-images/', views.upload_image, name='upload_package_image'),
     path('search/', views.search, name='search'),
+    path('search/autocomplete/', views.search_autocomplete, name='search_autocomplete'),
+    path('search/analytics/', views.search_analytics, name='search_analytics'),
+    path('search/availability/', views.AvailablePropertySearchView.as_view(), name='availability_search'),
     path('analytics/', views.analytics, name='analytics'),
     path('analytics/content-stats/', views.content_stats, name='content_stats'),
     path('dashboard-stats/', views.dashboard_stats, name='dashboard_stats'),
     path('properties/<int:property_id>/availability/', views.check_availability, name='property_availability'),
-    path('bookings/create-booking/', views.create_booking, name='create_booking'),
+    path('properties/<int:property_id>/calendar/', views.property_calendar, name='property_calendar'),
+    path('properties/<int:property_id>/calendar.ics', views.property_ical, name='property_ical'),
+    path('properties/<int:property_id>/calendar/import/', views.import_property_ical, name='import_property_ical'),
     path('transportation/', views.transportation_data, name='transportation_data'),
+    path('transportation/journeys/', views.ferry_journeys, name='ferry_journeys'),
+    path('transportation/departures/', views.ferry_departures, name='ferry_departures'),
+    path('transportation/board/', views.ferry_board, name='ferry_board'),
+    path('transportation/quote/', views.transfer_quote, name='transfer_quote'),
+    path('transportation/compare/', views.transfer_comparison, name='transfer_comparison'),
+    path('transportation/distances/', views.location_distances, name='location_distances'),
     path('transportation/export/', views.transportation_export, name='transportation_export'),
     path('transportation/import/', views.transportation_import, name='transportation_import'),
     path('homepage/public/', HomepageManagementViewSet.as_view({'get': 'public_content'}), name='homepage-public-content'),
@@ -1,15 +1,20 @@
-from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render, get_object_or_404
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET
 from django.db import models
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.db import connection
 from rest_framework import viewsets, status
 from rest_framework.generics import ListAPIView, CreateAPIView, UpdateAPIView
+from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 from datetime import datetime, timedelta
 import os
+import time
 import uuid
 from django.conf import settings
 from .models import (
@@ -21,13 +26,14 @@ from .models import (
     HomepageHero, HomepageFeature, HomepageTestimonial, HomepageStatistic, 
     HomepageCTASection, HomepageSettings, HomepageContent, HomepageImage, PageHero,
     Language, Translation, TranslationKey, CulturalContent, RegionalSettings, LocalizedPage, LocalizedFAQ,
-    AboutPageContent, AboutPageValue, AboutPageStatistic, FeaturedDestination
+    AboutPageContent, AboutPageValue, AboutPageStatistic, FeaturedDestination, SearchQueryLog, PricingRule
 )
 from .serializers import (
     PropertyTypeSerializer, AmenitySerializer, LocationSerializer, DestinationSerializer, ExperienceSerializer,
-    PropertyImageSerializer, PackageImageSerializer, PropertySerializer, PackageSerializer, PackageSerializerI18n,
+    PropertyImageSerializer, PackageImageSerializer, PropertySerializer, AvailablePropertySerializer, PackageSerializer, PackageSerializerI18n,
+    PricingRuleSerializer, BookingHoldSerializer, BookingHoldConfirmSerializer,
     ReviewSerializer, BookingSerializer, BookingCreateSerializer, 
-    BookingStatusUpdateSerializer, AvailabilitySerializer, CustomerSerializer,
+    BookingStatusUpdateSerializer, AvailabilitySerializer, AvailabilityBulkRangeSerializer, CustomerSerializer,
     PageSerializer, PageBlockSerializer, MediaAssetSerializer, MenuSerializer, MenuItemSerializer,
     RedirectSerializer, PageVersionSerializer, PageReviewSerializer, CommentThreadSerializer, CommentSerializer,
     PackageItinerarySerializer, PackageInclusionSerializer, PackageActivitySerializer, PackageDestinationSerializer,
@@ -46,7 +52,8 @@ from .serializers import (
 from rest_framework.decorators import permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.db.models import Count, Avg, Sum
+from django.db.models import Count, Avg, Sum, F, OuterRef, Q, Subquery
+from django.db.models.functions import Trunc
 from .models import Property, Package, Review, PropertyType, Amenity, Location, Customer
 from .serializers import (
     PropertyTypeSerializer, 
@@ -64,6 +71,25 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 from django.db import transaction
+from .place_matching import match_places
+from .search import cached_search, content_results, get_search_backend, normalize_query, parse_search_types
+from .search_log import query_log
+from .distances import get_distance_matrix
+from .journeys import get_ferry_network
+from .timetable import WEEKDAY_NAMES, LocationResolver, weekday_mask
+from .transfer_compare import MAX_COMPARED_RESORTS, comparison_matrix
+from .transfer_quotes import get_transfer_quote_index
+from .transfer_tree import load_atoll_tree
+from .transport_import import TransportImportError, import_transportation
+from .transport_export import EXPORT_FORMATS, gzip_stream, iter_export, parse_ndjson
+from .ical import MAX_IMPORT_BYTES, feed_validators, import_calendar, iter_property_calendar
+from .bookings import confirm_hold, release_hold
+from .availability import (
+    MAX_CALENDAR_NIGHTS, PropertyCalendar, available_properties, rank_by_total_price, upsert_availability
+)
+from .pricing import PriceMatrix
+import gzip
+import io
 import json
 
 # Create your views here.
@@ -426,6 +452,23 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['property_obj', 'date', 'is_available']
 
+    @action(detail=False, methods=['post'], url_path='bulk-range')
+    def bulk_range(self, request):
+        """Block, open or reprice date ranges of a property in one transaction"""
+        serializer = AvailabilityBulkRangeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        property_obj = serializer.validated_data['property_obj']
+        nights = upsert_availability(property_obj.pk, serializer.validated_data['ranges'])
+        return Response({'property_id': property_obj.pk, 'nights': nights})
+
+class PricingRuleViewSet(viewsets.ModelViewSet):
+    queryset = PricingRule.objects.select_related('property_obj')
+    serializer_class = PricingRuleSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['property_obj', 'adjustment_type', 'is_active']
+
 class CustomerViewSet(viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
@@ -450,27 +493,25 @@ def check_availability(request, property_id):
         check_in = datetime.strptime(check_in_date, '%Y-%m-%d').date()
         check_out = datetime.strptime(check_out_date, '%Y-%m-%d').date()
         
-        # Check for overlapping bookings
-        overlapping_bookings = Booking.objects.filter(
-            property_obj=property_obj,
-            status__in=['pending', 'confirmed'],
-            check_in_date__lt=check_out,
-            check_out_date__gt=check_in
-        )
+        if check_out <= check_in:
+            return Response(
+                {'error': 'check_out must be after check_in'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        is_available = not overlapping_bookings.exists()
-        nights = (check_out - check_in).days
-        total_price = property_obj.price_per_night * nights
+        # Bookings and blocked dates, with per-night price overrides
+        calendar = PropertyCalendar(property_obj, check_in, check_out)
         
         return Response({
             'property_id': property_obj.id,
             'property_name': property_obj.name,
             'check_in': check_in_date,
             'check_out': check_out_date,
-            'nights': nights,
-            'is_available': is_available,
+            'nights': len(calendar),
+            'is_available': calendar.is_available,
             'price_per_night': float(property_obj.price_per_night),
-            'total_price': float(total_price),
+            'nightly_prices': [float(price) for price in calendar.prices],
+            'total_price': float(calendar.total_price),
             'currency': 'USD'
         })
         
@@ -485,6 +526,175 @@ def check_availability(request, property_id):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+@require_GET
+def property_ical(request, property_id):
+    """Streaming iCalendar feed of a property's booked and blocked nights for partner channels
+
+    Answers ``If-None-Match``/``If-Modified-Since`` with 304 after two
+    aggregate queries, without touching the bookings themselves.
+    """
+    property_obj = get_object_or_404(Property, id=property_id)
+    etag, last_modified = feed_validators(property_obj)
+    etag, last_modified = quote_etag(etag), int(last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = StreamingHttpResponse(iter_property_calendar(property_obj), content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = f'inline; filename="property-{property_obj.id}.ics"'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_property_ical(request, property_id):
+    """Apply an external iCalendar feed to a property's availability
+
+    The feed comes as an uploaded ``file`` or a ``calendar`` text field;
+    ``source`` names the channel so its blocks can be updated on re-import.
+    """
+    try:
+        property_obj = Property.objects.get(id=property_id)
+    except Property.DoesNotExist:
+        return Response({'error': 'Property not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    upload = request.FILES.get('file')
+    if upload is not None:
+        if upload.size > MAX_IMPORT_BYTES:
+            return Response({'error': 'Calendar file is too large'}, status=status.HTTP_400_BAD_REQUEST)
+        text = upload.read().decode('utf-8', errors='replace')
+    else:
+        text = request.data.get('calendar', '')
+    if 'BEGIN:VCALENDAR' not in text.upper():
+        return Response({'error': 'An iCalendar file or calendar text is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    source = request.data.get('source') or 'ical'
+    try:
+        result = import_calendar(property_obj, text, source=source)
+    except ValueError as e:
+        return Response({'error': f'Invalid calendar: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'property_id': property_obj.id, 'source': source, **result})
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def property_calendar(request, property_id):
+    """Per-night availability and price for a property, e.g. to shade a date picker
+
+    ``start`` (YYYY-MM-DD, default today) and ``days`` (default 90, at most
+    366) select the nights shown.
+    """
+    try:
+        property_obj = Property.objects.get(id=property_id)
+    except Property.DoesNotExist:
+        return Response({'error': 'Property not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        start_param = request.GET.get('start')
+        start = datetime.strptime(start_param, '%Y-%m-%d').date() if start_param else timezone.now().date()
+        days = int(request.GET.get('days', 90))
+    except ValueError:
+        return Response(
+            {'error': 'Invalid parameters. Use start=YYYY-MM-DD and an integer days'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not 1 <= days <= MAX_CALENDAR_NIGHTS:
+        return Response(
+            {'error': f'days must be between 1 and {MAX_CALENDAR_NIGHTS}'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    calendar = PropertyCalendar(property_obj, start, start + timedelta(days=days))
+    nights = calendar.nights()
+    return Response({
+        'property_id': property_obj.id,
+        'start': calendar.start.isoformat(),
+        'end': calendar.end.isoformat(),
+        'currency': 'USD',
+        'available_nights': sum(1 for night in nights if night['available']),
+        'nights': nights,
+    })
+
+class AvailablePropertySearchView(ListAPIView):
+    """Properties free for a whole stay, e.g. ?check_in=2025-03-12&check_out=2025-03-18&guests=3
+
+    Also accepts the property filters (property_type, location, amenities),
+    island, atoll, min_price/max_price per night and ordering by total_price,
+    -total_price or name.
+
+    Name ordering paginates in SQL and prices only the page. Ordering by
+    total prices every candidate for every night (one NumPy matrix, sorted
+    on its cent sums), so its cost grows with candidates × nights.
+    """
+    serializer_class = AvailablePropertySerializer
+    permission_classes = [AllowAny]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['amenities', 'property_type', 'location']
+    ordering_fields = {'total_price', '-total_price', 'name', '-name'}
+
+    def list(self, request, *args, **kwargs):
+        try:
+            self.check_in = datetime.strptime(request.query_params['check_in'], '%Y-%m-%d').date()
+            self.check_out = datetime.strptime(request.query_params['check_out'], '%Y-%m-%d').date()
+            self.guests = int(request.query_params.get('guests', 1))
+            for key in ('min_price', 'max_price'):
+                if request.query_params.get(key):
+                    float(request.query_params[key])
+        except KeyError:
+            return Response({'error': 'check_in and check_out dates are required'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response(
+                {'error': 'Invalid parameters. Use YYYY-MM-DD dates, an integer guests and numeric prices'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if self.check_out <= self.check_in:
+            return Response({'error': 'check_out must be after check_in'}, status=status.HTTP_400_BAD_REQUEST)
+        if (self.check_out - self.check_in).days > MAX_CALENDAR_NIGHTS:
+            return Response(
+                {'error': f'Stays are limited to {MAX_CALENDAR_NIGHTS} nights'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = request.query_params.get('ordering', 'total_price')
+        if ordering not in self.ordering_fields:
+            ordering = 'total_price'
+        if ordering.lstrip('-') == 'name':
+            page = self.paginate_queryset(
+                queryset.order_by(ordering, ordering.replace('name', 'pk')).values_list('pk', flat=True)
+            )
+            matrix = None
+        else:
+            # Every candidate is priced in one matrix so results can be ordered by stay total
+            ranked, matrix = rank_by_total_price(queryset, self.check_in, self.check_out, ordering.startswith('-'))
+            page = self.paginate_queryset(ranked)
+
+        properties = Property.objects.select_related('property_type', 'location').prefetch_related(
+            'amenities', 'images', 'reviews'
+        ).in_bulk(page)
+        if matrix is None:
+            matrix = PriceMatrix({pk: properties[pk].price_per_night for pk in page}, self.check_in, self.check_out)
+        nights = (self.check_out - self.check_in).days
+        results = []
+        for pk in page:
+            property_obj = properties[pk]
+            property_obj.nights = nights
+            property_obj.total_price = matrix.total(pk)
+            results.append(property_obj)
+        return self.get_paginated_response(self.get_serializer(results, many=True).data)
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = Property.objects.all()
+        if params.get('island'):
+            queryset = queryset.filter(location__island__iexact=params['island'])
+        if params.get('atoll'):
+            queryset = queryset.filter(location__atoll__iexact=params['atoll'])
+        if params.get('min_price'):
+            queryset = queryset.filter(price_per_night__gte=params['min_price'])
+        if params.get('max_price'):
+            queryset = queryset.filter(price_per_night__lte=params['max_price'])
+        return available_properties(self.check_in, self.check_out, guests=self.guests, queryset=queryset)
+
 @api_view(['GET'])
 def property_bookings(request, property_id):
     """Get all bookings for a specific property"""
@@ -505,42 +715,129 @@ def create_booking(request):
     """Create a new booking with validation"""
     serializer = BookingCreateSerializer(data=request.data)
     if serializer.is_valid():
-        booking = serializer.save()
-        
         # If user is authenticated, link booking to customer
+        customer = None
         if request.user.is_authenticated:
-            try:
-                customer = Customer.objects.get(user=request.user)
-                booking.customer = customer
-                booking.save()
-            except Customer.DoesNotExist:
-                pass  # Continue without linking if customer profile doesn't exist
+            customer = Customer.objects.filter(user=request.user).first()
         
+        booking = serializer.save(customer=customer)
         return Response(BookingSerializer(booking).data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def create_booking_hold(request):
+    """Hold the dates for BOOKING_HOLD_TTL seconds while the guest completes checkout"""
+    serializer = BookingHoldSerializer(data=request.data)
+    if serializer.is_valid():
+        customer = None
+        if request.user.is_authenticated:
+            customer = Customer.objects.filter(user=request.user).first()
+        
+        serializer.save(customer=customer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['POST', 'DELETE'])
+@permission_classes([AllowAny])
+def booking_hold(request, hold_token):
+    """POST confirms a hold with the guest details; DELETE releases it"""
+    if request.method == 'DELETE':
+        if not release_hold(hold_token):
+            return Response({'error': 'Hold not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    serializer = BookingHoldConfirmSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    booking = confirm_hold(hold_token, **serializer.validated_data)
+    if booking is None:
+        return Response(
+            {'error': 'This hold has expired or was already used. Please check availability again.'},
+            status=status.HTTP_409_CONFLICT
+        )
+    return Response(BookingSerializer(booking).data)
+
+SUMMARY_INTERVALS = {'day': 30, 'week': 12 * 7, 'month': 365}  # default window in days
+REVENUE_STATUSES = ['pending', 'confirmed', 'completed']
+
+def _bucket_starts(interval, start, end):
+    """First day of every day/ISO week/month bucket touching [start, end]"""
+    if interval == 'week':
+        start -= timedelta(days=start.weekday())
+    elif interval == 'month':
+        start = start.replace(day=1)
+    buckets = []
+    while start <= end:
+        buckets.append(start)
+        if interval == 'month':
+            start = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            start += timedelta(days=7 if interval == 'week' else 1)
+    return buckets
+
 @api_view(['GET'])
 def booking_summary(request):
-    """Get booking summary statistics"""
-    total_bookings = Booking.objects.count()
-    pending_bookings = Booking.objects.filter(status='pending').count()
-    confirmed_bookings = Booking.objects.filter(status='confirmed').count()
-    completed_bookings = Booking.objects.filter(status='completed').count()
-    cancelled_bookings = Booking.objects.filter(status='cancelled').count()
-    
-    # Recent bookings (last 30 days)
+    """Get booking summary statistics
+
+    Status counts come from a single conditional aggregation. With
+    ``interval=day|week|month`` (and optional ``start``/``end`` dates) a
+    series of bookings made and revenue per bucket is added, zero-filled.
+    """
     thirty_days_ago = timezone.now().date() - timedelta(days=30)
-    recent_bookings = Booking.objects.filter(created_at__date__gte=thirty_days_ago).count()
+    summary = Booking.objects.aggregate(
+        total_bookings=Count('id'),
+        pending_bookings=Count('id', filter=Q(status='pending')),
+        confirmed_bookings=Count('id', filter=Q(status='confirmed')),
+        completed_bookings=Count('id', filter=Q(status='completed')),
+        cancelled_bookings=Count('id', filter=Q(status='cancelled')),
+        held_bookings=Count('id', filter=Q(status='held')),
+        recent_bookings=Count('id', filter=Q(created_at__date__gte=thirty_days_ago)),
+    )
+    summary['last_updated'] = timezone.now()
     
-    return Response({
-        'total_bookings': total_bookings,
-        'pending_bookings': pending_bookings,
-        'confirmed_bookings': confirmed_bookings,
-        'completed_bookings': completed_bookings,
-        'cancelled_bookings': cancelled_bookings,
-        'recent_bookings': recent_bookings,
-        'last_updated': timezone.now()
-    })
+    interval = request.GET.get('interval')
+    if not interval:
+        return Response(summary)
+    if interval not in SUMMARY_INTERVALS:
+        return Response(
+            {'error': f"interval must be one of {', '.join(SUMMARY_INTERVALS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        end = datetime.strptime(request.GET['end'], '%Y-%m-%d').date() if request.GET.get('end') else timezone.now().date()
+        start = (
+            datetime.strptime(request.GET['start'], '%Y-%m-%d').date() if request.GET.get('start')
+            else end - timedelta(days=SUMMARY_INTERVALS[interval] - 1)
+        )
+    except ValueError:
+        return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    if end < start:
+        return Response({'error': 'end must not be before start'}, status=status.HTTP_400_BAD_REQUEST)
+    if (end - start).days > 3 * 366:
+        return Response({'error': 'The window may span at most three years'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    rows = Booking.objects.filter(created_at__date__gte=start, created_at__date__lte=end).annotate(
+        bucket=Trunc('created_at', interval, output_field=models.DateField())
+    ).values('bucket').annotate(
+        bookings=Count('id'),
+        revenue=Sum('total_price', filter=Q(status__in=REVENUE_STATUSES)),
+    ).order_by('bucket')
+    by_bucket = {row['bucket']: row for row in rows}
+    summary['series'] = {
+        'interval': interval,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'buckets': [
+            {
+                'start': bucket.isoformat(),
+                'bookings': by_bucket.get(bucket, {}).get('bookings', 0),
+                'revenue': float(by_bucket.get(bucket, {}).get('revenue') or 0),
+            }
+            for bucket in _bucket_starts(interval, start, end)
+        ],
+    }
+    return Response(summary)
 
 # Customer Authentication Views
 from django.contrib.auth import authenticate
@@ -552,26 +849,50 @@ from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import Customer
 
+def _first_image(property_ref):
+    """Subquery for the image a listing leads with: featured first, then by display order"""
+    return Subquery(
+        PropertyImage.objects.filter(property=property_ref).order_by('-is_featured', 'order', 'id').values('image')[:1]
+    )
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def my_bookings(request):
-    """Get bookings for the authenticated customer"""
+    """Get bookings for the authenticated customer, newest first and paginated
+
+    Optional filters: ``status`` (comma-separated) and ``from``/``to`` dates
+    selecting stays that touch that window.
+    """
     try:
-        # Get customer profile
         customer = Customer.objects.get(user=request.user)
         
-        # Get bookings for this customer
-        bookings = Booking.objects.filter(customer=customer).order_by('-created_at')
-        
-        # Serialize bookings with property details
-        booking_data = []
-        for booking in bookings:
-            booking_data.append({
+        bookings = Booking.objects.filter(customer=customer)
+        statuses = [value for value in request.GET.get('status', '').split(',') if value]
+        if statuses:
+            bookings = bookings.filter(status__in=statuses)
+        try:
+            if request.GET.get('from'):
+                bookings = bookings.filter(check_out_date__gte=datetime.strptime(request.GET['from'], '%Y-%m-%d').date())
+            if request.GET.get('to'):
+                bookings = bookings.filter(check_in_date__lte=datetime.strptime(request.GET['to'], '%Y-%m-%d').date())
+        except ValueError:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # One query per page: property columns joined, lead image as a correlated subquery
+        bookings = bookings.select_related('property_obj').annotate(
+            property_image=_first_image(OuterRef('property_obj'))
+        ).order_by('-created_at', '-id')
+        
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(bookings, request)
+        storage = PropertyImage._meta.get_field('image').storage
+        booking_data = [
+            {
                 'id': booking.id,
                 'property': {
                     'id': booking.property_obj.id,
                     'name': booking.property_obj.name,
-                    'image': booking.property_obj.images.first().image.url if booking.property_obj.images.exists() else None
+                    'image': storage.url(booking.property_image) if booking.property_image else None
                 },
                 'check_in': booking.check_in_date.isoformat(),
                 'check_out': booking.check_out_date.isoformat(),
@@ -580,12 +901,10 @@ def my_bookings(request):
                 'created_at': booking.created_at.isoformat(),
                 'number_of_guests': booking.number_of_guests,
                 'special_requests': booking.special_requests
-            })
-        
-        return Response({
-            'results': booking_data,
-            'count': len(booking_data)
-        })
+            }
+            for booking in page
+        ]
+        return paginator.get_paginated_response(booking_data)
         
     except Customer.DoesNotExist:
         return Response({'error': 'Customer profile not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -729,42 +1048,121 @@ def upload_image(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def search(request):
-    """Search across properties, packages, and locations"""
+    """Search across properties, packages, locations and published content
+
+    ``types`` narrows the search to a comma-separated list of property,
+    package, location, page, transfer_faq, localized_faq, cultural_content
+    or content (all four content types).
+    """
     try:
         query = request.GET.get('q', '').strip()
         if not query:
             return Response({'error': 'Search query is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Search properties
-        properties = Property.objects.filter(
-            models.Q(name__icontains=query) |
-            models.Q(description__icontains=query) |
-            models.Q(address__icontains=query)
-        )[:10]
-        
-        # Search packages
-        packages = Package.objects.filter(
-            models.Q(name__icontains=query) |
-            models.Q(description__icontains=query)
-        )[:10]
-        
-        # Search locations
-        locations = Location.objects.filter(
-            models.Q(island__icontains=query) |
-            models.Q(atoll__icontains=query)
-        )[:10]
-        
-        results = {
-            'properties': PropertySerializer(properties, many=True).data,
-            'packages': PackageSerializer(packages, many=True).data,
-            'locations': LocationSerializer(locations, many=True).data,
-            'query': query
-        }
+        try:
+            doc_types = parse_search_types(request.GET.get('types'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        backend = get_search_backend()
+        started = time.perf_counter()
+        
+        def run_search():
+            # Resolve misspelled or transliterated island/atoll names
+            places = match_places(query)
+            
+            # Search catalog rows and published content
+            found = backend.search(query, places, limit=10, doc_types=doc_types)
+            properties = _in_order(
+                Property.objects.select_related('property_type', 'location').prefetch_related('amenities', 'images', 'reviews'),
+                found.get('property', [])
+            )
+            packages = _in_order(Package.objects.all(), found.get('package', []))
+            locations = _in_order(Location.objects.all(), found.get('location', []))
+            
+            return {
+                'properties': PropertySerializer(properties, many=True).data,
+                'packages': PackageSerializer(packages, many=True).data,
+                'locations': LocationSerializer(locations, many=True).data,
+                'content': content_results(found, query),
+                'matched_places': places,
+                'backend': backend.name,
+            }
+        
+        data, cached = cached_search(query, doc_types, backend.name, run_search)
+        results = dict(data, query=query)
+        query_log.record(
+            query,
+            normalize_query(query),
+            {group: len(results[group]) for group in ('properties', 'packages', 'locations', 'content')},
+            (time.perf_counter() - started) * 1000,
+            backend=backend.name,
+            cached=cached,
+        )
         
         return Response(results)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _in_order(queryset, pks):
+    """Fetch rows by primary key, keeping the ranking order of ``pks``"""
+    objects = queryset.in_bulk(pks)
+    return [objects[pk] for pk in pks if pk in objects]
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_autocomplete(request):
+    """Suggest island and atoll names for a partial or misspelled query"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 8)), 20))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'query': query,
+        'suggestions': match_places(query, limit=limit, prefix=True)
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_analytics(request):
+    """Most frequent and zero-result search queries over the last ``days`` days"""
+    try:
+        days = int(request.GET.get('days', 30))
+        limit = max(1, min(int(request.GET.get('limit', 20)), 100))
+    except ValueError:
+        return Response({'error': 'days and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        query_log.flush()
+        logs = SearchQueryLog.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+        totals = logs.aggregate(
+            searches=Count('id'),
+            zero_results=Count('id', filter=models.Q(result_count=0)),
+            cached=Count('id', filter=models.Q(cached=True)),
+            avg_latency_ms=Avg('latency_ms'),
+        )
+        top_queries = (
+            logs.values('normalized_query')
+            .annotate(searches=Count('id'), avg_results=Avg('result_count'), avg_latency_ms=Avg('latency_ms'))
+            .order_by('-searches', 'normalized_query')[:limit]
+        )
+        zero_result_queries = (
+            logs.filter(result_count=0)
+            .values('normalized_query')
+            .annotate(searches=Count('id'), last_searched=models.Max('created_at'))
+            .order_by('-searches', 'normalized_query')[:limit]
+        )
+        return Response({
+            'days': days,
+            'totals': totals,
+            'top_queries': list(top_queries),
+            'zero_result_queries': list(zero_result_queries),
+        })
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def content_stats(request):
@@ -1195,9 +1593,17 @@ class AtollTransferViewSet(viewsets.ModelViewSet):
     filterset_fields = ['is_active']
     ordering_fields = ['order', 'atoll_name']
     ordering = ['order']
+    
+    def list(self, request, *args, **kwargs):
+        """Atoll -> resort tree, two queries per page"""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(load_atoll_tree(page), many=True).data)
+        return Response(self.get_serializer(load_atoll_tree(queryset), many=True).data)
 
 class ResortTransferViewSet(viewsets.ModelViewSet):
-    queryset = ResortTransfer.objects.filter(is_active=True)
+    queryset = ResortTransfer.objects.filter(is_active=True).select_related('atoll')
     serializer_class = ResortTransferSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
@@ -1271,13 +1677,244 @@ class FerryScheduleViewSet(viewsets.ModelViewSet):
     ordering_fields = ['route_name', 'departure_time']
     ordering = ['route_name', 'departure_time']
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def ferry_journeys(request):
+    """Fastest ferry itineraries between two islands on a date, with connections
+
+    ``from`` and ``to`` are island names in any common spelling; ``date``
+    (YYYY-MM-DD, default today), ``after`` (HH:MM, default 00:00),
+    ``limit`` (default 3, at most 10) and ``min_transfer`` (minutes) are
+    optional.
+    """
+    network = get_ferry_network()
+    origin = network.find_island(request.GET.get('from'))
+    target = network.find_island(request.GET.get('to'))
+    if origin is None or target is None:
+        return Response(
+            {'error': 'from and to must be islands served by ferry', 'islands': sorted(network.islands)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        travel_date = (
+            datetime.strptime(request.GET['date'], '%Y-%m-%d').date() if request.GET.get('date')
+            else timezone.localdate()
+        )
+        after = datetime.strptime(request.GET.get('after', '00:00'), '%H:%M')
+        limit = int(request.GET.get('limit', 3))
+        min_transfer = int(request.GET['min_transfer']) if request.GET.get('min_transfer') else None
+    except ValueError:
+        return Response(
+            {'error': 'Invalid parameters. Use date=YYYY-MM-DD, after=HH:MM and integer limit/min_transfer'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not 1 <= limit <= 10 or (min_transfer is not None and not 0 <= min_transfer <= 24 * 60):
+        return Response(
+            {'error': 'limit must be between 1 and 10 and min_transfer between 0 and 1440'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    journeys = network.plan(
+        origin, target, travel_date, after=after.hour * 60 + after.minute, limit=limit, transfer=min_transfer
+    )
+    return Response({
+        'from': network.islands[origin],
+        'to': network.islands[target],
+        'date': travel_date.isoformat(),
+        'journeys': journeys,
+    })
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def ferry_departures(request):
+    """Ferries leaving an island on a date or weekday, in departure order
+
+    ``from`` (required) and ``to`` are island names in any common spelling.
+    ``date`` (YYYY-MM-DD) or ``day`` (weekday name) default to today;
+    ``after`` (HH:MM) drops earlier sailings.
+    """
+    resolver = LocationResolver()
+    origin_id = resolver.resolve(request.GET.get('from', ''))
+    destination_id = resolver.resolve(request.GET['to']) if request.GET.get('to') else None
+    if origin_id is None or (request.GET.get('to') and destination_id is None):
+        return Response({'error': 'from and to must be islands with a known location'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        if request.GET.get('day'):
+            mask = weekday_mask([request.GET['day']])
+            if not mask:
+                raise ValueError(request.GET['day'])
+        else:
+            travel_date = (
+                datetime.strptime(request.GET['date'], '%Y-%m-%d').date() if request.GET.get('date')
+                else timezone.localdate()
+            )
+            mask = 1 << travel_date.weekday()
+        after = datetime.strptime(request.GET.get('after', '00:00'), '%H:%M').time()
+    except ValueError:
+        return Response(
+            {'error': 'Invalid parameters. Use date=YYYY-MM-DD or day=<weekday name>, and after=HH:MM'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Index range scan on (origin, departure_time); the weekday bit is checked on those rows
+    schedules = FerrySchedule.objects.filter(
+        is_active=True, origin_id=origin_id, departure_time__gte=after
+    ).alias(sails=F('weekday_mask').bitand(mask)).filter(sails__gt=0)
+    if destination_id is not None:
+        schedules = schedules.filter(destination_id=destination_id)
+    schedules = schedules.select_related('origin', 'destination').order_by('departure_time', 'route_name')
+    return Response({
+        'day': WEEKDAY_NAMES[mask.bit_length() - 1].title(),
+        'after': after.strftime('%H:%M'),
+        'departures': FerryScheduleSerializer(schedules, many=True).data,
+    })
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def ferry_board(request):
+    """Departures board: the next ferries leaving an island, from now on by default
+
+    ``from`` (required) and ``to`` are island names in any common spelling.
+    ``date`` (YYYY-MM-DD) and ``after`` (HH:MM) default to the current local
+    time (midnight for other dates); ``limit`` defaults to 10, at most 50.
+    """
+    network = get_ferry_network()
+    origin = network.find_island(request.GET.get('from'))
+    destination = network.find_island(request.GET['to']) if request.GET.get('to') else None
+    if origin is None or (request.GET.get('to') and destination is None):
+        return Response(
+            {'error': 'from and to must be islands served by ferry', 'islands': sorted(network.islands)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    now = timezone.localtime()
+    try:
+        travel_date = (
+            datetime.strptime(request.GET['date'], '%Y-%m-%d').date() if request.GET.get('date')
+            else now.date()
+        )
+        if request.GET.get('after'):
+            after = datetime.strptime(request.GET['after'], '%H:%M').time()
+        else:
+            after = now.time() if travel_date == now.date() else datetime.min.time()
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        return Response(
+            {'error': 'Invalid parameters. Use date=YYYY-MM-DD, after=HH:MM and an integer limit'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not 1 <= limit <= 50:
+        return Response({'error': 'limit must be between 1 and 50'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'from': network.islands[origin],
+        'to': network.islands[destination] if destination is not None else None,
+        'date': travel_date.isoformat(),
+        'after': after.strftime('%H:%M'),
+        'departures': network.departures(
+            origin, travel_date, after=after.hour * 60 + after.minute, limit=limit, destination=destination
+        ),
+    })
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def transfer_comparison(request):
+    """Options for reaching each of a set of resorts, side by side
+
+    ``resorts`` (comma-separated, misspellings tolerated) or ``atoll`` picks
+    the resorts; ``from`` is the island next ferry sailings leave from
+    (default Male).
+    """
+    if request.GET.get('resorts'):
+        resorts = [name.strip() for name in request.GET['resorts'].split(',') if name.strip()]
+    elif request.GET.get('atoll'):
+        resorts = get_transfer_quote_index().resort_names(request.GET['atoll'])
+    else:
+        return Response({'error': 'resorts or atoll is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if not resorts or len(resorts) > MAX_COMPARED_RESORTS:
+        return Response(
+            {'error': f'Compare between 1 and {MAX_COMPARED_RESORTS} resorts'}, status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(comparison_matrix(resorts, origin=request.GET.get('from', 'Male')))
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def location_distances(request):
+    """Great-circle distance and ETA per transfer mode between islands
+
+    ``from`` (required) and ``to`` are island names in any common spelling.
+    Without ``to``, the nearest ``limit`` locations (default 10, at most 50)
+    within ``max_km`` are listed.
+    """
+    resolver = LocationResolver()
+    origin_id = resolver.resolve(request.GET.get('from', ''))
+    destination_id = resolver.resolve(request.GET['to']) if request.GET.get('to') else None
+    if origin_id is None or (request.GET.get('to') and destination_id is None):
+        return Response({'error': 'from and to must be islands with a known location'}, status=status.HTTP_400_BAD_REQUEST)
+    matrix = get_distance_matrix()
+    origin_position = matrix.position(origin_id)
+    destination_position = matrix.position(destination_id) if destination_id is not None else None
+    if origin_position is None or (destination_id is not None and destination_position is None):
+        # Resolved to a location the cached matrix does not hold yet (created since it was built)
+        return Response({'error': 'No distance data for this location yet'}, status=status.HTTP_404_NOT_FOUND)
+    origin_name = matrix.names[origin_position]
+    if destination_id is not None:
+        return Response(dict(
+            matrix.estimate(origin_id, destination_id),
+            **{'from': origin_name, 'to': matrix.names[destination_position]}
+        ))
+
+    try:
+        limit = int(request.GET.get('limit', 10))
+        max_km = float(request.GET['max_km']) if request.GET.get('max_km') else None
+    except ValueError:
+        return Response({'error': 'limit must be an integer and max_km a number'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= 50:
+        return Response({'error': 'limit must be between 1 and 50'}, status=status.HTTP_400_BAD_REQUEST)
+    nearest = [
+        dict(matrix.estimate(origin_id, location_id), location_id=location_id, name=matrix.names[matrix.position(location_id)])
+        for location_id, _ in matrix.nearest(origin_id, limit=limit, max_km=max_km)
+    ]
+    return Response({'from': origin_name, 'nearest': nearest})
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def transfer_quote(request):
+    """Price and duration of getting a party to a resort, per available transfer type
+
+    ``resort`` (required, misspellings tolerated), ``guests`` (default 1),
+    ``date`` (YYYY-MM-DD, default today), ``type`` (speedboat, seaplane,
+    ferry...) and ``time`` (HH:MM, for time-of-day rules) select the quote.
+    """
+    resort = request.GET.get('resort', '').strip()
+    if not resort:
+        return Response({'error': 'resort is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        guests = int(request.GET.get('guests', 1))
+        travel_date = (
+            datetime.strptime(request.GET['date'], '%Y-%m-%d').date() if request.GET.get('date')
+            else timezone.localdate()
+        )
+        at = datetime.strptime(request.GET['time'], '%H:%M').time() if request.GET.get('time') else None
+    except ValueError:
+        return Response(
+            {'error': 'Invalid parameters. Use an integer guests, date=YYYY-MM-DD and time=HH:MM'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not 1 <= guests <= 50:
+        return Response({'error': 'guests must be between 1 and 50'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    quotes = get_transfer_quote_index().quotes(resort, guests, travel_date, request.GET.get('type'), at)
+    if not quotes:
+        return Response({'error': 'No transfer found for this resort'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'date': travel_date.isoformat(), 'quotes': quotes})
+
 @api_view(['GET'])
 def transportation_data(request):
     """Get all transportation data for the frontend"""
     try:
         data = {
             'transfer_types': TransferTypeSerializer(TransferType.objects.filter(is_active=True), many=True).data,
-            'atoll_transfers': AtollTransferSerializer(AtollTransfer.objects.filter(is_active=True), many=True).data,
+            'atoll_transfers': AtollTransferSerializer(load_atoll_tree(AtollTransfer.objects.filter(is_active=True)), many=True).data,
             'faqs': TransferFAQSerializer(TransferFAQ.objects.filter(is_active=True), many=True).data,
             'contact_methods': TransferContactMethodSerializer(TransferContactMethod.objects.filter(is_active=True), many=True).data,
             'booking_steps': TransferBookingStepSerializer(TransferBookingStep.objects.filter(is_active=True), many=True).data,
@@ -2331,152 +2968,64 @@ class PackageImageViewSet(viewsets.ModelViewSet):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def transportation_export(request):
-    """Export all transportation data as JSON"""
-    try:
-        import json
-        from django.core.serializers.json import DjangoJSONEncoder
-        
-        # Start with a simple test
-        data = {
-            'message': 'Transportation export endpoint is working',
-            'timestamp': timezone.now().isoformat(),
-            'user': str(request.user)
-        }
-        
-        # Try to add transportation data
-        try:
-            # Only add data that exists
-            if TransferType.objects.exists():
-                data['transfer_types'] = list(TransferType.objects.all().values())
-            else:
-                data['transfer_types'] = []
-                
-            if AtollTransfer.objects.exists():
-                data['atoll_transfers'] = list(AtollTransfer.objects.all().values())
-            else:
-                data['atoll_transfers'] = []
-                
-            if ResortTransfer.objects.exists():
-                data['resort_transfers'] = list(ResortTransfer.objects.all().values())
-            else:
-                data['resort_transfers'] = []
-                
-            if TransferFAQ.objects.exists():
-                data['transfer_faqs'] = list(TransferFAQ.objects.all().values())
-            else:
-                data['transfer_faqs'] = []
-                
-            if TransferContactMethod.objects.exists():
-                data['transfer_contact_methods'] = list(TransferContactMethod.objects.all().values())
-            else:
-                data['transfer_contact_methods'] = []
-                
-            if TransferBookingStep.objects.exists():
-                data['transfer_booking_steps'] = list(TransferBookingStep.objects.all().values())
-            else:
-                data['transfer_booking_steps'] = []
-                
-            if TransferBenefit.objects.exists():
-                data['transfer_benefits'] = list(TransferBenefit.objects.all().values())
-            else:
-                data['transfer_benefits'] = []
-                
-            if TransferPricingFactor.objects.exists():
-                data['transfer_pricing_factors'] = list(TransferPricingFactor.objects.all().values())
-            else:
-                data['transfer_pricing_factors'] = []
-                
-            if TransferContent.objects.exists():
-                data['transfer_content'] = list(TransferContent.objects.all().values())
-            else:
-                data['transfer_content'] = []
-                
-            if FerrySchedule.objects.exists():
-                data['ferry_schedules'] = list(FerrySchedule.objects.all().values())
-            else:
-                data['ferry_schedules'] = []
-                
-        except Exception as model_error:
-            data['model_error'] = str(model_error)
-            print(f"Model access error: {model_error}")
-        
-        response = HttpResponse(
-            json.dumps(data, cls=DjangoJSONEncoder, indent=2),
-            content_type='application/json'
-        )
-        response['Content-Disposition'] = f'attachment; filename="transportation-data-{timezone.now().strftime("%Y%m%d")}.json"'
-        
-        return response
-        
-    except Exception as e:
-        print(f"Transportation export error: {e}")
-        import traceback
-        traceback.print_exc()
-        return Response({'error': str(e), 'details': traceback.format_exc()}, status=500)
+    """Stream all transportation data as JSON or NDJSON (``?output=ndjson``), gzipped with ``?compress=gzip``"""
+    output = request.query_params.get('output', 'json').lower()
+    if output not in EXPORT_FORMATS:
+        return Response({'error': f"output must be one of {', '.join(EXPORT_FORMATS)}"}, status=400)
+    compress = request.query_params.get('compress', '').lower()
+    if compress not in ('', 'gzip'):
+        return Response({'error': 'compress must be gzip'}, status=400)
+    
+    filename = f'transportation-data-{timezone.now().strftime("%Y%m%d")}.{output}'
+    content_type = 'application/x-ndjson' if output == 'ndjson' else 'application/json'
+    chunks = iter_export(output)
+    if compress:
+        chunks = gzip_stream(chunks)
+        filename += '.gz'
+        content_type = 'application/gzip'
+    
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def transportation_import(request):
-    """Import transportation data from JSON file"""
+    """Import transportation data from a JSON or NDJSON file (optionally gzipped), applying only what differs
+
+    Rows are matched on natural keys (see ``api.transport_import``). Pass
+    ``dry_run=true`` to get the diff summary without writing anything.
+    """
     try:
         if 'file' not in request.FILES:
             return Response({'error': 'No file provided'}, status=400)
         
         file = request.FILES['file']
         
-        if not file.name.endswith('.json'):
-            return Response({'error': 'File must be a JSON file'}, status=400)
+        name = file.name[:-3] if file.name.endswith('.gz') else file.name
+        if not name.endswith(('.json', '.ndjson')):
+            return Response({'error': 'File must be a JSON or NDJSON file'}, status=400)
+        ndjson = name.endswith('.ndjson')
         
-        # Read and parse JSON data
+        # Read and parse the data, decompressing on the fly
+        stream = gzip.GzipFile(fileobj=file) if name != file.name else file
         try:
-            import json
-            data = json.loads(file.read().decode('utf-8'))
-        except json.JSONDecodeError:
-            return Response({'error': 'Invalid JSON file'}, status=400)
-        
-        imported_count = 0
-        
-        # Import each data type
-        model_mapping = {
-            'transfer_types': TransferType,
-            'atoll_transfers': AtollTransfer,
-            'resort_transfers': ResortTransfer,
-            'transfer_faqs': TransferFAQ,
-            'transfer_contact_methods': TransferContactMethod,
-            'transfer_booking_steps': TransferBookingStep,
-            'transfer_benefits': TransferBenefit,
-            'transfer_pricing_factors': TransferPricingFactor,
-            'transfer_content': TransferContent,
-            'ferry_schedules': FerrySchedule,
-        }
-        
-        # Use transaction to ensure data integrity
-        from django.db import transaction
+            data = parse_ndjson(io.TextIOWrapper(stream, encoding='utf-8')) if ndjson else json.load(stream)
+        except (ValueError, OSError, EOFError) as e:
+            return Response({'error': f'Invalid NDJSON file: {e}' if ndjson else 'Invalid JSON file'}, status=400)
         
-        with transaction.atomic():
-            for data_type, model_class in model_mapping.items():
-                if data_type in data:
-                    # Clear existing data
-                    model_class.objects.all().delete()
-                    
-                    # Import new data
-                    for item_data in data[data_type]:
-                        # Remove id to let Django auto-assign
-                        item_data.pop('id', None)
-                        
-                        # Convert datetime strings back to datetime objects
-                        for field in ['created_at', 'updated_at']:
-                            if field in item_data and item_data[field]:
-                                from django.utils.dateparse import parse_datetime
-                                item_data[field] = parse_datetime(item_data[field])
-                        
-                        model_class.objects.create(**item_data)
-                        imported_count += 1
+        dry_run = str(request.data.get('dry_run', request.query_params.get('dry_run', ''))).lower() in ('1', 'true', 'yes')
+        try:
+            summary = import_transportation(data, dry_run=dry_run)
+        except TransportImportError as e:
+            return Response({'error': str(e)}, status=400)
         
         return Response({
-            'message': 'Transportation data imported successfully',
-            'imported_count': imported_count
+            'message': 'Dry run: nothing was written' if dry_run else 'Transportation data imported successfully',
+            'dry_run': dry_run,
+            'imported_count': sum(counts['created'] + counts['updated'] for counts in summary.values()),
+            'summary': summary,
         })
         
     except Exception as e:
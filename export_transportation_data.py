@@ -4,291 +4,264 @@ Transportation Data Export Script for Travel Agency
 
 This script exports all transportation-related data from your Django database
 to JSON fixtures that can be imported into your production environment.
+
+Each model is written to one fixture with a stable name (``transfer_types.json``,
+...) by parallel workers. A SHA-256 checksum of every fixture goes into
+``manifest.json``; a model whose checksum matches the previous manifest keeps
+its existing file, so unchanged data is never rewritten or re-shipped.
+
+On the production side, ``--restore`` loads only the fixtures whose checksum
+differs from the ones it last applied (recorded in ``applied.json``), and
+deletes the rows of those models that the fixture no longer holds, so rows
+removed at the source disappear in production too.
+
+The script exits non-zero if any model fails to export or restore.
+
+Usage:
+    python export_transportation_data.py [--output-dir DIR] [--workers N] [--force]
+    python export_transportation_data.py --restore [--output-dir DIR] [--force]
 """
 
+import argparse
+import hashlib
+import json
 import os
 import sys
-import django
-import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import django
+
 # Setup Django environment
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'travel_agency.settings')
 django.setup()
 
 from django.core import serializers
+from django.core.management import call_command
+from django.db import connections, transaction
 from api.models import (
-    TransferType, AtollTransfer, ResortTransfer, 
+    TransferType, AtollTransfer, ResortTransfer,
     TransferFAQ, TransferContactMethod, TransferBookingStep,
     TransferBenefit, TransferPricingFactor, TransferContent,
     FerrySchedule
 )
 
-def export_transportation_data():
+EXPORTS_DIR = 'data_exports'
+MANIFEST_FILE = 'manifest.json'
+APPLIED_FILE = 'applied.json'
+DEFAULT_WORKERS = 4
+ITERATOR_CHUNK_SIZE = 500
+DELETE_BATCH_SIZE = 500
+
+# Parents before children, which is also the order fixtures are restored in
+TRANSPORTATION_MODELS = [
+    ('transfer_types', TransferType),
+    ('atoll_transfers', AtollTransfer),
+    ('resort_transfers', ResortTransfer),
+    ('transfer_faqs', TransferFAQ),
+    ('transfer_contact_methods', TransferContactMethod),
+    ('transfer_booking_steps', TransferBookingStep),
+    ('transfer_benefits', TransferBenefit),
+    ('transfer_pricing_factors', TransferPricingFactor),
+    ('transfer_content', TransferContent),
+    ('ferry_schedules', FerrySchedule),
+]
+
+
+class HashingWriter:
+    """Text stream that writes to a file and hashes what it writes"""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def write(self, text):
+        self.digest.update(text.encode('utf-8'))
+        return self.f.write(text)
+
+
+def load_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def export_model(model_name, model_class, exports_dir, previous, force=False):
+    """Serialize one model to a temporary file and keep it only if its checksum changed"""
+    filename = f'{model_name}.json'
+    path = os.path.join(exports_dir, filename)
+    records = 0
+
+    def counted(queryset):
+        nonlocal records
+        for obj in queryset:
+            records += 1
+            yield obj
+
+    try:
+        queryset = model_class.objects.order_by('pk').iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        fd, tmp_path = tempfile.mkstemp(dir=exports_dir, prefix=f'.{model_name}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                writer = HashingWriter(f)
+                serializers.serialize('json', counted(queryset), indent=2, stream=writer)
+            checksum = writer.digest.hexdigest()
+            changed = force or previous.get('checksum') != checksum or not os.path.exists(path)
+            if changed:
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    finally:
+        connections.close_all()  # each worker thread opened its own connection
+
+    return {
+        'file': filename,
+        'records': records,
+        'checksum': checksum,
+        'changed': changed,
+        'exported_at': datetime.now().isoformat(timespec='seconds') if changed else previous.get('exported_at'),
+    }
+
+
+def export_transportation_data(exports_dir=EXPORTS_DIR, workers=DEFAULT_WORKERS, force=False):
     """
-    Export all transportation-related data to JSON fixtures
+    Export all transportation-related data to JSON fixtures, rewriting only changed models
     """
     print("🚛 Exporting Transportation Data...")
     print("=" * 50)
-    
-    # Create exports directory if it doesn't exist
-    exports_dir = 'data_exports'
-    if not os.path.exists(exports_dir):
-        os.makedirs(exports_dir)
-    
-    # Get current timestamp for filename
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
-    # Define models to export
-    transportation_models = [
-        ('transfer_types', TransferType),
-        ('atoll_transfers', AtollTransfer),
-        ('resort_transfers', ResortTransfer),
-        ('transfer_faqs', TransferFAQ),
-        ('transfer_contact_methods', TransferContactMethod),
-        ('transfer_booking_steps', TransferBookingStep),
-        ('transfer_benefits', TransferBenefit),
-        ('transfer_pricing_factors', TransferPricingFactor),
-        ('transfer_content', TransferContent),
-        ('ferry_schedules', FerrySchedule),
-    ]
-    
-    exported_files = []
-    total_records = 0
-    
-    # Export each model
-    for model_name, model_class in transportation_models:
-        try:
-            # Get all records
-            records = model_class.objects.all()
-            record_count = records.count()
-            
-            if record_count > 0:
-                # Export to JSON
-                filename = f'{exports_dir}/{model_name}_{timestamp}.json'
-                
-                with open(filename, 'w', encoding='utf-8') as f:
-                    serializers.serialize('json', records, indent=2, stream=f)
-                
-                exported_files.append({
-                    'file': filename,
-                    'model': model_name,
-                    'records': record_count
-                })
-                total_records += record_count
-                
-                print(f"✅ {model_name}: {record_count} records exported")
-            else:
-                print(f"⚠️  {model_name}: No records found")
-                
-        except Exception as e:
-            print(f"❌ Error exporting {model_name}: {str(e)}")
-    
-    # Create a combined export file
-    combined_filename = f'{exports_dir}/all_transportation_data_{timestamp}.json'
-    combined_data = []
-    
-    for model_name, model_class in transportation_models:
-        records = model_class.objects.all()
-        if records.exists():
-            # Convert to list and add to combined data
-            for obj in serializers.deserialize('json', serializers.serialize('json', records)):
-                combined_data.append(obj.object.__dict__)
-    
-    # Export combined file as a more readable format
-    if combined_data:
-        with open(combined_filename, 'w', encoding='utf-8') as f:
-            json.dump({
-                'export_info': {
-                    'timestamp': timestamp,
-                    'total_records': total_records,
-                    'models_exported': len(exported_files)
-                },
-                'data': combined_data
-            }, f, indent=2, default=str)
-        
-        print(f"\n📦 Combined export created: {combined_filename}")
-    
-    # Create import commands script
-    import_script_filename = f'{exports_dir}/import_transportation_data_{timestamp}.py'
-    
-    import_script_content = f'''#!/usr/bin/env python
-"""
-Transportation Data Import Script
-Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
-This script imports transportation data into your production database.
-Run this after setting up your production database.
-"""
+    os.makedirs(exports_dir, exist_ok=True)
+    manifest_path = os.path.join(exports_dir, MANIFEST_FILE)
+    previous = load_json(manifest_path).get('models', {})
 
-import os
-import django
-from django.core.management import call_command
+    models = {}
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            model_name: executor.submit(
+                export_model, model_name, model_class, exports_dir, previous.get(model_name, {}), force
+            )
+            for model_name, model_class in TRANSPORTATION_MODELS
+        }
+        for model_name, _ in TRANSPORTATION_MODELS:
+            try:
+                models[model_name] = futures[model_name].result()
+            except Exception as e:
+                print(f"❌ Error exporting {model_name}: {str(e)}")
+                failed.append(model_name)
+                if model_name in previous:
+                    models[model_name] = dict(previous[model_name], changed=False)
 
-# Setup Django environment
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'travel_agency.settings_production')
-django.setup()
+    for model_name, entry in models.items():
+        status = "✅ changed" if entry['changed'] else "⏭️  unchanged"
+        print(f"{status} {model_name}: {entry['records']} records ({entry['checksum'][:12]})")
 
-def import_transportation_data():
-    """Import all transportation data"""
-    print("🚛 Importing Transportation Data...")
-    
-    # Run management commands to populate data
-    management_commands = [
-        'populate_transportation_data',
-        'populate_ferry_schedules',
-    ]
-    
-    for command in management_commands:
-        try:
-            print(f"Running: {{command}}")
-            call_command(command)
-            print(f"✅ {{command}} completed successfully")
-        except Exception as e:
-            print(f"❌ Error running {{command}}: {{str(e)}}")
-    
-    print("\\n🎉 Transportation data import completed!")
+    manifest = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'order': [model_name for model_name, _ in TRANSPORTATION_MODELS if model_name in models],
+        'models': models,
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
 
-if __name__ == '__main__':
-    import_transportation_data()
-'''
-    
-    with open(import_script_filename, 'w', encoding='utf-8') as f:
-        f.write(import_script_content)
-    
-    # Create SQL backup script
-    sql_backup_script = f'{exports_dir}/backup_transportation_data_{timestamp}.sql'
-    
-    sql_script_content = f'''-- Transportation Data Backup
--- Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
--- 
--- This SQL script creates a backup of all transportation-related tables
--- Run this on your production database to backup transportation data
-
--- Backup TransferType table
-CREATE TABLE IF NOT EXISTS backup_transfer_types_{timestamp.replace('_', '')} AS 
-SELECT * FROM api_transfertype;
-
--- Backup AtollTransfer table
-CREATE TABLE IF NOT EXISTS backup_atoll_transfers_{timestamp.replace('_', '')} AS 
-SELECT * FROM api_atolltransfer;
-
--- Backup ResortTransfer table
-CREATE TABLE IF NOT EXISTS backup_resort_transfers_{timestamp.replace('_', '')} AS 
-SELECT * FROM api_resorttransfer;
-
--- Backup FerrySchedule table
-CREATE TABLE IF NOT EXISTS backup_ferry_schedules_{timestamp.replace('_', '')} AS 
-SELECT * FROM api_ferryschedule;
-
--- Backup all other transportation tables
-CREATE TABLE IF NOT EXISTS backup_transfer_faqs_{timestamp.replace('_', '')} AS 
-SELECT * FROM api_transferfaq;
-
-CREATE TABLE IF NOT EXISTS backup_transfer_contact_methods_{timestamp.replace('_', '')} AS 
-SELECT * FROM api_transfercontactmethod;
-
-CREATE TABLE IF NOT EXISTS backup_transfer_booking_steps_{timestamp.replace('_', '')} AS 
-SELECT * FROM api_transferbookingstep;
-
-CREATE TABLE IF NOT EXISTS backup_transfer_benefits_{timestamp.replace('_', '')} AS 
-SELECT * FROM api_transferbenefit;
-
-CREATE TABLE IF NOT EXISTS backup_transfer_pricing_factors_{timestamp.replace('_', '')} AS 
-SELECT * FROM api_transferpricingfactor;
-
-CREATE TABLE IF NOT EXISTS backup_transfer_content_{timestamp.replace('_', '')} AS 
-SELECT * FROM api_transfercontent;
-
--- Show backup tables created
-SELECT 'Backup completed for transportation data on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}' AS status;
-'''
-    
-    with open(sql_backup_script, 'w', encoding='utf-8') as f:
-        f.write(sql_script_content)
-    
-    # Create restore script for Django fixtures
-    restore_script_filename = f'{exports_dir}/restore_transportation_data_{timestamp}.sh'
-    
-    restore_script_content = f'''#!/bin/bash
-# Transportation Data Restore Script
-# Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-echo "🚛 Restoring Transportation Data..."
-
-# Set Django settings for production
-export DJANGO_SETTINGS_MODULE=travel_agency.settings_production
-
-# Load each fixture file
-'''
-    
-    for exported_file in exported_files:
-        restore_script_content += f'''
-echo "Loading {exported_file['model']}..."
-python manage.py loaddata {exported_file['file']}
-'''
-    
-    restore_script_content += f'''
-echo "✅ Transportation data restore completed!"
-echo "Total records restored: {total_records}"
-'''
-    
-    with open(restore_script_filename, 'w', encoding='utf-8') as f:
-        f.write(restore_script_content)
-    
-    # Make restore script executable (on Unix systems)
-    try:
-        os.chmod(restore_script_filename, 0o755)
-    except:
-        pass  # Windows doesn't support chmod
-    
-    # Print summary
+    changed = [model_name for model_name, entry in models.items() if entry['changed']]
     print("\n" + "=" * 50)
     print("📊 EXPORT SUMMARY")
     print("=" * 50)
-    print(f"📅 Export Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"📁 Export Directory: {exports_dir}/")
-    print(f"📊 Total Records: {total_records}")
-    print(f"📦 Models Exported: {len(exported_files)}")
-    
-    print("\n📄 Files Created:")
-    for exported_file in exported_files:
-        print(f"  • {exported_file['file']} ({exported_file['records']} records)")
-    
-    print(f"  • {combined_filename} (combined export)")
-    print(f"  • {import_script_filename} (import script)")
-    print(f"  • {sql_backup_script} (SQL backup)")
-    print(f"  • {restore_script_filename} (restore script)")
-    
-    print("\n🚀 DEPLOYMENT INSTRUCTIONS:")
-    print("=" * 50)
-    print("1. Copy all exported files to your production server")
-    print("2. Run the import script in your production environment:")
-    print(f"   python {import_script_filename}")
-    print("3. Or use Django fixtures:")
-    print(f"   bash {restore_script_filename}")
-    print("4. Verify data integrity after import")
-    
-    print("\n💾 BACKUP INSTRUCTIONS:")
-    print("=" * 50)
-    print("1. Before importing, backup your production data:")
-    print(f"   psql -U username -d database < {sql_backup_script}")
-    print("2. Test import on staging environment first")
-    print("3. Monitor application after production deployment")
-    
+    print(f"📊 Total Records: {sum(entry['records'] for entry in models.values())}")
+    print(f"📦 Models Changed: {len(changed)} of {len(models)}")
+    if failed:
+        print(f"❌ Models Failed: {', '.join(failed)}")
+    print(f"🧾 Manifest: {manifest_path}")
+
+    if not failed:
+        print("\n🚀 DEPLOYMENT INSTRUCTIONS:")
+        print("=" * 50)
+        print(f"1. Copy {exports_dir}/ (manifest and fixtures) to your production server")
+        print("2. Load what changed since the last restore:")
+        print(f"   DJANGO_SETTINGS_MODULE=travel_agency.settings_production python {os.path.basename(__file__)} --restore")
+
     return {
         'export_directory': exports_dir,
-        'total_records': total_records,
-        'exported_files': exported_files,
-        'timestamp': timestamp
+        'manifest': manifest_path,
+        'changed': changed,
+        'failed': failed,
+        'models': models,
     }
 
+
+def delete_missing_rows(model_class, path):
+    """Delete the stored rows whose primary key the fixture at ``path`` does not contain"""
+    with open(path, encoding='utf-8') as f:
+        kept = {model_class._meta.pk.to_python(obj['pk']) for obj in json.load(f)}
+    missing = [pk for pk in model_class.objects.values_list('pk', flat=True).iterator() if pk not in kept]
+    for start in range(0, len(missing), DELETE_BATCH_SIZE):
+        model_class.objects.filter(pk__in=missing[start:start + DELETE_BATCH_SIZE]).delete()
+    return len(missing)
+
+
+def restore_transportation_data(exports_dir=EXPORTS_DIR, force=False):
+    """
+    Load the fixtures whose checksum differs from the last restore, in dependency order
+    """
+    print("🚛 Restoring Transportation Data...")
+
+    manifest = load_json(os.path.join(exports_dir, MANIFEST_FILE))
+    if not manifest.get('models'):
+        raise RuntimeError(f"No manifest found in {exports_dir}/")
+    applied_path = os.path.join(exports_dir, APPLIED_FILE)
+    applied = load_json(applied_path)
+
+    model_classes = dict(TRANSPORTATION_MODELS)
+    loaded = []
+    for model_name in manifest.get('order', manifest['models']):
+        entry = manifest['models'][model_name]
+        if not force and applied.get(model_name) == entry['checksum']:
+            print(f"⏭️  {model_name}: unchanged")
+            continue
+        path = os.path.join(exports_dir, entry['file'])
+        with open(path, 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        if checksum != entry['checksum']:
+            raise RuntimeError(f"{path} does not match its manifest checksum")
+        with transaction.atomic():
+            if entry['records']:
+                call_command('loaddata', path, verbosity=0)
+            deleted = delete_missing_rows(model_classes[model_name], path)
+        applied[model_name] = entry['checksum']
+        loaded.append(model_name)
+        print(f"✅ {model_name}: {entry['records']} records loaded, {deleted} removed")
+
+    with open(applied_path, 'w', encoding='utf-8') as f:
+        json.dump(applied, f, indent=2)
+
+    print(f"\n🎉 Restore completed: {len(loaded)} of {len(manifest['models'])} models loaded")
+    return loaded
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output-dir', default=EXPORTS_DIR, help='Directory holding fixtures and manifest')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Models exported in parallel')
+    parser.add_argument('--force', action='store_true', help='Export or restore every model, changed or not')
+    parser.add_argument('--restore', action='store_true', help='Load the fixtures that changed since the last restore')
+    args = parser.parse_args()
+
     try:
-        result = export_transportation_data()
-        print(f"\n🎉 Export completed successfully!")
-        print(f"📁 Check the '{result['export_directory']}' directory for all exported files.")
-        
+        if args.restore:
+            restore_transportation_data(args.output_dir, force=args.force)
+        else:
+            result = export_transportation_data(args.output_dir, workers=args.workers, force=args.force)
+            if result['failed']:
+                raise RuntimeError(f"could not export {', '.join(result['failed'])}")
+            print(f"\n🎉 Export completed successfully!")
+            print(f"📁 Check the '{result['export_directory']}' directory for all exported files.")
+
     except Exception as e:
-        print(f"\n❌ Export failed: {str(e)}")
+        print(f"\n❌ {'Restore' if args.restore else 'Export'} failed: {str(e)}")
         sys.exit(1)
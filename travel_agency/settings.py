@@ -121,10 +121,15 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # A file (not in-memory) test database, so the concurrent booking tests can open several connections
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 
 
+# Tests build the api schema from the models while api/migrations holds no migrations
+TEST_RUNNER = 'api.test_runner.ApiTestRunner'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -249,3 +254,37 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
+
+# Search
+# Fuzzy place-name matching: minimum trigram similarity for a match and the
+# number of candidate names scored per lookup.
+PLACE_MATCH_THRESHOLD = float(os.getenv('PLACE_MATCH_THRESHOLD', '0.3'))
+PLACE_MATCH_MAX_CANDIDATES = int(os.getenv('PLACE_MATCH_MAX_CANDIDATES', '50'))
+
+# Backend for /api/search/: 'database' (icontains lookups), 'index' (file-backed
+# inverted index built by `manage.py build_search_index`) or 'auto', which uses
+# the index on non-PostgreSQL databases once the index file exists.
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', str(BASE_DIR / 'search_index.idx'))
+
+# Search responses are cached per normalized query for SEARCH_CACHE_TIMEOUT
+# seconds (0 disables); catalog and content changes invalidate them early.
+SEARCH_CACHE_TIMEOUT = int(os.getenv('SEARCH_CACHE_TIMEOUT', '300'))
+# Search query log rows are written in batches of SEARCH_LOG_BATCH_SIZE, or
+# after SEARCH_LOG_FLUSH_INTERVAL seconds, whichever comes first.
+SEARCH_LOG_BATCH_SIZE = int(os.getenv('SEARCH_LOG_BATCH_SIZE', '100'))
+SEARCH_LOG_FLUSH_INTERVAL = int(os.getenv('SEARCH_LOG_FLUSH_INTERVAL', '30'))
+
+# Bookings
+# Booking creation locks the property row and retries when the database
+# reports lock contention (deadlock, lock timeout, SQLite "database is locked").
+BOOKING_CREATE_ATTEMPTS = int(os.getenv('BOOKING_CREATE_ATTEMPTS', '5'))
+BOOKING_RETRY_BACKOFF = float(os.getenv('BOOKING_RETRY_BACKOFF', '0.05'))
+# Seconds a checkout hold reserves the dates before it lapses
+BOOKING_HOLD_TTL = int(os.getenv('BOOKING_HOLD_TTL', '600'))
+
+# Transfers
+# Minutes a traveller needs to change ferries in the journey planner
+FERRY_MIN_TRANSFER_MINUTES = int(os.getenv('FERRY_MIN_TRANSFER_MINUTES', '30'))
+# Island transfer durations are estimated from when a route's duration text gives none
+TRANSFER_HUB = os.getenv('TRANSFER_HUB', 'Male')